@@ -4,6 +4,7 @@ from numpy import zeros
 from functools import partial
 from corpustools.acousticsim.representations import to_envelopes, to_mfcc
 from corpustools.acousticsim.distance_functions import dtw_distance, xcorr_distance
+from corpustools.multiproc import get_backend
 
 
 class AcousticSimError(Exception):
@@ -82,6 +83,12 @@ def acoustic_similarity_mapping(path_mapping,**kwargs):
     verbose : bool, optional
         If true, command line progress will be displayed after every 50
         mappings have been processed.  Defaults to false.
+    use_multi : bool, optional
+        If false, the mappings are calculated serially regardless of
+        `num_cores`.  Defaults to true.
+    num_cores : int, optional
+        Number of cores to calculate representations and distances with,
+        defaults to 1 (serially).
 
     Returns
     -------
@@ -97,6 +104,8 @@ def acoustic_similarity_mapping(path_mapping,**kwargs):
     to_rep = _build_to_rep(**kwargs)
 
     num_cores = kwargs.get('num_cores', 1)
+    if not kwargs.get('use_multi', True):
+        num_cores = -1
     output_sim = kwargs.get('output_sim', True)
 
     match_function = kwargs.get('match_function', 'dtw')
@@ -107,31 +116,39 @@ def acoustic_similarity_mapping(path_mapping,**kwargs):
         dist_func = dct_distance
     else:
         dist_func = dtw_distance
-    cache = dict()
-    asim = dict()
+
+    # Representations are computed once per file, then distances once per
+    # mapping, both spread over the backend
+    paths = dict()
+    mappings = list()
+    for pm in path_mapping:
+        if not all(filepath.lower().endswith('.wav') for filepath in pm):
+            continue
+        basetup = tuple(os.path.basename(x) for x in pm)
+        for filepath, basename in zip(pm, basetup):
+            if basename not in paths:
+                paths[basename] = filepath
+        mappings.append(basetup)
+
+    backend = get_backend(num_cores)
     if call_back is not None:
         call_back('Calculating acoustic similarity...')
-        call_back(0,len(path_mapping))
-        cur = 0
-    for i,pm in enumerate(path_mapping):
-        if stop_check is not None and stop_check():
-            return
-        if call_back is not None:
-            cur += 1
-            if cur % 2 == 0:
-                call_back(cur)
-        basetup = tuple(os.path.basename(x) for x in pm)
-        allgood = False
-        for filepath in pm:
-            if not filepath.lower().endswith('.wav'):
-                break
-            if filepath not in cache:
-                cache[os.path.basename(filepath)] = to_rep(filepath)
-        else:
-            allgood = True
-        if not allgood:
-            continue
-        dist_val = dist_func(cache[basetup[0]],cache[basetup[1]])
+        call_back(0,len(paths) + len(mappings))
+        rep_call_back = call_back
+        dist_call_back = lambda done: call_back(len(paths) + done)
+    else:
+        rep_call_back = dist_call_back = None
+    reps = backend.map(to_rep, [(filepath,) for filepath in paths.values()],
+                       call_back = rep_call_back, stop_check = stop_check)
+    if reps is None:
+        return
+    cache = dict(zip(paths.keys(), reps))
+    distances = backend.map(dist_func, [(cache[basetup[0]], cache[basetup[1]]) for basetup in mappings],
+                            call_back = dist_call_back, stop_check = stop_check)
+    if distances is None:
+        return
+    asim = dict()
+    for basetup, dist_val in zip(mappings, distances):
         if output_sim:
             try:
                 dist_val = 1/dist_val
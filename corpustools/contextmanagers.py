@@ -1,10 +1,17 @@
 from corpustools.exceptions import PCTError, PCTPythonError
 import math
 import collections
-import copy
 import operator
+from types import MappingProxyType
 
-from corpustools.corpus.classes.lexicon import Word
+import numpy as np
+
+from corpustools.corpus.classes.lexicon import WordView, Transcription
+from corpustools.corpus.classes.corpusframe import CorpusFrame
+from corpustools.symbolsim.deletion_index import DeletionIndex
+from corpustools.symbolsim.substitution_index import SubstitutionIndex
+from corpustools.symbolsim.metric_index import MetricIndex
+from corpustools.symbolsim.phono_align import get_aligner
 
 from corpustools.exceptions import PCTContextError
 
@@ -29,6 +36,13 @@ class BaseCorpusContext(object):
         in the Corpus
     frequency_threshold: float, optional
         If specified, ignore words below this token frequency
+
+    Notes
+    -----
+    Iterating over a context yields WordViews of the words in the Corpus,
+    with the frequency (and variant) chosen by the context.  The views
+    are made the first time the context is iterated over and reused
+    afterwards; setting ``corpus`` or calling ``reset`` discards them.
     """
     def __init__(self, corpus, sequence_type, type_or_token, attribute=None, frequency_threshold=0, log_count=True):
         self.sequence_type = sequence_type
@@ -36,11 +50,32 @@ class BaseCorpusContext(object):
         self.corpus = corpus
         self.name = self.corpus.name
         self.attribute = attribute
-        self._freq_base = {}
-        self.length = None
         self.frequency_threshold = frequency_threshold
         self.log_count = log_count
 
+    @property
+    def corpus(self):
+        return self._corpus
+
+    @corpus.setter
+    def corpus(self, corpus):
+        self._corpus = corpus
+        self.reset()
+
+    def reset(self):
+        """
+        Discard the words and counts of the context, so that they are
+        regenerated from the Corpus when next needed
+        """
+        self._words = None
+        self._freq_base = {}
+        self._ngram_counts = None
+        self._frame = None
+        self._deletion_indexes = {}
+        self._substitution_index = None
+        self._phono_index = None
+        self.length = None
+
     @property
     def inventory(self):
         return self.corpus.inventory
@@ -49,20 +84,185 @@ class BaseCorpusContext(object):
     def specifier(self):
         return self.corpus.specifier
 
+    @property
+    def segment_table(self):
+        return self.corpus.segment_table
+
+    @property
+    def frame(self):
+        """
+        Columnar store (see CorpusFrame) of the words in the context, with
+        the frequencies adjusted by the context, in iteration order
+        """
+        if self._frame is None:
+            self._frame = CorpusFrame(self.words, self.segment_table, self.corpus._attributes)
+        return self._frame
+
+    def deletion_index(self, max_distance=1):
+        """
+        Deletion variant index (see DeletionIndex) of the words' sequences,
+        for finding edit distance neighbors; it is built once per distance
+        and sent along with the context to worker processes
+
+        Parameters
+        ----------
+        max_distance : int
+            Largest edit distance the index will be queried for
+
+        Returns
+        -------
+        DeletionIndex
+            Index whose positions are those of the words in the context
+        """
+        max_distance = int(max_distance)
+        try:
+            return self._deletion_indexes[max_distance]
+        except KeyError:
+            pass
+        flat, offsets = self.frame.tier(self.sequence_type)
+        flat = flat.tolist()
+        offsets = offsets.tolist()
+        sequences = (flat[offsets[i]:offsets[i + 1]] for i in range(len(offsets) - 1))
+        self._deletion_indexes[max_distance] = DeletionIndex(sequences, max_distance)
+        return self._deletion_indexes[max_distance]
+
+    def substitution_index(self):
+        """
+        Substitution index (see SubstitutionIndex) of the words' sequences,
+        for finding words that differ by one segment; it is built once and
+        sent along with the context to worker processes
+
+        Returns
+        -------
+        SubstitutionIndex
+            Index whose positions are those of the words in the context
+        """
+        if self._substitution_index is None:
+            flat, offsets = self.frame.tier(self.sequence_type)
+            flat = flat.tolist()
+            offsets = offsets.tolist()
+            sequences = (flat[offsets[i]:offsets[i + 1]] for i in range(len(offsets) - 1))
+            self._substitution_index = SubstitutionIndex(sequences)
+        return self._substitution_index
+
+    def phono_edit_distance_index(self):
+        """
+        Metric index (see MetricIndex) of the words' sequences under
+        phonological edit distance with the corpus' feature system; it is
+        built once and sent along with the context to worker processes
+
+        Returns
+        -------
+        MetricIndex
+            Index whose positions are those of the words in the context
+        """
+        if self._phono_index is None:
+            aligner = get_aligner(self.specifier)
+            sequences = ([str(s) for s in getattr(w, self.sequence_type)] for w in self.words)
+            self._phono_index = MetricIndex(sequences, aligner.distance,
+                                            min_indel_cost=aligner.min_indel_cost,
+                                            metric=aligner.is_metric())
+        return self._phono_index
+
+    def __getstate__(self):
+        # Cached tables are read-only views, which can't be pickled, and are
+        # cheap to rebuild where the context is unpickled
+        state = self.__dict__.copy()
+        state['_freq_base'] = {}
+        state['_ngram_counts'] = None
+        state['_frame'] = None
+        return state
+
     def __enter__(self):
         if self.attribute is not None:
             self.corpus.add_attribute(self.attribute,initialize_defaults = False)
         return self
 
     def __len__(self):
-        if self.length is not None:
-            return self.length
-        else:
-            counter = 0
-            for w in self:
-                counter += 1
-            self.length = counter
-            return self.length
+        if self.length is None:
+            self.length = len(self.words)
+        return self.length
+
+    @property
+    def words(self):
+        """
+        List of the WordViews in the context, made once and reused
+        """
+        if self._words is None:
+            self._words = list(self._iter_views())
+        return self._words
+
+    def __iter__(self):
+        return iter(self.words)
+
+    def _iter_views(self):
+        raise(NotImplementedError)
+
+    def _phone_weight(self, word):
+        if self.type_or_token == 'type':
+            return 1
+        elif self.type_or_token == 'token' and self.log_count:
+            return math.log(word.frequency) if word.frequency > 1 else math.log(1.00001)
+        return word.frequency
+
+    def count_ngrams(self, gramsize=2):
+        """
+        Count the n-grams of every order up to ``gramsize`` in a single pass
+        over the context.
+
+        For each order, the counts are kept separately for n-grams inside
+        words and for n-grams that include the word boundary at the start,
+        at the end or at both edges of the word, so that the tables with
+        and without word boundaries are sums of these counts.  Positional
+        counts and counts weighted for phonotactic probability are made in
+        the same pass.  The results are used by ``get_frequency_base`` and
+        ``get_phone_probs``, and only recounted when a higher order is
+        requested.
+
+        Parameters
+        ----------
+        gramsize : integer
+            Highest order of n-gram to count, defaults to 2 (bigrams)
+        """
+        if self._ngram_counts is not None and self._ngram_counts['order'] >= gramsize:
+            return self._ngram_counts
+        orders = range(1, gramsize + 1)
+        tables = ('inner', 'left', 'right', 'both', 'phone', 'positional', 'position_totals')
+        counts = {t: {n: collections.defaultdict(float) for n in orders} for t in tables}
+        for word in self:
+            tier = getattr(word, self.sequence_type)
+            if tier is None:
+                continue
+            if isinstance(tier, Transcription):
+                padded = tier.padded
+            else:
+                padded = ('#',) + tuple(tier) + ('#',)
+            freq = word.frequency
+            phone_freq = self._phone_weight(word)
+            length = len(padded) - 2
+            for n in orders:
+                inner = counts['inner'][n]
+                phone = counts['phone'][n]
+                positional = counts['positional'][n]
+                position_totals = counts['position_totals'][n]
+                for i in range(1, length - n + 2):
+                    x = padded[i:i + n]
+                    phone[x] += phone_freq
+                    positional[(x, i - 1)] += phone_freq
+                    position_totals[i - 1] += phone_freq
+                    inner[x[0] if n == 1 else x] += freq
+                if n > length + 2:
+                    continue
+                x = padded[:n]
+                if n == length + 2:
+                    counts['both'][n][x] += freq
+                    continue
+                counts['left'][n][x[0] if n == 1 else x] += freq
+                x = padded[-n:]
+                counts['right'][n][x[0] if n == 1 else x] += freq
+        self._ngram_counts = {t: {n: dict(v) for n, v in counts[t].items()} for t in tables}
+        self._ngram_counts['order'] = gramsize
+        return self._ngram_counts
 
     def get_frequency_base(self, gramsize=1, halve_edges=False, probability=False, need_wb=True):
         """
@@ -87,39 +287,39 @@ class BaseCorpusContext(object):
 
         Returns
         -------
-        dict
-            Keys are segments (or sequences of segments) and values are
-            their frequency in the Corpus
+        mappingproxy
+            Read-only mapping where keys are segments (or sequences of
+            segments) and values are their frequency in the Corpus
         """
-        if (gramsize) not in self._freq_base:
+        if self.sequence_type.lower() == 'spelling':
+            halve_edges, need_wb = False, True
+        elif not need_wb:
+            halve_edges = False
+        key = ('frequency', gramsize, halve_edges, need_wb, probability)
+        try:
+            return self._freq_base[key]
+        except KeyError:
+            pass
+        if probability:
+            counts = self.get_frequency_base(gramsize, halve_edges, False, need_wb)
+            total = counts['total']
+            freq_base = {k: v / total for k, v in counts.items()}
+        else:
+            counts = self.count_ngrams(max(gramsize, 2))
+            if not need_wb:
+                parts = ('inner',)
+            elif halve_edges:    # WB only at the end of the word (counted once per word)
+                parts = ('inner', 'right')
+            else:                # WB on both sides of the word
+                parts = ('inner', 'left', 'right', 'both')
             freq_base = collections.defaultdict(float)
-            for word in self:
-                tier = getattr(word, self.sequence_type)
-                if self.sequence_type.lower() == 'spelling':
-                    seq = ['#'] + [x for x in tier] + ['#']
-                elif need_wb:       # if each word should have word boundaries
-                    if halve_edges:   # and only at the end of the word (word boundary is counted only once per word)
-                        seq = tier.list + ['#']
-                    else:             # WB on both sides of the word
-                        seq = tier.with_word_boundaries()
-                else:
-                    seq = tier.list
-                grams = zip(*[seq[i:] for i in range(gramsize)])
-                for x in grams:
-                    if len(x) == 1:
-                        x = x[0]
-                    freq_base[x] += word.frequency
+            for part in parts:
+                for k, v in counts[part][gramsize].items():
+                    freq_base[k] += v
+            freq_base = dict(freq_base)
             freq_base['total'] = sum(value for value in freq_base.values())
-            self._freq_base[(gramsize)] = freq_base
-        freq_base = self._freq_base[(gramsize)]
-        return_dict = { k:v for k,v in freq_base.items()}
-        # if halve_edges and '#' in return_dict:
-        #     return_dict['#'] = (return_dict['#'] / 2) + 1
-        #     if not probability:
-        #         return_dict['total'] -= return_dict['#'] - 2
-        if probability:
-            return_dict = { k:v/freq_base['total'] for k,v in return_dict.items()}
-        return return_dict
+        self._freq_base[key] = MappingProxyType(freq_base)
+        return self._freq_base[key]
 
     def get_phone_probs(self, gramsize = 1, probability = True, preserve_position = True):
         """
@@ -139,53 +339,80 @@ class BaseCorpusContext(object):
             If True, segments in different positions in the transcription
             will not be collapsed, defaults to True
 
-        log_count : boolean
-            If True, token frequencies will be logrithmically-transformed
-            prior to being summed
-
         Returns
         -------
-        dict
-            Keys are segments (or sequences of segments) and values are
-            their phonotactic probability in the Corpus
+        mappingproxy
+            Read-only mapping where keys are segments (or sequences of
+            segments) and values are their phonotactic probability in the
+            Corpus
         """
-        if (gramsize, preserve_position, self.log_count) not in self._freq_base:
-            freq_base = collections.defaultdict(float)
-            totals = collections.defaultdict(float)
-            for word in self:
-                if self.type_or_token == 'type':
-                    freq = 1
-                elif self.type_or_token == 'token' and self.log_count:
-                    freq = math.log(word.frequency) if word.frequency > 1 else math.log(1.00001)
-                else:
-                    freq = word.frequency
+        key = ('phone', gramsize, preserve_position, self.type_or_token, self.log_count, probability)
+        try:
+            return self._freq_base[key]
+        except KeyError:
+            pass
+        counts = self.count_ngrams(max(gramsize, 2))
+        if preserve_position:
+            freq_base = dict(counts['positional'][gramsize])
+            totals = counts['position_totals'][gramsize]
+            if probability:
+                freq_base = {k: v / totals[k[1]] for k, v in freq_base.items()}
+            else:
+                freq_base['total'] = MappingProxyType(totals)
+        else:
+            freq_base = dict(counts['phone'][gramsize])
+            freq_base['total'] = sum(value for value in freq_base.values())
+            if probability:
+                freq_base = {k: v / freq_base['total'] for k, v in freq_base.items()}
+        self._freq_base[key] = MappingProxyType(freq_base)
+        return self._freq_base[key]
 
-                grams = zip(*[getattr(word, self.sequence_type)[i:] for i in range(gramsize)])
+    def segment_surprisals(self, count_boundaries=True):
+        """
+        Get (and cache) the surprisal of each segment in the frequency
+        base, the log of the total frequency over the segment's frequency,
+        as used by Khorsi string similarity
 
-                for i, x in enumerate(grams):
-                    #if len(x) == 1:
-                    #    x = x[0]
-                    if preserve_position:
-                        x = (x,i)
-                        totals[i] += freq
-                    freq_base[x] += freq
+        Parameters
+        ----------
+        count_boundaries : boolean
+            If False, word boundaries ('#') are left out of the total
+            frequency.  Defaults to True.
 
-            if not preserve_position:
-                freq_base['total'] = sum(value for value in freq_base.values())
-            else:
-                freq_base['total'] = totals
-            self._freq_base[(gramsize, preserve_position, self.log_count)] = freq_base
-
-        freq_base = self._freq_base[(gramsize,preserve_position, self.log_count)]
-        return_dict = { k:v for k,v in freq_base.items()}
-        if probability and not preserve_position:
-            return_dict = { k:v/freq_base['total'] for k,v in return_dict.items()}
-        elif probability:
-            return_dict = { k:v/freq_base['total'][k[1]]
-                            for k,v in return_dict.items() if k != 'total'}
-        return return_dict
+        Returns
+        -------
+        numpy.ndarray
+            Read-only array of surprisals indexed by segment ID (see
+            SegmentTable), NaN for segments that aren't in the frequency base
+        """
+        table = self.segment_table
+        key = ('surprisal', count_boundaries, len(table))
+        try:
+            return self._freq_base[key]
+        except KeyError:
+            pass
+        freq_base = self.get_frequency_base()
+        total = freq_base['total']
+        if not count_boundaries:
+            total -= freq_base.get(table.boundary, 0)
+        surprisals = np.full(len(table), np.nan)
+        for segment, freq in freq_base.items():
+            if segment == 'total' or segment not in table:
+                continue
+            if not count_boundaries and segment == table.boundary:
+                continue
+            # Same expression as in khorsi, so that the values match exactly
+            surprisals[table[segment]] = math.log(1 / (freq / total))
+        surprisals.flags.writeable = False
+        self._freq_base[key] = surprisals
+        return surprisals
 
     def __exit__(self, exc_type, exc, exc_tb):
+        self._words = None
+        self._frame = None
+        self._deletion_indexes = {}
+        self._substitution_index = None
+        self._phono_index = None
         if exc_type is None:
             return True
         else:
@@ -202,19 +429,18 @@ class CanonicalVariantContext(BaseCorpusContext):
     def __exit__(self, exc_type, exc, exc_tb):
         BaseCorpusContext.__exit__(self, exc_type, exc, exc_tb)
 
-    def __iter__(self):
+    def _iter_views(self):
         for word in self.corpus:
             if self.type_or_token == 'token' and word.frequency == 0:
                 continue
             if self.frequency_threshold > 0 and word.frequency < self.frequency_threshold:
                 continue
-            w = copy.copy(word)
+            frequency = None
             if math.isnan(word.frequency):
-                w.frequency = 0
+                frequency = 0
             elif self.type_or_token == 'type':
-                w.frequency = 1
-            w.original = word
-            yield w
+                frequency = 1
+            yield WordView(word, frequency)
 
 class MostFrequentVariantContext(BaseCorpusContext):
     """
@@ -232,22 +458,23 @@ class MostFrequentVariantContext(BaseCorpusContext):
     def __exit__(self, exc_type, exc, exc_tb):
         BaseCorpusContext.__exit__(self, exc_type, exc, exc_tb)
 
-    def __iter__(self):
+    def _iter_views(self):
         for word in self.corpus:
             if self.type_or_token == 'token' and word.frequency == 0:
                 continue
             if self.frequency_threshold > 0 and word.frequency < self.frequency_threshold:
                 continue
             v = word.variants(self.sequence_type)
-            w = copy.copy(word)
+            frequency = None
+            variant = None
             if math.isnan(word.frequency):
-                w.frequency = 0
+                frequency = 0
             if len(v.keys()) > 0:                                       # Sort variants by most frequent
                 v_sorted = sorted(v.items(), key=operator.itemgetter(1), reverse=True)
                 if len(v_sorted) == 1:                                  # There's only 1 variant
-                    setattr(w, self.sequence_type, v_sorted[0][0])
+                    variant = v_sorted[0][0]
                 elif v_sorted[0][1] != v_sorted[1][1]:                  # There's only one most frequent variant
-                    setattr(w, self.sequence_type, v_sorted[0][0])
+                    variant = v_sorted[0][0]
                 else:                                                   # There're variants tied for frequency
                     highest_freq = v_sorted[0][1]
                     v_candidates = list()
@@ -256,23 +483,25 @@ class MostFrequentVariantContext(BaseCorpusContext):
                             break
                         else:
                             v_candidates.append(vv[0])
-                    if getattr(w, self.sequence_type) in v_candidates:  # Use cannonical variant if it is one of most frequent
+                    if getattr(word, self.sequence_type) in v_candidates:  # Use cannonical variant if it is one of most frequent
                         pass
                     else:
                         v_longest1 = max(v_candidates, key=len)
                         v_candidates.reverse()
                         v_longest2 = max(v_candidates, key=len)
                         if v_longest1 == v_longest2:
-                            setattr(w, self.sequence_type, v_longest1)  # Use longest variant if one exists
+                            variant = v_longest1                        # Use longest variant if one exists
                         else:
                             v_candidates = [vv for vv in v_candidates if len(vv) == len(v_longest1)]
                             v_candidates = sorted(v_candidates)
-                            setattr(w, self.sequence_type, v_candidates[0])  # Use longest variant that is first alphabetically
+                            variant = v_candidates[0]                   # Use longest variant that is first alphabetically
 
             if self.type_or_token == 'type':
-                w.frequency = 1
-            w.original = word
-            yield w
+                frequency = 1
+            if variant is None:
+                yield WordView(word, frequency)
+            else:
+                yield WordView(word, frequency, self.sequence_type, variant)
 
 class SeparatedTokensVariantContext(BaseCorpusContext):
     """
@@ -290,7 +519,7 @@ class SeparatedTokensVariantContext(BaseCorpusContext):
     def __exit__(self, exc_type, exc, exc_tb):
         BaseCorpusContext.__exit__(self, exc_type, exc, exc_tb)
 
-    def __iter__(self):
+    def _iter_views(self):
         for word in self.corpus:
             if math.isnan(word.frequency):
                 continue
@@ -299,25 +528,12 @@ class SeparatedTokensVariantContext(BaseCorpusContext):
             if self.frequency_threshold > 0 and word.frequency < self.frequency_threshold:
                 continue
             variants = word.variants(self.sequence_type)
-            for v in variants:                                      # Create a new word from each variant
-                kwargs = {}
-                if self.sequence_type == 'spelling':
-                    kwargs['spelling'] = v
-                    kwargs['transcription'] = word.transcription
-                    kwargs['frequency'] = variants[v]
-                elif self.sequence_type == 'transcription':
-                    kwargs['spelling'] = word.spelling
-                    kwargs['transcription'] = v
-                    kwargs['frequency'] = variants[v]
-                else:
-                    kwargs['spelling'] = word.spelling
-                    kwargs['transcription'] = word.transcription
-                    kwargs['frequency'] = variants[v]
-                    kwargs[self.sequence_type] = v
+            for v in variants:                                      # One view of the word per variant
                 if self.type_or_token == 'type':
-                    kwargs['frequency'] = 1
-                w = Word(**kwargs)
-                yield w
+                    frequency = 1
+                else:
+                    frequency = variants[v]
+                yield WordView(word, frequency, self.sequence_type, v)
 
 
 class WeightedVariantContext(BaseCorpusContext):
@@ -337,7 +553,7 @@ class WeightedVariantContext(BaseCorpusContext):
     def __exit__(self, exc_type, exc, exc_tb):
         BaseCorpusContext.__exit__(self, exc_type, exc, exc_tb)
 
-    def __iter__(self):
+    def _iter_views(self):
         for word in self.corpus:
             if math.isnan(word.frequency):
                 continue
@@ -348,23 +564,10 @@ class WeightedVariantContext(BaseCorpusContext):
             variants = word.variants(self.sequence_type)
             num_of_variants = len(variants)
             total_variants = sum(variants.values())
-            for v in variants:                                      # Create a new word from each variant
-                kwargs = {}
-                if self.sequence_type == 'spelling':
-                    kwargs['spelling'] = v
-                    kwargs['transcription'] = word.transcription
-                    kwargs['frequency'] = variants[v]/total_variants
-                elif self.sequence_type == 'transcription':
-                    kwargs['spelling'] = word.spelling
-                    kwargs['transcription'] = v
-                    kwargs['frequency'] = variants[v]/total_variants
-                else:
-                    kwargs['spelling'] = word.spelling
-                    kwargs['transcription'] = word.transcription
-                    kwargs['frequency'] = variants[v]/total_variants
-                    kwargs[self.sequence_type] = v
+            for v in variants:                                      # One view of the word per variant
                 if self.type_or_token == 'type':
-                    kwargs['frequency'] = 1/num_of_variants
-                w = Word(**kwargs)
-                yield w
+                    frequency = 1/num_of_variants
+                else:
+                    frequency = variants[v]/total_variants
+                yield WordView(word, frequency, self.sequence_type, v)
 
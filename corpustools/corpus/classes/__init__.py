@@ -1,5 +1,7 @@
 
-from .lexicon import (Corpus, Word, Environment, EnvironmentFilter, FeatureMatrix,
-                      Segment, Transcription, Attribute, )
+from .lexicon import (Corpus, Word, WordView, Environment, EnvironmentFilter, FeatureMatrix,
+                      Segment, Transcription, FrozenTranscription, Attribute, SegmentTable, )
 
 from .spontaneous import Speaker, WordToken, Discourse, SpontaneousSpeechCorpus
+
+from .corpusframe import CorpusFrame
@@ -0,0 +1,191 @@
+from array import array
+
+import numpy as np
+
+
+class CorpusFrame(object):
+    """
+    Columnar store of the Words in a Corpus (or a corpus context), for
+    analyses that iterate or vectorize over all words at once
+
+    Frequencies and numeric attributes are stored as NumPy columns, factor
+    and spelling attributes as categorical codes, and tiers as one flat
+    array of segment IDs plus an array of offsets into it.  Columns are
+    built the first time they are requested.
+
+    Parameters
+    ----------
+    words : list of Words
+        Words to store, in the order they should be indexed
+    segment_table : SegmentTable
+        Symbol table used to encode tiers
+    attributes : list of Attributes, optional
+        Attributes of the Words, used to decide how each column is stored
+    keys : list of str, optional
+        Identifiers of the Words in the Corpus, defaults to their spellings
+
+    Attributes
+    ----------
+    words : list of Words
+        The stored Words, indexed the same way as every column
+    keys : list of str
+        Identifiers of the stored Words
+    """
+    numeric_types = ('numeric', 'frequency', 'freq')
+    factor_types = ('factor', 'spelling')
+
+    def __init__(self, words, segment_table, attributes=None, keys=None):
+        self.words = list(words)
+        if keys is None:
+            keys = [w.spelling for w in self.words]
+        self.keys = list(keys)
+        self.segment_table = segment_table
+        self._att_types = {}
+        if attributes is not None:
+            for a in attributes:
+                self._att_types[a.name] = a.att_type
+        self._columns = {}
+        self._factors = {}
+        self._tiers = {}
+        self._index = None
+
+    def __len__(self):
+        return len(self.words)
+
+    def index(self, key):
+        """
+        Get the row of a Word from its key
+        """
+        if self._index is None:
+            self._index = {k: i for i, k in enumerate(self.keys)}
+        return self._index[key]
+
+    @property
+    def frequency(self):
+        """
+        Frequencies of the Words as a float array
+        """
+        return self.column('frequency')
+
+    def column(self, name):
+        """
+        Get a numeric attribute of every Word as a float array
+
+        Parameters
+        ----------
+        name : str
+            Attribute name
+
+        Returns
+        -------
+        numpy.ndarray
+            Values of the attribute, NaN where a Word lacks it
+        """
+        try:
+            return self._columns[name]
+        except KeyError:
+            pass
+        values = np.empty(len(self.words), dtype=np.float64)
+        for i, w in enumerate(self.words):
+            v = getattr(w, name, None)
+            try:
+                values[i] = v
+            except (TypeError, ValueError):
+                values[i] = np.nan
+        values.flags.writeable = False
+        self._columns[name] = values
+        return values
+
+    def factor(self, name):
+        """
+        Get a factor (or spelling) attribute of every Word as categorical codes
+
+        Parameters
+        ----------
+        name : str
+            Attribute name
+
+        Returns
+        -------
+        numpy.ndarray
+            Integer codes of each Word's value
+        list
+            Categories, indexed by code
+        """
+        try:
+            return self._factors[name]
+        except KeyError:
+            pass
+        categories = []
+        lookup = {}
+        codes = np.empty(len(self.words), dtype=np.int32)
+        for i, w in enumerate(self.words):
+            v = getattr(w, name, None)
+            try:
+                codes[i] = lookup[v]
+            except KeyError:
+                lookup[v] = codes[i] = len(categories)
+                categories.append(v)
+        codes.flags.writeable = False
+        self._factors[name] = (codes, categories)
+        return self._factors[name]
+
+    def tier(self, name):
+        """
+        Get a tier (or any sequence attribute) of every Word as segment IDs
+
+        Parameters
+        ----------
+        name : str
+            Tier name, such as 'transcription' or 'spelling'
+
+        Returns
+        -------
+        numpy.ndarray
+            Segment IDs of all Words, concatenated
+        numpy.ndarray
+            Offsets of each Word's segments in the first array; the segments
+            of Word ``i`` are ``ids[offsets[i]:offsets[i+1]]``
+        """
+        try:
+            return self._tiers[name]
+        except KeyError:
+            pass
+        table = self.segment_table
+        flat = array('H')
+        offsets = np.zeros(len(self.words) + 1, dtype=np.int64)
+        for i, w in enumerate(self.words):
+            seq = getattr(w, name, None)
+            if seq is None:
+                seq = []
+            ids = getattr(seq, 'ids', None)
+            if ids is None or getattr(seq, '_table', None) is not table:
+                ids = table.encode(seq)
+            flat.extend(ids)
+            offsets[i + 1] = len(flat)
+        flat = np.frombuffer(flat, dtype=np.uint16) if len(flat) else np.zeros(0, dtype=np.uint16)
+        flat.flags.writeable = False
+        offsets.flags.writeable = False
+        self._tiers[name] = (flat, offsets)
+        return self._tiers[name]
+
+    def sequence(self, index, tier='transcription'):
+        """
+        Get the segment IDs of a single Word in a tier
+        """
+        flat, offsets = self.tier(tier)
+        return flat[offsets[index]:offsets[index + 1]]
+
+    def lengths(self, tier='transcription'):
+        """
+        Get the number of segments of every Word in a tier
+        """
+        return np.diff(self.tier(tier)[1])
+
+    def __getitem__(self, name):
+        att_type = self._att_types.get(name)
+        if name == 'frequency' or att_type in self.numeric_types:
+            return self.column(name)
+        if att_type in self.factor_types:
+            return self.factor(name)
+        return self.tier(name)
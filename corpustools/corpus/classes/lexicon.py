@@ -6,11 +6,17 @@ import collections
 import operator
 import locale
 import copy
+from array import array
 
 from corpustools.exceptions import CorpusIntegrityError
+from corpustools.corpus.classes.corpusframe import CorpusFrame
 
 SPECIAL_SYMBOL_RE = ['.', '^', '$', '*', '+', '?', '|', '{', '}', '[', ']', '#', '(', ')', '\'', '\"']
 
+# Shared stand-in for empty per-word lists (such as Word.wordtokens),
+# so that words without tokens or alternatives don't each own an empty list
+EMPTY_SEQUENCE = ()
+
 class Segment(object):
     """
     Class for segment symbols
@@ -160,6 +166,109 @@ class Segment(object):
         return len(self.symbol)
 
 
+class SegmentTable(object):
+    """
+    Corpus-wide symbol table that interns segment symbols as small integers
+
+    The word boundary symbol ('#') is always interned first, so it is
+    always encoded as 0.
+
+    Attributes
+    ----------
+    _symbols : list
+        Segment symbols, indexed by their integer ID
+    _ids : dict
+        Dictionary with keys of segment symbols and values of their IDs
+    """
+
+    boundary = '#'
+    max_size = 65536 # IDs are stored as unsigned shorts
+
+    def __init__(self):
+        self._symbols = []
+        self._ids = {}
+        self.intern(self.boundary)
+
+    def intern(self, symbol):
+        """
+        Get the ID of a segment symbol, adding it to the table if necessary
+
+        Parameters
+        ----------
+        symbol : str or Segment
+            Segment symbol to look up
+
+        Returns
+        -------
+        int
+            ID of the symbol
+        """
+        if not isinstance(symbol, str):
+            symbol = getattr(symbol, 'symbol', str(symbol))
+        try:
+            return self._ids[symbol]
+        except KeyError:
+            pass
+        if len(self._symbols) >= self.max_size:
+            raise CorpusIntegrityError('Too many distinct segments to encode ({}).'.format(self.max_size))
+        new_id = len(self._symbols)
+        self._symbols.append(symbol)
+        self._ids[symbol] = new_id
+        return new_id
+
+    def encode(self, symbols):
+        """
+        Encode a sequence of segment symbols as an array of IDs,
+        interning any symbols not already in the table
+
+        Parameters
+        ----------
+        symbols : iterable
+            Segment symbols (or Segments) to encode
+
+        Returns
+        -------
+        array
+            Array of segment IDs (typecode 'H')
+        """
+        return array('H', map(self.intern, symbols))
+
+    def decode(self, ids):
+        """
+        Decode a sequence of segment IDs back into segment symbols
+
+        Parameters
+        ----------
+        ids : iterable of int
+            Segment IDs to decode
+
+        Returns
+        -------
+        list
+            List of segment symbols
+        """
+        return list(map(self._symbols.__getitem__, ids))
+
+    def symbol(self, segment_id):
+        return self._symbols[segment_id]
+
+    @property
+    def symbols(self):
+        return list(self._symbols)
+
+    def __getitem__(self, symbol):
+        return self._ids[symbol]
+
+    def __contains__(self, symbol):
+        return symbol in self._ids
+
+    def __iter__(self):
+        return iter(self._symbols)
+
+    def __len__(self):
+        return len(self._symbols)
+
+
 class Transcription(object):
     """
     Transcription object, sequence of symbols
@@ -173,21 +282,41 @@ class Transcription(object):
     Attributes
     ----------
     _list : list
-        List of strings representing segment symbols
+        List of strings representing segment symbols.  For transcriptions
+        in compact mode this is a view decoded from the segment IDs
+    _ids : array or None
+        Segment IDs from the SegmentTable the transcription was encoded
+        with, None if the transcription has not been encoded
     stress_pattern: dict
         Dictionary with keys of segment indices and values of the stress
         for that segment
     boundaries : dict
         Possible keys of 'morpheme' or 'tone' that keeps track of where
         morpheme or tone boundaries are inserted
+
+    Notes
+    -----
+    The string form, the hash and the word-boundary-padded tuple are
+    computed on first use and cached.  Assigning to ``_list`` clears the
+    cache; code that edits the segments, ``stress_pattern`` or
+    ``boundaries`` in place must call ``invalidate_cache``.  Use
+    ``frozen`` to get a FrozenTranscription for corpora that are not
+    being edited.
     """
+    _cache_attributes = ('_str', '_hash', '_padded')
+
     def __init__(self, seg_list):
         # Note to myself: in the original implementation, seg_list is a list
         # of BaseAnnotation type
 
         # If there is a syllable delimiter, then it's a list of SyllableBaseAnnotation
         self._syllable_list = []  # a list of dictionaries
-        self._list = []
+        self._symbols = []
+        self._ids = None
+        self._table = None
+        self._str = None
+        self._hash = None
+        self._padded = None
         self.stress_pattern = {}
         self.boundaries = {}  # TODO: Don't know when this is used
         cur_group = 0
@@ -286,6 +415,92 @@ class Transcription(object):
                         else:
                             raise(NotImplementedError('That format for seg_list is not supported.'))
 
+    @property
+    def _list(self):
+        if self._symbols is None:
+            return self._table.decode(self._ids)
+        return self._symbols
+
+    @_list.setter
+    def _list(self, value):
+        compact = self._symbols is None
+        self._symbols = value
+        if self._table is not None:
+            self._ids = self._table.encode(value)
+            if compact:
+                self._symbols = None
+        self.invalidate_cache()
+
+    def invalidate_cache(self):
+        """
+        Clear the cached string, hash and padded tuple, needed only after
+        editing the segments, stress or boundaries in place
+        """
+        self._str = None
+        self._hash = None
+        self._padded = None
+
+    def frozen(self):
+        """
+        Get an immutable copy of the transcription
+
+        Returns
+        -------
+        FrozenTranscription
+            Transcription with the same segments, stress and boundaries
+        """
+        return FrozenTranscription(self)
+
+    def thawed(self):
+        return self
+
+    @property
+    def ids(self):
+        """
+        Segment IDs of the transcription, or None if it has not been encoded
+        """
+        return self._ids
+
+    @property
+    def is_compact(self):
+        return self._symbols is None
+
+    def encode(self, table, compact=False):
+        """
+        Encode the transcription's segments as integer IDs from a
+        SegmentTable
+
+        Parameters
+        ----------
+        table : SegmentTable
+            Symbol table to encode with (normally the Corpus' ``segment_table``)
+        compact : bool
+            If True, drop the list of symbols and keep only the array of IDs,
+            the list of symbols will be decoded from the IDs when needed
+
+        Returns
+        -------
+        array
+            Segment IDs of the transcription
+        """
+        if self._ids is None or self._table is not table:
+            self._ids = table.encode(self._list)
+            self._table = table
+        if compact:
+            self._symbols = None
+        elif self._symbols is None:
+            self._symbols = table.decode(self._ids)
+        return self._ids
+
+    @property
+    def padded(self):
+        """
+        Tuple of the segments with word boundaries surrounding them
+        """
+        if self._padded is None:
+            self._padded = ('#',) + tuple(self._list) + ('#',)
+        return self._padded
+
     def with_word_boundaries(self):
         """
         Return the string of segments with word boundaries surrounding them
@@ -295,7 +510,7 @@ class Transcription(object):
         list
             Transcription with word boundaries
         """
-        return ['#'] + self._list + ['#']
+        return list(self.padded)
 
     def with_syllable_and_word_boundaries(self):
         syllable_str = ''
@@ -354,7 +569,8 @@ class Transcription(object):
                 return None
             num_segs = len(environment)
 
-            possibles = zip(*[self.with_word_boundaries()[i:] for i in range(num_segs)])
+            padded = self.padded
+            possibles = zip(*[padded[i:] for i in range(num_segs)])
 
             lhs_num = environment.lhs_count()
             middle_num = lhs_num
@@ -369,7 +585,7 @@ class Transcription(object):
 
             lhsZeroes, rhsZeroes = environment.zeroPositions
             if lhsZeroes:
-                word = [seg for pos,seg in enumerate(self.with_word_boundaries()) if pos not in lhsZeroes]
+                word = [seg for pos,seg in enumerate(padded) if pos not in lhsZeroes]
                 possibles = zip(*[word[i:] for i in range(num_segs)])
                 for i, p in enumerate(possibles):
                     if environment.without_zeroes_contains(p):
@@ -380,7 +596,7 @@ class Transcription(object):
 
             if rhsZeroes:
                 rhsZeroes = [rz+middle_num+1 for rz in rhsZeroes]
-                word = [seg for pos, seg in enumerate(self.with_word_boundaries()) if pos not in rhsZeroes]
+                word = [seg for pos, seg in enumerate(padded) if pos not in rhsZeroes]
                 possibles = zip(*[word[i:] for i in range(num_segs)])
                 for i, p in enumerate(possibles):
                     if environment.without_zeroes_contains(p):
@@ -438,8 +654,8 @@ class Transcription(object):
                 return None
         num_segs = len(environment)
 
-        possibles = zip(*[self.with_word_boundaries()[i:]
-                                for i in range(num_segs)])
+        padded = self.padded
+        possibles = zip(*[padded[i:] for i in range(num_segs)])
         envs = []
         lhs_num = environment.lhs_count()
         middle_num = lhs_num
@@ -464,22 +680,38 @@ class Transcription(object):
 
     def __contains__(self, other):
         if isinstance(other, Segment):
-            if other.symbol in self._list:
-                return True
-        elif isinstance(other, str):
-            if other in self._list:
-                return True
-        return False
+            other = other.symbol
+        elif not isinstance(other, str):
+            return False
+        if self._symbols is None:
+            return other in self._table and self._table[other] in self._ids
+        return other in self._symbols
+
+    def __getstate__(self):
+        # String hashes are salted per process, so the cache is never pickled
+        state = self.__dict__.copy()
+        for k in self._cache_attributes:
+            state.pop(k, None)
+        return state
 
     def __setstate__(self, state):
         if 'stress_pattern' not in state:
             state['stress_pattern'] = {}
         if 'boundaries' not in state:
             state['boundaries'] = {}
+        if '_list' in state:
+            state['_symbols'] = state.pop('_list')
+        if '_ids' not in state:
+            state['_ids'] = None
+            state['_table'] = None
+        for k in self._cache_attributes:
+            state[k] = None
         self.__dict__.update(state)
 
     def __hash__(self):
-        return hash(str(self))
+        if self._hash is None:
+            self._hash = hash(str(self))
+        return self._hash
 
     def __getitem__(self, key):
         if isinstance(key,int) or isinstance(key,slice):
@@ -490,6 +722,11 @@ class Transcription(object):
         return self.__str__()
 
     def __str__(self):
+        if self._str is None:
+            self._str = self._format()
+        return self._str
+
+    def _format(self):
         temp_list = []
         for i,s in enumerate(self._list):
             if self.stress_pattern and i in self.stress_pattern:
@@ -529,6 +766,8 @@ class Transcription(object):
             return True
         if not isinstance(other, Transcription):
             return False
+        if self._hash is not None and other._hash is not None and self._hash != other._hash:
+            return False
         if self._list != other._list:
             return False
         if self.stress_pattern != other.stress_pattern:
@@ -586,13 +825,84 @@ class Transcription(object):
         return not self.__eq__(other)
 
     def __len__(self):
-        return len(self._list)
+        if self._symbols is None:
+            return len(self._ids)
+        return len(self._symbols)
 
     @property
     def list(self):
         return self._list
 
 
+class FrozenTranscription(Transcription):
+    """
+    Immutable Transcription, for corpora that are not being edited
+
+    The string form, hash and padded tuple are computed once when the
+    transcription is created.  Assigning to ``_list``, ``stress_pattern``
+    or ``boundaries`` raises a TypeError.
+
+    Parameters
+    ----------
+    seg_list : Transcription or list
+        Transcription to freeze, or anything accepted by Transcription
+    """
+    _frozen_attributes = ('stress_pattern', 'boundaries', '_syllable_list')
+
+    def __init__(self, seg_list):
+        if isinstance(seg_list, Transcription):
+            state = seg_list.__getstate__()
+            if state['_symbols'] is not None:
+                state['_symbols'] = list(state['_symbols'])
+            state['stress_pattern'] = dict(state['stress_pattern'])
+            state['boundaries'] = copy.deepcopy(state['boundaries'])
+            self.__setstate__(state)
+        else:
+            Transcription.__init__(self, seg_list)
+        self._str = self._format()
+        self._hash = hash(self._str)
+        self._padded = ('#',) + tuple(self._list) + ('#',)
+
+    def __setattr__(self, name, value):
+        if name in self._frozen_attributes and name in self.__dict__:
+            raise TypeError('FrozenTranscription does not support changing {}'.format(name))
+        object.__setattr__(self, name, value)
+
+    @property
+    def _list(self):
+        return Transcription._list.fget(self)
+
+    @_list.setter
+    def _list(self, value):
+        if '_str' in self.__dict__:
+            raise TypeError('FrozenTranscription does not support changing segments')
+        self._symbols = value
+
+    def invalidate_cache(self):
+        pass
+
+    def frozen(self):
+        return self
+
+    def thawed(self):
+        """
+        Get a mutable copy of the transcription
+
+        Returns
+        -------
+        Transcription
+            Transcription with the same segments, stress and boundaries
+        """
+        new = Transcription.__new__(Transcription)
+        state = self.__getstate__()
+        if state['_symbols'] is not None:
+            state['_symbols'] = list(state['_symbols'])
+        state['stress_pattern'] = dict(state['stress_pattern'])
+        state['boundaries'] = copy.deepcopy(state['boundaries'])
+        new.__setstate__(state)
+        return new
+
+
 class FeatureMatrix(object):
     """
     An object that stores feature values for segments
@@ -634,6 +944,10 @@ class FeatureMatrix(object):
         diphthongs from monophthongs
     rounded_feature : str
         Feature value (i.e., '+round') that codes rounded vowels
+    revision : int
+        Number of changes made to the segments and their feature values
+        through the FeatureMatrix's methods, so that anything computed from
+        them can tell when it is out of date
 
 
     """
@@ -651,6 +965,7 @@ class FeatureMatrix(object):
         self.possible_values = set()
         self.matrix = {}
         self._default_value = 'n'
+        self._revision = 0
         if isinstance(feature_entries, FeatureMatrix):
             for attr in self.attributes:
                 if hasattr(feature_entries, attr):
@@ -678,6 +993,11 @@ class FeatureMatrix(object):
     def default_fill(self, seg_list):
         for seg in seg_list:
             self.matrix[seg] = {feature: self.default_value for feature in self._features}
+        self._revision += 1
+
+    @property
+    def revision(self):
+        return self._revision
 
     @property
     def trans_name(self):
@@ -740,6 +1060,8 @@ class FeatureMatrix(object):
         #Backwards compatability
         if '_default_value' not in state:
             self._default_value = 'n'
+        if '_revision' not in state:
+            self._revision = 0
         if 'places' not in state:
             self.places = collections.OrderedDict()
             self.manners = collections.OrderedDict()
@@ -769,6 +1091,7 @@ class FeatureMatrix(object):
             for f in self._features:
                 if f not in v:
                     self.matrix[k][f] = self._default_value
+        self._revision += 1
 
     def set_major_class_features(self, source):
         self.vowel_feature = source.vowel_feature
@@ -813,6 +1136,7 @@ class FeatureMatrix(object):
         # s.set_features(feat_spec)
         # self.matrix[seg] = s._features
         self.matrix[seg] = feat_spec
+        self._revision += 1
 
     def add_feature(self,feature, default = None):
         """
@@ -838,6 +1162,7 @@ class FeatureMatrix(object):
                 for f in self._features:
                     if f not in features:
                         self.matrix[seg][f] = default
+            self._revision += 1
 
 
     def valid_feature_strings(self):
@@ -980,6 +1305,7 @@ class FeatureMatrix(object):
         except KeyError:
             if assign_defaults:
                 self.matrix[symbol] = {feature:'n' for feature in self.features}
+                self._revision += 1
                 features = self.matrix[symbol]
             else:
                 raise KeyError(symbol)
@@ -1000,6 +1326,7 @@ class FeatureMatrix(object):
 
     def __delitem__(self,item):
         del self.matrix[item]
+        self._revision += 1
 
     def __contains__(self,item):
         return item in list(self.matrix.keys())
@@ -1009,6 +1336,7 @@ class FeatureMatrix(object):
             self.matrix[key] = value
         if isinstance(key, Segment):
             self.matrix[key.symbol] = value
+        self._revision += 1
 
     def __len__(self):
         return len(self.matrix)
@@ -1037,6 +1365,13 @@ class Word(object):
                        'descriptors': list()}
     _freq_names = ['abs_freq', 'freq_per_mil', 'sfreq', 'lowercase_freq', 'log10_freq', 'freq', 'frequency']
 
+    # Fixed fields live in slots, user attributes (tiers, spellings, numeric
+    # and factor columns) live in the instance dictionary
+    __slots__ = tuple(word_attributes) + ('__dict__',)
+
+    # Interned descriptor tuples, most words in a corpus share the same ones
+    _descriptor_sets = {}
+
     def __init__(self, **kwargs):
         update = kwargs.pop('update', False)
 
@@ -1046,6 +1381,7 @@ class Word(object):
             return
 
         self.initDefaults()
+        descriptors = []
 
         self._freq_name = kwargs.pop('_freq_name', None)
         self._spelling_name = kwargs.pop('_spelling_name', None)
@@ -1086,9 +1422,9 @@ class Word(object):
                         self._spelling_name = key
                 else:
                     if att.att_type == 'tier':
-                        self.alt_transcriptions.append(key)
+                        self._append_to('alt_transcriptions', key)
                     elif att.att_type == 'spelling':
-                        self.alt_spellings.append(key)
+                        self._append_to('alt_spellings', key)
 
             # the following code is reached when adding a word, not when loading a corpus
             elif isinstance(value, list):
@@ -1134,8 +1470,8 @@ class Word(object):
                     setattr(self, '_frequency', self.Frequency)
                 setattr(self, key, value)
 
-            if key not in self.descriptors:
-                self.descriptors.append(key)
+            if key not in descriptors:
+                descriptors.append(key)
 
         if self.spelling is None and self.transcription is None:
             raise(ValueError('Words must be specified with at least a spelling or a transcription.'))
@@ -1143,12 +1479,13 @@ class Word(object):
             self.Spelling = ''.join(map(str, self._transcription))
             self._spelling = self.Spelling
             self._spelling_name = 'Spelling'
-            if not 'Spelling' in self.descriptors:
-                self.descriptors.append('Spelling')
+            if not 'Spelling' in descriptors:
+                descriptors.append('Spelling')
         if not hasattr(self, 'Frequency'):
-            self.descriptors.append('Frequency')
+            descriptors.append('Frequency')
             self._frequency = 0
             self.Frequency = 0
+        self.descriptors = self._intern_descriptors(descriptors)
 
         if self._transcription_name is None:
             for d in self.descriptors:
@@ -1162,12 +1499,35 @@ class Word(object):
     def initDefaults(self):
         for attribute, default_value in Word.word_attributes.items():
             if isinstance(default_value, list):
-                setattr(self, attribute, [x for x in default_value])
+                # Shared empty sentinel, replaced by a list when something is added
+                setattr(self, attribute, EMPTY_SEQUENCE)
             elif isinstance(default_value, dict):
                 setattr(self, attribute, default_value.copy())
             else:
                 setattr(self, attribute, default_value)
 
+    def _append_to(self, attribute, value):
+        values = getattr(self, attribute)
+        if isinstance(values, list):
+            values.append(value)
+        else:
+            setattr(self, attribute, list(values) + [value])
+
+    def _intern_descriptors(self, descriptors):
+        descriptors = tuple(descriptors)
+        return Word._descriptor_sets.setdefault(descriptors, descriptors)
+
+    def add_wordtoken(self, wordtoken):
+        """
+        Add a WordToken to the Word's list of tokens
+
+        Parameters
+        ----------
+        wordtoken : WordToken
+            Token of the Word
+        """
+        self._append_to('wordtokens', wordtoken)
+
     @property
     def frequency(self):
         # TODO: figure out what different frequencies are doing...
@@ -1230,18 +1590,21 @@ class Word(object):
         for attribute, default_value in Word.word_attributes.items():
             if hasattr(old_word, attribute):
                 setattr(self, attribute, getattr(old_word, attribute))
+            elif isinstance(default_value, list):
+                setattr(self, attribute, EMPTY_SEQUENCE)
             else:
                 setattr(self, attribute, default_value)
             if attribute == '_freq_name':
                 if self._freq_name is None:
                     self._freq_name = 'Frequency'
 
-        if hasattr(old_word, 'wordtokens'):
-            self.wordtokens = list()
-            for wt in old_word.wordtokens:
-                self.wordtokens.append(copy.copy(wt))
+        if old_word.wordtokens:
+            self.wordtokens = [copy.copy(wt) for wt in old_word.wordtokens]
+        else:
+            self.wordtokens = EMPTY_SEQUENCE
 
-        self.descriptors.extend([att for att in Word.word_attributes if not att.startswith('_')])
+        descriptors = list(self.descriptors)
+        descriptors.extend([att for att in Word.word_attributes if not att.startswith('_')])
 
         if not self._transcription:
             try:
@@ -1254,7 +1617,7 @@ class Word(object):
 
             self.Transcription = self._transcription
             self._transcription_name = 'Transcription'
-            self.descriptors.append('Transcription')
+            descriptors.append('Transcription')
 
         if not self._spelling:
             try:
@@ -1267,23 +1630,23 @@ class Word(object):
 
             self.Spelling = self._spelling
             self._spelling_name = 'Spelling'
-            self.descriptors.append('Spelling')
+            descriptors.append('Spelling')
 
         try:
             self.Frequency = old_word.frequency
         except AttributeError:
             self.Frequency = old_word.Frequency
         try:
-            self.descriptors.remove('_frequency')
+            descriptors.remove('_frequency')
         except ValueError:
             pass
         try:
-            self.descriptors.remove('frequency')
+            descriptors.remove('frequency')
         except ValueError:
             pass
-        self.descriptors.append('Frequency')
+        descriptors.append('Frequency')
 
-        self.descriptors = list(set(self.descriptors))
+        self.descriptors = self._intern_descriptors(sorted(set(descriptors)))
 
     def get_len(self, tier_name):
         return len(getattr(self, tier_name))
@@ -1304,6 +1667,11 @@ class Word(object):
 
     def __getstate__(self):
         state = self.__dict__.copy()
+        for attribute in Word.word_attributes:
+            try:
+                state[attribute] = getattr(self, attribute)
+            except AttributeError:
+                pass
         # state['wordtokens'] = []
         # state['_corpus'] = None
         # for k,v in state.items():
@@ -1312,22 +1680,33 @@ class Word(object):
         return state
 
     def __setstate__(self, state):
+        if isinstance(state, tuple):
+            # Default slot pickling format, (dict, slots)
+            state = dict(state[0] or {}, **(state[1] or {}))
+        self.initDefaults()
         self._transcription = []
         self._spelling = ''
         self._frequency = 0
         if 'wordtokens' not in state:
             state['wordtokens'] = []
-        if 'descriptors' not in state:
-            state['descriptors'] = ['_spelling','_transcription', '_frequency']
-        if '_frequency' not in state['descriptors']:
-            state['descriptors'].append('_frequency')
+        descriptors = list(state.get('descriptors', ['_spelling','_transcription', '_frequency']))
+        if '_frequency' not in descriptors:
+            descriptors.append('_frequency')
         try:
             tiers = state.pop('tiers')
             for t in tiers:
-                state['descriptors'].append(t)
+                descriptors.append(t)
         except KeyError:
             pass
-        self.__dict__.update(state)
+        state['descriptors'] = self._intern_descriptors(descriptors)
+        for attribute in ('wordtokens', 'alt_transcriptions', 'alt_spellings'):
+            if attribute in state and not state[attribute]:
+                state[attribute] = EMPTY_SEQUENCE
+        for attribute, value in state.items():
+            if attribute in Word.word_attributes:
+                setattr(self, attribute, value)
+            else:
+                self.__dict__[attribute] = value
 
     def add_abstract_tier(self, tier_name, tier_segments):
         """
@@ -1453,6 +1832,79 @@ class Word(object):
     def __ge__(self, other):
         return self.spelling >= other.spelling
 
+
+class WordView(Word):
+    """
+    Read-only view of a Word, as used by corpus contexts
+
+    A view has all the attributes of the Word it is made from, except for
+    the frequency adjusted by the context and, for variant contexts, the
+    tier replaced by the chosen variant.  Views share their values with
+    the original Word rather than copying them.
+
+    Parameters
+    ----------
+    word : Word
+        Word in the Corpus
+    frequency : float, optional
+        Frequency to use instead of the Word's frequency
+    sequence_type : str, optional
+        Tier to replace with ``variant``
+    variant : Transcription or str, optional
+        Pronunciation (or spelling) variant to use for ``sequence_type``
+
+    Attributes
+    ----------
+    original : Word
+        The Word in the Corpus, to set results of analyses on
+    """
+    __slots__ = ('original',)
+
+    def __init__(self, word, frequency=None, sequence_type=None, variant=None):
+        if isinstance(word, WordView):
+            word = word.original
+        set_slot = object.__setattr__
+        for attribute in Word.word_attributes:
+            try:
+                set_slot(self, attribute, getattr(word, attribute))
+            except AttributeError:
+                pass
+        set_slot(self, 'original', word)
+        attributes = self.__dict__
+        attributes.update(word.__dict__)
+        if frequency is not None:
+            attributes['Frequency'] = frequency
+        if sequence_type is not None:
+            if sequence_type == 'transcription':
+                set_slot(self, '_transcription', variant)
+                sequence_type = self._transcription_name
+            elif sequence_type == 'spelling':
+                set_slot(self, '_spelling', variant)
+                sequence_type = self._spelling_name
+            if sequence_type is not None:
+                attributes[sequence_type] = variant
+
+    def __setattr__(self, name, value):
+        raise AttributeError('Words in a corpus context are read-only, '
+                             'set \'{}\' on the original Word instead'.format(name))
+
+    def __delattr__(self, name):
+        raise AttributeError('Words in a corpus context are read-only, '
+                             'delete \'{}\' from the original Word instead'.format(name))
+
+    def __getstate__(self):
+        state = Word.__getstate__(self)
+        state['original'] = self.original
+        return state
+
+    def __setstate__(self, state):
+        for attribute, value in state.items():
+            if attribute in Word.word_attributes or attribute == 'original':
+                object.__setattr__(self, attribute, value)
+            else:
+                self.__dict__[attribute] = value
+
+
 class SyllableEnvironment(object):
     def __init__(self, start, middle, lhs, rhs):
         self._start = start
@@ -2634,13 +3086,28 @@ class Corpus(object):
 
     inventory : Inventory
         Inventory that contains information about segments in the Corpus
+
+    segment_table : SegmentTable
+        Symbol table that maps the segments of the Corpus to integer IDs
+
+    compact_transcriptions : bool
+        If True, tiers of Words are stored as arrays of segment IDs,
+        see ``encode_transcriptions``
+
+    frame : CorpusFrame
+        Columnar view of the Words, built when first requested and rebuilt
+        after Words or Attributes are added or removed
+
+    _homographs : dict
+        Index from each spelling to the keys of the Words with that spelling,
+        in the order they were added
     """
 
     corpus_attributes = {'name':'corpus', 'wordlist': dict(), '_discourse': None,
                   'specifier': None, 'inventory': None, 'inventoryModel': None, 'has_frequency': True,
                   'has_spelling':False, 'has_wordtokens':False, 'has_audio': False, 'wav_path': None,
-                  '_attributes': list(),
-                  '_version': currentPCTversion
+                  '_attributes': list(), 'segment_table': None, 'compact_transcriptions': False,
+                  '_frame': None, '_homographs': dict(), '_version': currentPCTversion
                     }
     basic_attributes = ['spelling','transcription','frequency']
 
@@ -2656,6 +3123,8 @@ class Corpus(object):
         for attribute, default_value in Corpus.corpus_attributes.items():
             if attribute == 'inventory':
                 setattr(self, attribute, Inventory())
+            elif attribute == 'segment_table':
+                setattr(self, attribute, SegmentTable())
             # elif attribute == '_attributes':
             #     setattr(self, attribute, [Attribute('spelling', 'spelling'),
             #                               Attribute('transcription', 'tier'),
@@ -2674,13 +3143,64 @@ class Corpus(object):
                 setattr(self, attribute, getattr(old_corpus, attribute))
             else:
                 setattr(self, attribute, default_value)
+        if self.segment_table is None:
+            self.segment_table = SegmentTable()
+        self._build_homograph_index()
         self._version = currentPCTversion
 
     def update_wordlist(self, new_wordlist):
         self.wordlist = dict()
+        self._homographs = dict()
+        self._frame = None
         for word in new_wordlist:
             self.add_word(word)
 
+    def _build_homograph_index(self):
+        self._homographs = dict()
+        for key, word in self.wordlist.items():
+            self._index_homograph(key, word)
+
+    def _index_homograph(self, key, word):
+        try:
+            self._homographs[word.spelling][key] = None
+        except KeyError:
+            self._homographs[word.spelling] = {key: None}
+
+    def _unindex_homograph(self, key, word):
+        keys = self._homographs.get(word.spelling)
+        if keys is None:
+            return
+        keys.pop(key, None)
+        if not keys:
+            del self._homographs[word.spelling]
+
+    def _free_key(self, spelling):
+        # Homographs are keyed as 'spelling', 'spelling (1)', 'spelling (2)', ...
+        n = len(self._homographs.get(spelling, ()))
+        key = spelling if n == 0 else '{} ({})'.format(spelling, n)
+        while key in self.wordlist:
+            n += 1
+            key = '{} ({})'.format(spelling, n)
+        return key
+
+    @property
+    def frame(self):
+        """
+        Columnar store of the Words of the Corpus (see CorpusFrame).
+
+        Changes made through the Corpus (adding or removing Words and
+        Attributes) are reflected the next time the frame is accessed.
+        Words that are edited directly should be followed by a call to
+        ``invalidate_frame``.
+        """
+        if self._frame is None:
+            self._frame = CorpusFrame(list(self.wordlist.values()), self.segment_table,
+                                      self._attributes, keys=list(self.wordlist.keys()))
+        return self._frame
+
+    def invalidate_frame(self):
+        self._frame = None
+
     @property
     def has_transcription(self):
         for a in self.attributes:
@@ -2715,7 +3235,7 @@ class Corpus(object):
                     except AttributeError:
                         pass
                 for wt in w.wordtokens:
-                    sw.wordtokens.append(copy.copy(wt))
+                    sw.add_wordtoken(copy.copy(wt))
             except KeyError:
                 self.add_word(copy.copy(w))
         if self.specifier is None and other.specifier is not None:
@@ -2725,18 +3245,12 @@ class Corpus(object):
         return self
 
     def key(self, word):
-        key = word.spelling
-        if self[key] == word:
-            return key
-        count = 0
-        while True:
-            count += 1
-            key = '{} ({})'.format(word.spelling,count)
-            try:
-                if self[key] == word:
-                    return key
-            except KeyError:
-                break
+        keys = self._homographs.get(word.spelling)
+        if not keys:
+            raise KeyError('The word \"{}\" is not in the corpus'.format(word.spelling))
+        for key in keys:
+            if self.wordlist[key] == word:
+                return key
 
 
     def keys(self):
@@ -2785,6 +3299,7 @@ class Corpus(object):
     def retranscribe(self, segmap):
 
         self.inventory = Inventory()
+        self._frame = None
         for word in self.wordlist:
             T = Transcription([segmap[seg] for seg in self.wordlist[word].transcription])
             self.wordlist[word].transcription = T
@@ -2939,6 +3454,7 @@ class Corpus(object):
         spec : dict
             Mapping for creating abstract tier
         """
+        self._frame = None
         for i,a in enumerate(self._attributes):
             if attribute.name == a.name:
                 self._attributes[i] = attribute
@@ -2962,6 +3478,7 @@ class Corpus(object):
             If True, words will have this attribute set to the ``default_value``
             of the attribute, defaults to False
         """
+        self._frame = None
         for i,a in enumerate(self._attributes):
             if attribute.display_name == a.display_name:
                 self._attributes[i] = attribute
@@ -2994,6 +3511,7 @@ class Corpus(object):
         """
         if isinstance(attribute,str):
             attribute = Attribute(attribute,'numeric')
+        self._frame = None
         for i,a in enumerate(self._attributes):
             if attribute.name == a.name:
                 self._attributes[i] = attribute
@@ -3027,6 +3545,7 @@ class Corpus(object):
         """
         if isinstance(attribute,str):
             attribute = Attribute(attribute, 'tier')
+        self._frame = None
         for i,a in enumerate(self._attributes):
             if attribute.name == a.name:
                 self._attributes[i] = attribute
@@ -3053,9 +3572,12 @@ class Corpus(object):
             Identifier to use to remove the Word
         """
         try:
-            del self.wordlist[word_key]
+            word = self.wordlist.pop(word_key)
         except KeyError:
             pass
+        else:
+            self._unindex_homograph(word_key, word)
+            self._frame = None
 
     def remove_attribute(self, attribute):
         """
@@ -3072,6 +3594,7 @@ class Corpus(object):
             name = attribute.name
         if name in self.basic_attributes:
             return
+        self._frame = None
         for i in range(len(self._attributes)):
             if self._attributes[i].name == name:
                 del self._attributes[i]
@@ -3082,7 +3605,9 @@ class Corpus(object):
             word.remove_attribute(name)
 
     def __getstate__(self):
-        state = self.__dict__
+        state = self.__dict__.copy()
+        state['_frame'] = None
+        state.pop('_homographs', None)
         return state
 
     def __setstate__(self, state):
@@ -3099,6 +3624,10 @@ class Corpus(object):
                 state['has_wordtokens'] = False
             if '_freq_base' in state:
                 del state['_freq_base']
+            if 'segment_table' not in state:
+                state['segment_table'] = SegmentTable()
+                state['compact_transcriptions'] = False
+            state['_frame'] = None
             if '_attributes' not in state:
                 state['_attributes'] = [Attribute('spelling','spelling'),
                                         Attribute('transcription','tier'),
@@ -3110,6 +3639,7 @@ class Corpus(object):
                 except KeyError:
                     pass
             self.__dict__.update(state)
+            self._build_homograph_index()
             #Backwards compatability
             for k,w in self.wordlist.items():
                 w._corpus = self
@@ -3229,45 +3759,40 @@ class Corpus(object):
 
         """
         word._corpus = self
+        self._frame = None
         tokens = word.wordtokens[:]  # only becomes relevant when same spelling but different transcription?
 
-        #If the word doesn't exist, add it
-        try:
-            check = self.find(word.spelling)
-            if allow_duplicates:
-                #Some words have more than one entry in a corpus, e.g. "live" and "live"
-                #so they need to be assigned unique keys
-
-                n = 0
-                while True:
-                    n += 1
-                    key = '{} ({})'.format(word.spelling, n)
-                    try:
-                        check = self.find(key)
-                    except KeyError:
-                        if word.frequency == 0:
-                            word.frequency += 1
-                        self.wordlist[key] = word
-                        break
-            else:
-                check.frequency += word.frequency if word.frequency != 0 else 1
-                check.wordtokens.extend(tokens)
-                return
-        except KeyError:
-            if word.frequency == 0:
-                word.frequency += 1
+        homographs = self._homographs.get(word.spelling)
+        if homographs and not allow_duplicates:
+            check = self.wordlist[next(iter(homographs))]
+            check.frequency += word.frequency if word.frequency != 0 else 1
+            for token in tokens:
+                check.add_wordtoken(token)
+            return
 
-            self.wordlist[word.spelling] = word  #copy.copy(word)
-            if word.spelling is not None:
-                if not self.has_spelling:
-                    self.has_spelling = True
+        #Some words have more than one entry in a corpus, e.g. "live" and "live"
+        #so they need to be assigned unique keys
+        key = self._free_key(word.spelling)
+        if word.frequency == 0:
+            word.frequency += 1
+        self.wordlist[key] = word  #copy.copy(word)
+        self._index_homograph(key, word)
+        if not homographs and word.spelling is not None:
+            if not self.has_spelling:
+                self.has_spelling = True
 
         added_default = False
         if word.transcription is not None:
             added_default = self.update_inventory(word.transcription)
             #added_default == True if the word contains symbols not found in the feature file
             #in this case, the symbol has been given a default value of 'n' for every feature
-            word.transcription._list = [self.inventory[x].symbol for x in word.transcription._list]
+            symbols = [self.inventory[x].symbol for x in word.transcription._list]
+            if symbols != word.transcription._list:
+                word.transcription._list = symbols
+            if self.compact_transcriptions:
+                self._encode_word(word, compact=True)
+            else:
+                self.segment_table.encode(word.transcription._list)
 
         for d in word.descriptors:
             if d not in self._attributes:
@@ -3286,6 +3811,57 @@ class Corpus(object):
 
         return added_default
 
+    def _encode_word(self, word, compact=False):
+        for a in self._attributes:
+            if a.att_type != 'tier':
+                continue
+            tier = getattr(word, a.name, None)
+            if isinstance(tier, Transcription):
+                tier.encode(self.segment_table, compact=compact)
+        if isinstance(word.transcription, Transcription):
+            word.transcription.encode(self.segment_table, compact=compact)
+
+    def encode_transcriptions(self, compact=True):
+        """
+        Encode the tiers of every Word in the Corpus as arrays of segment IDs
+        from the Corpus' ``segment_table``.
+
+        Encoded transcriptions keep their list and string interface, but
+        algorithms can work on the integer IDs (see ``Transcription.ids``).
+
+        Parameters
+        ----------
+        compact : bool
+            If True, transcriptions only store the IDs, which uses much less
+            memory, and Words added afterwards are also stored compactly.
+            If False, the lists of symbols are kept alongside the IDs.
+        """
+        for word in self:
+            self._encode_word(word, compact=compact)
+        self.compact_transcriptions = compact
+
+    def freeze_transcriptions(self, frozen=True):
+        """
+        Replace the tiers of every Word in the Corpus with immutable
+        FrozenTranscriptions, whose string forms and hashes are computed
+        once, or turn them back into editable Transcriptions
+
+        Parameters
+        ----------
+        frozen : bool
+            If True, freeze the tiers, otherwise thaw them
+        """
+        for word in self:
+            for a in self._attributes:
+                if a.att_type != 'tier':
+                    continue
+                tier = getattr(word, a.name, None)
+                if isinstance(tier, Transcription):
+                    setattr(word, a.name, tier.frozen() if frozen else tier.thawed())
+            if isinstance(word.transcription, Transcription):
+                tier = word.transcription
+                word.transcription = tier.frozen() if frozen else tier.thawed()
+
     def update_features(self):
         for seg in self.inventory:
             if seg.symbol == '#':
@@ -3412,17 +3988,13 @@ class Corpus(object):
             patterns.append(word.lower())
             patterns.append(word.title())
         for w in patterns:
-            key = w
             try:
-                result = self.wordlist[w]
-                return result
+                return self.wordlist[w]
             except KeyError:
-                try:
-                    key = '{} (1)'.format(w)
-                    result = self.wordlist[key]
-                    return result
-                except KeyError:
-                    pass
+                pass
+            keys = self._homographs.get(w)
+            if keys:
+                return self.wordlist[next(iter(keys))]
 
         raise KeyError('The word \"{}\" is not in the corpus'.format(word))
 
@@ -3440,19 +4012,7 @@ class Corpus(object):
         list of Words
             Words that have the specified spelling
         """
-        words = list()
-        try:
-            words.append(self.wordlist[spelling])
-            count = 0
-            while True:
-                count += 1
-                try:
-                    words.append(self.wordlist['{} ({})'.format(spelling,count)])
-                except KeyError:
-                    break
-        except KeyError:
-            pass
-        return words
+        return [self.wordlist[k] for k in self._homographs.get(spelling, ())]
 
     def __contains__(self,item):
         return self.wordlist.__contains__(item)
@@ -3461,7 +4021,13 @@ class Corpus(object):
         return len(self.wordlist)
 
     def __setitem__(self,item,value):
+        try:
+            self._unindex_homograph(item, self.wordlist[item])
+        except KeyError:
+            pass
         self.wordlist[item] = value
+        self._index_homograph(item, value)
+        self._frame = None
 
     def __getitem__(self,item):
         return self.wordlist[item]
@@ -346,7 +346,7 @@ class Discourse(object):
                                              transcription=token.wordtype.transcription)
             word.frequency += 1
             token.wordtype = word
-            word.wordtokens.append(token)
+            word.add_wordtoken(token)
         return corpus
 
     def find_wordtype(self, wordtype):
@@ -429,7 +429,12 @@ class WordToken():
 
     """
     wordtoken_attributes = {'wordtype': None, 'discourse': None, 'speaker': None, 'wavpath': None, 'begin': None,
-                            'end': None, '_spelling': None, '_transcription': None, '_freq_names': None}
+                            'end': None, '_spelling': None, '_transcription': None}
+    _freq_names = ('abs_freq', 'freq_per_mil', 'sfreq', 'lowercase_freq', 'log10_freq')
+
+    # Fixed fields live in slots, user attributes live in the instance dictionary
+    __slots__ = tuple(wordtoken_attributes) + ('__dict__',)
+
     def __init__(self,update=False,**kwargs):
 
         if update:
@@ -442,11 +447,8 @@ class WordToken():
         self.wavpath = None
         self.begin = kwargs.pop('begin')
         self.end = kwargs.pop('end')
-        self.begins = self.begin
-        self.ends = self.end
         self._spelling = None
         self._transcription = None
-        self._freq_names = ['abs_freq', 'freq_per_mil', 'sfreq', 'lowercase_freq', 'log10_freq']
 
         for key, value in kwargs.items():
             if not all([letter.isupper() for letter in key]):
@@ -519,11 +521,27 @@ class WordToken():
 
     def __getstate__(self):
         state = self.__dict__.copy()
+        for attribute in WordToken.wordtoken_attributes:
+            try:
+                state[attribute] = getattr(self, attribute)
+            except AttributeError:
+                pass
         state['wavpath'] = None
         return state
 
     def __setstate__(self, state):
-        self.__dict__.update(state)
+        if isinstance(state, tuple):
+            # Default slot pickling format, (dict, slots)
+            state = dict(state[0] or {}, **(state[1] or {}))
+        for attribute, default_value in WordToken.wordtoken_attributes.items():
+            setattr(self, attribute, default_value)
+        for attribute, value in state.items():
+            if attribute in WordToken.wordtoken_attributes:
+                setattr(self, attribute, value)
+            elif attribute in ('begins', 'ends', '_freq_names'):
+                continue # older versions stored copies of begin/end and the class' frequency names
+            else:
+                self.__dict__[attribute] = value
 
     def __eq__(self, other):
         if not isinstance(other,WordToken):
@@ -567,6 +585,14 @@ class WordToken():
     def duration(self):
         return self.end - self.begin
 
+    @property
+    def begins(self):
+        return self.begin
+
+    @property
+    def ends(self):
+        return self.end
+
     @property
     def spelling(self):
         if self._spelling is not None:
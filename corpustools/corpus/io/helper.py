@@ -734,7 +734,7 @@ def data_to_discourse2(corpus_name=None, wav_path=None, annotation_types=None, s
         word_token = WordToken(**word_token_kwargs)
         discourse.add_word(word_token)
         if any(a.token for a in annotations):
-            word.wordtokens.append(word_token)
+            word.add_wordtoken(word_token)
         ind += 1
     return discourse
 
@@ -813,7 +813,7 @@ def data_to_discourse(data, lexicon = None, call_back=None, stop_check=None):
                 word_token_kwargs['end'] = ind + 1
             wordtoken = WordToken(**word_token_kwargs)
             word.frequency += 1
-            word.wordtokens.append(wordtoken)
+            word.add_wordtoken(wordtoken)
             d.add_word(wordtoken)
             ind += 1
     return d
@@ -272,7 +272,7 @@ def load_discourse_multiple_files(corpus_name, word_path, phone_path, dialect,
                 if at.token:
                     word_token_kwargs['_transcription'] = (at.attribute, w['transcription'])
         word_token = WordToken(**word_token_kwargs)
-        word.wordtokens.append(word_token)
+        word.add_wordtoken(word_token)
         discourse.lexicon.add_word(word)
         discourse.add_word(word_token)
         ind += 1
@@ -1,13 +1,85 @@
 #fun times with morphological relatedness
+from functools import partial
+
 import corpustools.symbolsim.phono_align as pam
-from corpustools.symbolsim.string_similarity import string_similarity
+from corpustools.symbolsim.edit_distance import batch_edit_distance, pack_sequences
+from corpustools.symbolsim.khorsi import batch_khorsi
+from corpustools.exceptions import StringSimilarityError
+from corpustools.multiproc import get_backend, index_ranges
 from .io import print_freqalt_results
 
 
+def _edit_distance_scores(flat, offsets, max_rel, query):
+    return batch_edit_distance(query, flat, offsets, max_distance = max_rel).tolist()
+
+
+def _khorsi_scores(flat, offsets, surprisals, min_rel, query):
+    return batch_khorsi(query, flat, offsets, surprisals, min_score = min_rel).tolist()
+
+
+def _phono_edit_distance_scores(aligner, sequences, max_rel, query):
+    # Words whose lengths differ by more than max_rel / (cheapest insertion
+    # or deletion) can't be within max_rel, so they are not aligned
+    scores = []
+    for seq in sequences:
+        if max_rel is not None and abs(len(seq) - len(query)) * aligner.min_indel_cost > max_rel:
+            scores.append(None)
+        else:
+            scores.append(aligner.distance(query, seq))
+    return scores
+
+
+def _find_related(corpus_context, list_seg1, list_seg2, seg1, seg2,
+                  min_rel, max_rel, min_pairs_okay, aligner, score_words, encode, start, stop):
+    """Compare a range of the words containing seg1 with all the words
+    containing seg2, returning the related pairs as indices into the two
+    lists along with their relatedness
+
+    score_words scores a word containing seg1 (encoded by encode) against
+    all the words containing seg2 at once, giving None for the words it
+    has ruled out"""
+    related = []
+    sequence_type = corpus_context.sequence_type
+    for i in range(start, stop):
+        w1 = list_seg1[i]
+        scores = score_words(encode(getattr(w1, sequence_type)))
+        for j, w2 in enumerate(list_seg2):
+            if w1 == w2:
+                continue
+            score = scores[j]
+            if score is None:
+                continue
+            if min_rel is not None and score < min_rel:
+                continue
+            if max_rel is not None and score > max_rel:
+                continue
+            if not min_pairs_okay:
+                if len(w1.transcription) == len(w2.transcription):
+                    count_diff = 0
+                    for k in range(len(w1.transcription)):
+                        if w1.transcription[k] != w2.transcription[k]:
+                            count_diff += 1
+                            if count_diff > 1:
+                                break
+                    if count_diff == 1:
+                        continue
+            if aligner is not None:
+                alignment = aligner.align(w1.transcription, w2.transcription)
+                if not aligner.morpho_related(alignment, seg1, seg2):
+                    continue
+
+            related.append((i, j, score))
+    return related
+
+
+def _symbols(sequence):
+    return [str(s) for s in sequence]
+
+
 def calc_freq_of_alt(corpus_context, seg1, seg2, algorithm, output_filename = None,
                     min_rel = None, max_rel = None, phono_align = False,
                     min_pairs_okay = False, stop_check = None,
-                    call_back = None):
+                    call_back = None, num_cores = -1):
     """Returns a double that is a measure of the frequency of
     alternation of two sounds in a given corpus
 
@@ -36,6 +108,9 @@ def calc_freq_of_alt(corpus_context, seg1, seg2, algorithm, output_filename = No
         Optional function to check whether to gracefully terminate early
     call_back : callable, optional
         Optional function to supply progress information during the function
+    num_cores : int, optional
+        Number of cores to compare the words with, -1 (default) to compare
+        them serially
 
     Returns
     -------
@@ -65,45 +140,39 @@ def calc_freq_of_alt(corpus_context, seg1, seg2, algorithm, output_filename = No
             list_seg2.append(w)
             all_words.add(w.spelling)
 
+    backend = get_backend(num_cores)
+    ranges = list(index_ranges(len(list_seg1), backend.num_procs, max_size = 10))
     if call_back is not None:
         call_back('Calculating string similarities...')
-        call_back(0, len(list_seg1) * len(list_seg2))
-        cur = 0
-    related_list = []
+        call_back(0, len(ranges))
+    al = None
     if phono_align:
-        al = pam.Aligner(features = corpus_context.specifier)
-    for w1 in list_seg1:
-        for w2 in list_seg2:
-            if stop_check is not None and stop_check():
-                return
-            if call_back is not None:
-                cur += 1
-                if cur % 1000 == 0:
-                    #print(len(related_list))
-                    call_back(cur)
-            if w1 == w2:
-                continue
-            ss = string_similarity(corpus_context, (w1,w2), algorithm)
-            if min_rel is not None and ss[0][-1] < min_rel:
-                continue
-            if max_rel is not None and ss[0][-1] > max_rel:
-                continue
-            if not min_pairs_okay:
-                if len(w1.transcription) == len(w2.transcription):
-                    count_diff = 0
-                    for i in range(len(w1.transcription)):
-                        if w1.transcription[i] != w2.transcription[i]:
-                            count_diff += 1
-                            if count_diff > 1:
-                                break
-                    if count_diff == 1:
-                        continue
-            if phono_align:
-                alignment = al.align(w1.transcription, w2.transcription)
-                if not al.morpho_related(alignment, seg1, seg2):
-                    continue
-
-            related_list.append(ss[0])
+        al = pam.get_aligner(corpus_context.specifier)
+    # The relatedness of each word containing seg1 to all the words
+    # containing seg2 is computed at once, with the same scores as
+    # string_similarity
+    sequence_type = corpus_context.sequence_type
+    if algorithm in ('edit_distance', 'khorsi'):
+        encode = corpus_context.segment_table.encode
+        flat, offsets = pack_sequences([encode(getattr(w, sequence_type)) for w in list_seg2])
+        if algorithm == 'edit_distance':
+            score_words = partial(_edit_distance_scores, flat, offsets, max_rel)
+        else:
+            surprisals = corpus_context.segment_surprisals(count_boundaries = False)
+            score_words = partial(_khorsi_scores, flat, offsets, surprisals, min_rel)
+    elif algorithm == 'phono_edit_distance':
+        encode = _symbols
+        score_words = partial(_phono_edit_distance_scores, pam.get_aligner(corpus_context.specifier),
+                              [_symbols(getattr(w, sequence_type)) for w in list_seg2], max_rel)
+    else:
+        raise(StringSimilarityError('{} is not a possible string similarity algorithm.'.format(algorithm)))
+    function = partial(_find_related, corpus_context, list_seg1, list_seg2,
+                       seg1, seg2, min_rel, max_rel, min_pairs_okay, al, score_words, encode)
+    results = backend.map(function, ranges, call_back = call_back, stop_check = stop_check)
+    if results is None:
+        return
+    related_list = [(list_seg1[i], list_seg2[j], score)
+                    for related in results for i, j, score in related]
 
     words_with_alt = set()
     if call_back is not None:
@@ -1,16 +1,13 @@
 import regex as re
 import numpy as np
-from scipy import sparse
 from collections import defaultdict
 from math import *
 import itertools
 from math import factorial
-import time
-from sklearn.feature_extraction import DictVectorizer
 
 from corpustools.exceptions import FuncLoadError
-from corpustools.funcload.io import save_minimal_pairs
-from corpustools.corpus.classes.lexicon import EnvironmentFilter
+from corpustools.funcload.io import save_minimal_pairs, save_functional_loads
+from corpustools.symbolsim.substitution_index import MASK
 
 
 def is_minpair(first, second, corpus_context, segment_pairs, environment_filter):
@@ -133,38 +130,20 @@ def deltah_fl_vectorized(corpus_context, segment_pairs,
                               if other.symbol != seg_pair[0] and other.symbol != '#'})
                   if len(seg_pair) == 1 else (seg_pair, {seg_pair}) for seg_pair in segment_pairs]
 
-    neutralize_dicts = []
-
-    orig_string = defaultdict(float)  # {'mata': 1.5} for vectorization
-    orig_transcription = defaultdict(float)  # {m.a.t.a: 1.5} for neutralization
-
-    if call_back is not None:
-        call_back('Building original dictionary...')
-        call_back(0, len(corpus_context))
-        cur = 0
-
-    for w in corpus_context:
-
-        if stop_check is not None and stop_check():
-            return
-        if call_back is not None:
-            cur += 1
-            if cur % 100 == 0:
-                call_back(cur)
-
-        trans = getattr(w, corpus_context.sequence_type)
-        string = ''.join(trans.with_word_boundaries())
-        orig_string[string] += w.frequency
-        orig_transcription[trans] += w.frequency
-
-    neutralize_dicts.append(orig_string)
+    # Each distinct transcription is encoded once, and the environments are
+    # compiled once; each pair only neutralizes the words containing it
+    index = NeutralizationIndex(corpus_context, environment_filter=environment_filter)
+    type_or_token = corpus_context.type_or_token
+    orig_entropy = index.entropy(type_or_token)
 
     if call_back is not None:
         call_back('Neutralizing words...')
-        call_back(0, len(pair_dicts))
+        call_back(0, sum(len(neutralized_pairs) for _, neutralized_pairs in pair_dicts))
         cur = 0
 
+    result = []
     for specified_pair, neutralized_pairs in pair_dicts:
+        calc = []
         for pair in neutralized_pairs:
 
             if stop_check is not None and stop_check():
@@ -174,51 +153,157 @@ def deltah_fl_vectorized(corpus_context, segment_pairs,
                 if cur % 100 == 0:
                     call_back(cur)
 
-            # TODO: speed up environment filter function
-            if environment_filter:
-                filled_environments = [EnvironmentFilter(pair, env.lhs, env.rhs)
-                                       for env in environment_filter]
-            else:
-                filled_environments = [EnvironmentFilter(middle_segments=pair,
-                                                         lhs=list(),
-                                                         rhs=list())]
+            calc.append(index.entropy_change(pair, type_or_token))
 
-            neutralized = defaultdict(float)
-            for word, freq in orig_transcription.items():
-                neutral = neutralize_with_all_envs(word, filled_environments)
-                neutralized[neutral] += freq
-            neutralize_dicts.append(neutralized)
+        fl = sum(calc) / len(calc)
+        fl = fl if fl > 1e-10 else 0.0
+        result.append((specified_pair, fl, {specified_pair: neutralized_pairs}))
 
-    matrix = DictVectorizer(sparse=True).fit_transform(neutralize_dicts)
+    if normalization and orig_entropy > 0.:
+        result = [(pair, fl / orig_entropy, pairs) for pair, fl, pairs in result]
 
-    if corpus_context.type_or_token == 'type':
-        matrix.data = matrix.data > 0.
-        matrix = matrix.astype('float')
+    return result
 
-    matrix /= matrix.sum(axis=1)
-    matrix = sparse.csr_matrix(matrix)
-    matrix.data = - np.log2(matrix.data) * matrix.data
-    raw_entropy = matrix.sum(1)
-    orig_entropy = raw_entropy[0, 0]
 
-    calc = list(np.nditer(orig_entropy - raw_entropy[1:, 0].flatten()))
+class EnvironmentMatcher(object):
+    """
+    Environment filters compiled into lookup tables over segment IDs, for
+    neutralizing the segments of many words that are in the environments
+    with a few array operations
 
-    num_pairs = [len(neutralized_pairs) for _, neutralized_pairs in pair_dicts]
-    cumsum_indices = [sum(num_pairs[0:i]) for i in range(0, len(num_pairs) + 1)]
+    Words are matched as the rows of a 2-D array from ``pad``, where each
+    one is surrounded by word boundaries and then by ``outside``, which no
+    environment matches.  As in neutralize_with_all_envs, the environments
+    are applied one after the other, and the positions neutralized by one of
+    them no longer match the following ones.  Without environments, every
+    occurrence of the segments is neutralized.
 
-    result = []
-    for pair_tuple, cumsum_index in zip(pair_dicts, range(len(cumsum_indices) - 1)):
-        specified_pair = pair_tuple[0]
-        neutralized_pairs = pair_tuple[1]
-        fl = sum(calc[cumsum_indices[cumsum_index]:cumsum_indices[cumsum_index + 1]]) / len(
-            calc[cumsum_indices[cumsum_index]:cumsum_indices[cumsum_index + 1]])
-        fl = fl if fl > 1e-10 else 0.0
-        result.append((specified_pair, fl, {specified_pair: neutralized_pairs}))
+    Parameters
+    ----------
+    environment_filter : list of EnvironmentFilter
+        Environments to compile; their middle segments are ignored, as the
+        segments to neutralize are given to each call of ``neutralize``
+    segment_table : SegmentTable
+        Symbol table that the words are encoded with
+
+    Attributes
+    ----------
+    outside : int
+        ID that pads the words beyond their word boundaries
+    neutral : int
+        ID that neutralized segments are replaced with
+    context : int
+        Number of segments on either side of the middle that the longest
+        environment looks at
+    """
+    def __init__(self, environment_filter, segment_table):
+        self.boundary = segment_table[segment_table.boundary]
+        self.outside = len(segment_table)
+        self.neutral = self.outside + 1
+        self.environments = []
+        for env in environment_filter or []:
+            lhs = [self._lookup(position, segment_table) for position in (env.lhs or [])]
+            rhs = [self._lookup(position, segment_table) for position in (env.rhs or [])]
+            self.environments.append((lhs, rhs))
+        if not self.environments:
+            self.environments.append(([], []))
+        self.context = max(max(len(lhs), len(rhs)) for lhs, rhs in self.environments)
+
+    def _lookup(self, segments, segment_table):
+        table = np.zeros(self.neutral + 1, dtype=bool)
+        for s in segments:
+            if s == '*':
+                table[:self.outside] = True
+            elif s in segment_table:
+                table[segment_table[s]] = True
+        return table
+
+    def pad(self, sequences):
+        """
+        Lay out sequences of segment IDs as the rows of a 2-D array
+
+        Parameters
+        ----------
+        sequences : list of sequences
+            Segment IDs of each word
+
+        Returns
+        -------
+        numpy.ndarray
+            One row per sequence, with the sequence surrounded by word
+            boundaries and padded with ``outside``
+        """
+        longest = max((len(seq) for seq in sequences), default=0)
+        padded = np.full((len(sequences), longest + 2 + 2 * self.context), self.outside, dtype=np.int32)
+        begin = self.context + 1
+        for i, seq in enumerate(sequences):
+            padded[i, begin - 1] = self.boundary
+            padded[i, begin:begin + len(seq)] = seq
+            padded[i, begin + len(seq)] = self.boundary
+        return padded
+
+    def neutralize(self, padded, middle):
+        """
+        Neutralize segments in every word where they are in the
+        environments
+
+        Parameters
+        ----------
+        padded : numpy.ndarray
+            Words from ``pad``
+        middle : iterable of int
+            IDs of the segments to neutralize
+
+        Returns
+        -------
+        numpy.ndarray
+            Copy of `padded` with the neutralized segments replaced by
+            ``neutral``
+        """
+        middle_table = np.zeros(self.neutral + 1, dtype=bool)
+        middle_table[list(middle)] = True
+        padded = padded.copy()
+        c = self.context
+        stop = padded.shape[1] - c
+        for lhs, rhs in self.environments:
+            matched = middle_table[padded[:, c:stop]]
+            for j, table in enumerate(lhs):
+                shift = len(lhs) - j
+                matched &= table[padded[:, c - shift:stop - shift]]
+            for j, table in enumerate(rhs):
+                shift = j + 1
+                matched &= table[padded[:, c + shift:stop + shift]]
+            padded[:, c:stop][matched] = self.neutral
+        return padded
+
+
+# Multiplier of the polynomial hash of neutralized forms (the 64-bit FNV prime)
+hash_multiplier = np.uint64(1099511628211)
+# Hashes are kept modulo 2**64 by masking with this
+hash_modulus = (1 << 64) - 1
+
+
+def hash_rows(rows):
+    """Hash each row of a 2-D array of segment IDs into a 64-bit key.
+
+    The key is a polynomial in the row's elements, computed modulo 2**64
+    one column at a time for all rows at once.  Distinct rows share a key
+    with negligible probability.
 
-    if normalization and orig_entropy.item() > 0.:
-        result = [(pair, fl / orig_entropy.item(), pairs) for pair, fl, pairs in result]
+    Parameters
+    ----------
+    rows : numpy.ndarray
+        Rows to hash, such as neutralized words from EnvironmentMatcher
 
-    return result
+    Returns
+    -------
+    numpy.ndarray
+        Key of each row
+    """
+    keys = np.zeros(len(rows), dtype=np.uint64)
+    for column in rows.T:
+        keys = keys * hash_multiplier + column.astype(np.uint64)
+    return keys
 
 
 def satisfy_environment(word, index, environment_filter):
@@ -258,14 +343,10 @@ def minpair_fl_speed(corpus_context, segment_pairs,
                      relativization='corpus',  # corpus, relevant, or raw
                      distinguish_homophones=False,
                      minimal_pair_definition='true',  # true or neutralization
-                     environment_filter=None, stop_check=None, call_back=None):
+                     environment_filter=None, stop_check=None, call_back=None,
+                     list_pairs=True):
     all_segments = corpus_context.inventory
 
-    if distinguish_homophones:
-        num_words_in_corpus = len(corpus_context.corpus)
-    else:
-        num_words_in_corpus = len({getattr(w, corpus_context.sequence_type) for w in corpus_context})
-
     # The following code creates a list of dicts where if the key is a tuple of two segments,
     # then the values are a set of that tuple, but if the key is a tuple of one segment,
     # then the value is a set of all possible pairs containing that segment
@@ -273,73 +354,642 @@ def minpair_fl_speed(corpus_context, segment_pairs,
                               if other.symbol != seg_pair[0] and other.symbol != '#'}}
                   if len(seg_pair) == 1 else {seg_pair: {seg_pair}} for seg_pair in segment_pairs]
 
-    neutralized_dict = defaultdict(lambda: defaultdict(set))
+    # Words are neutralized into hashed keys once per segment, and the pairs
+    # are counted from the shared keys; they are only listed if list_pairs
+    index = NeutralizationIndex(corpus_context, environment_filter=environment_filter,
+                                minimal_pair_definition=minimal_pair_definition)
     all_target_segments = {seg for pair_dict in pair_dicts for _, pair_set in pair_dict.items() for pair in pair_set for
                            seg in pair}
 
+    if distinguish_homophones:
+        num_words_in_corpus = len(corpus_context.corpus)
+    else:
+        num_words_in_corpus = len(index.sequences)
+
     if call_back is not None:
         call_back('Neutralizing words...')
         call_back(0, len(all_target_segments))
         cur = 0
 
     for seg in all_target_segments:
-        for w in corpus_context:
-
-            if stop_check is not None and stop_check():
-                return
-            if call_back is not None:
-                cur += 1
-                if cur % 100 == 0:
-                    call_back(cur)
-
-            word = (getattr(w, w._spelling_name), getattr(w, corpus_context.sequence_type), w.Frequency)
-            if seg in word[1]:
-                neutralized_words = neutralize(seg, word[1], environment_filter, minimal_pair_definition)
-                for nw in neutralized_words:
-                    neutralized_dict[seg][nw].add(word)
+        if stop_check is not None and stop_check():
+            return
+        if call_back is not None:
+            cur += 1
+            call_back(cur)
+        index.neutralized(seg)
 
     results = []
 
     for pair_dict in pair_dicts:
         for seg_pair, pair_set in pair_dict.items():
-            minimal_pairs = {pair: neutralized_dict[pair[0]].keys() & neutralized_dict[pair[1]].keys() for pair in
-                             pair_set}
-
-            results_dict = dict()
-            for pair, neutrals in minimal_pairs.items():
-                results_dict[pair] = set()
-                for neutral in neutrals:
-                    word_set1 = neutralized_dict[pair[0]][neutral]
-                    word_set2 = neutralized_dict[pair[1]][neutral]
-                    results_dict[pair].update([(w1, w2) for w1 in word_set1 for w2 in word_set2])
-
-            if distinguish_homophones:
-                num_pairs = sum([len(min_set) for _, min_set in results_dict.items()]) / len(pair_set)
-            else:
-                num_pairs = sum([len(neutralized_dict[pair[0]].keys() & neutralized_dict[pair[1]].keys()) for pair in
-                                 pair_set]) / len(pair_set)
+            num_pairs = sum(index.minimal_pair_count(pair, distinguish_homophones)
+                            for pair in pair_set) / len(pair_set)
 
             if relativization == 'corpus':
                 fl = num_pairs / num_words_in_corpus
             elif relativization == 'relevant':
-                unique_words = {word for seg in seg_pair for word_set in neutralized_dict[seg].values() for word in
-                                word_set}
-
-                if distinguish_homophones:
-                    num_possible_words = len(unique_words)
-                else:
-                    num_possible_words = len({w[1] for w in unique_words})
-
-                fl = num_pairs / num_possible_words
+                fl = num_pairs / index.relevant_count(seg_pair, distinguish_homophones)
             else:
                 fl = num_pairs
 
+            if list_pairs:
+                results_dict = {pair: index.minimal_pairs(pair) for pair in pair_set}
+            else:
+                results_dict = {pair: set() for pair in pair_set}
+
             results.append((seg_pair, fl, results_dict))
 
     # The format for the results should be:
     # [(a tuple of segments(s), FL results, {a tuple of segments: {(minimal pairs)}})]
+    # with empty sets of minimal pairs unless list_pairs is True
     return results
 
+
+class NeutralizationIndex(object):
+    """
+    Neutralized forms of the words in a corpus context, built once per
+    segment and shared by the functional loads of every pair of segments
+
+    For the minimal pair count, each segment's neutralized forms are its
+    words with the segment masked (at each position separately for 'true'
+    minimal pairs, at all positions at once for 'neutralization'), so two
+    words are a minimal pair for two segments exactly when one of the
+    first segment's forms is also one of the second segment's.  A form
+    and the masked segment determine the transcription, so each form maps
+    to a single transcription.  Forms are stored as 64-bit hashes rather than
+    sequences, and distinct forms share a hash with negligible probability.
+
+    For the change in entropy, merging two segments only makes words that
+    contain one of them homophonous with each other, so only those words
+    are neutralized for each pair.
+
+    Parameters
+    ----------
+    corpus_context : CorpusContext
+        Context manager for a corpus
+    environment_filter : list of EnvironmentFilter, optional
+        Environments that a segment must be in to be neutralized
+    minimal_pair_definition : str
+        'true' (default) or 'neutralization'
+
+    Attributes
+    ----------
+    sequences : list of tuples
+        Distinct transcriptions of the words, as segment IDs
+    members : list of lists
+        Positions (in the context's iteration order) of the words with each
+        distinct transcription
+    transcriptions : list of Transcriptions
+        One of the words' transcriptions for each distinct transcription
+    frequencies : numpy.ndarray
+        Summed frequency of the words with each distinct transcription
+    matcher : EnvironmentMatcher
+        Compiled environments, for merging pairs of segments
+    """
+    def __init__(self, corpus_context, environment_filter=None, minimal_pair_definition='true'):
+        self.environment_filter = environment_filter
+        self.minimal_pair_definition = minimal_pair_definition
+        self.segment_table = corpus_context.segment_table
+        self.sequence_type = corpus_context.sequence_type
+        frame = corpus_context.frame
+        self.words = frame.words
+        flat, offsets = frame.tier(corpus_context.sequence_type)
+        flat = flat.tolist()
+        offsets = offsets.tolist()
+        frequency = frame.frequency
+        distinct = {}
+        self.sequences = []
+        self.members = []
+        self.transcriptions = []
+        frequencies = []
+        for i in range(len(frame)):
+            seq = tuple(flat[offsets[i]:offsets[i + 1]])
+            try:
+                t = distinct[seq]
+            except KeyError:
+                t = distinct[seq] = len(self.sequences)
+                self.sequences.append(seq)
+                self.members.append([])
+                self.transcriptions.append(getattr(frame.words[i], corpus_context.sequence_type))
+                frequencies.append(0.)
+            self.members[t].append(i)
+            frequencies[t] += frequency[i]
+        self.frequencies = np.array(frequencies)
+
+        self._containing = defaultdict(list)
+        for t, seq in enumerate(self.sequences):
+            for s in set(seq):
+                self._containing[s].append(t)
+        self._neutralized = {}
+        self._hashes = None
+        self._word_counts = None
+        self.matcher = EnvironmentMatcher(environment_filter, self.segment_table)
+        self._padded = None
+
+    @property
+    def padded(self):
+        """
+        Distinct transcriptions laid out for the environment matcher (see
+        EnvironmentMatcher.pad)
+        """
+        if self._padded is None:
+            self._padded = self.matcher.pad(self.sequences)
+        return self._padded
+
+    @property
+    def word_counts(self):
+        """
+        Number of distinct words (see ``word``) with each distinct
+        transcription, which are the words that minimal pairs are made of
+        when homophones are distinguished; duplicate entries of a word in
+        the corpus are only counted once
+        """
+        if self._word_counts is None:
+            self._word_counts = [len({self.word(i) for i in members}) for members in self.members]
+        return self._word_counts
+
+    def merged_keys(self, segments, transcriptions=None):
+        """
+        Get the hashed neutralization key of distinct transcriptions when
+        segments are merged (where they are in the environments)
+
+        Parameters
+        ----------
+        segments : iterable of str
+            Segments to merge
+        transcriptions : numpy.ndarray, optional
+            Indexes into the ``sequences`` attribute of the transcriptions
+            to get the keys of, defaults to all of them
+
+        Returns
+        -------
+        numpy.ndarray
+            Key of each transcription; transcriptions with the same key are
+            identical after the merger
+        """
+        padded = self.padded
+        if transcriptions is not None:
+            padded = padded[transcriptions]
+        merged = [self.segment_table[s] for s in segments if s in self.segment_table]
+        return hash_rows(self.matcher.neutralize(padded, merged))
+
+    def containing(self, segment):
+        """
+        Get the distinct transcriptions that contain a segment
+
+        Returns
+        -------
+        list of int
+            Indexes into the ``sequences`` attribute, in increasing order
+        """
+        if segment not in self.segment_table:
+            return []
+        return self._containing.get(self.segment_table[segment], [])
+
+    def neutralized(self, segment):
+        """
+        Get the neutralized forms of the words containing a segment, built
+        the first time they are requested
+
+        The forms are keyed by a rolling hash of their segment IDs, with
+        MASK in place of the segment, which is updated from the hash of the
+        word for each masked position rather than hashing a new sequence.
+
+        Returns
+        -------
+        dict
+            Dictionary with keys of hashed neutralized forms and values of the
+            index of the distinct transcription they come from
+        """
+        try:
+            return self._neutralized[segment]
+        except KeyError:
+            pass
+        forms = {}
+        if segment in self.segment_table:
+            segment_id = self.segment_table[segment]
+            # Masking the segment at position i changes the hash of the word
+            # by this much times the power of the multiplier for i
+            shift = (MASK - segment_id) & hash_modulus
+            for t in self.containing(segment):
+                seq = self.sequences[t]
+                positions = [i for i, s in enumerate(seq)
+                             if s == segment_id and satisfy_environment(self.transcriptions[t], i,
+                                                                        self.environment_filter)]
+                if not positions:
+                    continue
+                key = self._sequence_hash(t)
+                powers = [self._powers[len(seq) - 1 - i] for i in positions]
+                if self.minimal_pair_definition == 'true':
+                    for power in powers:
+                        forms[(key + shift * power) & hash_modulus] = t
+                else:
+                    forms[(key + shift * sum(powers)) & hash_modulus] = t
+        self._neutralized[segment] = forms
+        return forms
+
+    def _sequence_hash(self, t):
+        if self._hashes is None:
+            multiplier = int(hash_multiplier)
+            self._hashes = []
+            for seq in self.sequences:
+                # Starting from the length keeps words of different lengths apart
+                key = len(seq) + 1
+                for s in seq:
+                    key = (key * multiplier + s) & hash_modulus
+                self._hashes.append(key)
+            self._powers = [1]
+            for _ in range(max((len(seq) for seq in self.sequences), default=0)):
+                self._powers.append((self._powers[-1] * multiplier) & hash_modulus)
+        return self._hashes[t]
+
+    def minimal_pair_counts(self, segments, distinguish_homophones=False):
+        """
+        Count the minimal pairs of every pair of segments in one pass over
+        their neutralized forms
+
+        Parameters
+        ----------
+        segments : list of str
+            Segments to count minimal pairs for
+        distinguish_homophones : bool, optional
+            If True, count pairs of words rather than pairs of distinct
+            transcriptions
+
+        Returns
+        -------
+        numpy.ndarray
+            Symmetric matrix of the number of minimal pairs of each pair of
+            segments, in the order of `segments`
+        """
+        by_form = defaultdict(list)
+        for n, s in enumerate(segments):
+            for form, t in self.neutralized(s).items():
+                by_form[form].append((n, t))
+        counts = np.zeros((len(segments), len(segments)))
+        for entries in by_form.values():
+            if len(entries) < 2:
+                continue
+            for (i, t1), (j, t2) in itertools.combinations(entries, 2):
+                if distinguish_homophones:
+                    count = self.word_counts[t1] * self.word_counts[t2]
+                else:
+                    count = 1
+                counts[i, j] += count
+                counts[j, i] += count
+        return counts
+
+    def minimal_pair_count(self, segment_pair, distinguish_homophones=False):
+        """
+        Count the minimal pairs of a pair of segments without listing them
+
+        Each neutralized form shared by the two segments is one pair of
+        distinct transcriptions, which is the product of their numbers of
+        distinct words (``word_counts``) when homophones are distinguished,
+        so the count is the size of the set from ``minimal_pairs``.
+
+        Parameters
+        ----------
+        segment_pair : tuple of str
+            Segments that the words of each pair differ in
+        distinguish_homophones : bool, optional
+            If True, count pairs of words rather than pairs of distinct
+            transcriptions
+
+        Returns
+        -------
+        int
+            Number of minimal pairs
+        """
+        first = self.neutralized(segment_pair[0])
+        second = self.neutralized(segment_pair[1])
+        shared = first.keys() & second.keys()
+        if not distinguish_homophones:
+            return len(shared)
+        word_counts = self.word_counts
+        return sum(word_counts[first[form]] * word_counts[second[form]] for form in shared)
+
+    def word(self, position):
+        """
+        Spelling, transcription and frequency of a word, as listed in the
+        minimal pairs of minpair_fl_speed
+        """
+        w = self.words[position]
+        return (getattr(w, w._spelling_name), getattr(w, self.sequence_type), w.Frequency)
+
+    def minimal_pairs(self, segment_pair):
+        """
+        List the minimal pairs of a pair of segments
+
+        Parameters
+        ----------
+        segment_pair : tuple of str
+            Segments that the words of each pair differ in
+
+        Returns
+        -------
+        set of tuples
+            Pairs of words (see ``word``), the first with the first segment
+            and the second with the second segment
+        """
+        first = self.neutralized(segment_pair[0])
+        second = self.neutralized(segment_pair[1])
+        pairs = set()
+        for form in first.keys() & second.keys():
+            for i in self.members[first[form]]:
+                for j in self.members[second[form]]:
+                    pairs.add((self.word(i), self.word(j)))
+        return pairs
+
+    def relevant_count(self, segment_pair, distinguish_homophones=False):
+        """
+        Count the words that have a neutralized form for either segment of
+        a pair (distinct transcriptions, or distinct words if
+        `distinguish_homophones`)
+        """
+        transcriptions = set()
+        for s in segment_pair:
+            transcriptions.update(self.neutralized(s).values())
+        if distinguish_homophones:
+            return sum(self.word_counts[t] for t in transcriptions)
+        return len(transcriptions)
+
+    def affected(self, segments):
+        """
+        Get the distinct transcriptions that contain any of some segments
+
+        Returns
+        -------
+        numpy.ndarray
+            Indexes into the ``sequences`` attribute, in increasing order
+        """
+        affected = np.zeros(0, dtype=np.int64)
+        for s in segments:
+            affected = np.union1d(affected, np.array(self.containing(s), dtype=np.int64))
+        return affected
+
+    def entropy(self, type_or_token):
+        """
+        Entropy of the choice among the distinct transcriptions (with a
+        non-zero frequency)
+        """
+        frequencies = self.frequencies[self.frequencies > 0]
+        if not len(frequencies):
+            return 0.0
+        if type_or_token == 'type':
+            return log(len(frequencies), 2)
+        probabilities = frequencies / frequencies.sum()
+        return float(-(probabilities * np.log2(probabilities)).sum())
+
+    def entropy_change(self, segments, type_or_token):
+        """
+        Decrease in the entropy of the choice among the distinct
+        transcriptions caused by merging segments
+
+        Only transcriptions that contain one of the segments can become
+        homophonous, and only those that do (the ones that share a
+        neutralization key) change the entropy, so the change is the sum of
+        their p log p terms before the merger less that of their merged
+        classes after it.
+
+        Parameters
+        ----------
+        segments : iterable of str
+            Segments to merge, usually a pair
+        type_or_token : str
+            'type' or 'token'
+
+        Returns
+        -------
+        float
+            Entropy before the merger less entropy after it
+        """
+        affected = self.affected(segments)
+        affected = affected[self.frequencies[affected] > 0]
+        if len(affected) < 2:
+            return 0.0
+        keys = self.merged_keys(segments, affected)
+        _, classes, sizes = np.unique(keys, return_inverse=True, return_counts=True)
+        classes = classes.ravel()
+        if type_or_token == 'type':
+            num_merged = len(affected) - len(sizes)
+            if not num_merged:
+                return 0.0
+            num_types = np.count_nonzero(self.frequencies > 0)
+            return log(num_types, 2) - log(num_types - num_merged, 2)
+
+        colliding = sizes[classes] > 1
+        if not colliding.any():
+            return 0.0
+        probabilities = self.frequencies[affected[colliding]] / self.frequencies[self.frequencies > 0].sum()
+        merged = np.bincount(classes[colliding], weights=probabilities)
+        merged = merged[merged > 0]
+        before = -(probabilities * np.log2(probabilities)).sum()
+        after = -(merged * np.log2(merged)).sum()
+        return float(before - after)
+
+
+def functional_load_matrix(corpus_context, algorithm='minpair',
+                           relativization='corpus',  # corpus, relevant, or raw
+                           distinguish_homophones=False,
+                           minimal_pair_definition='true',  # true or neutralization
+                           environment_filter=None, prevent_normalization=False,
+                           segment=None, stop_check=None, call_back=None):
+    """Calculate the functional load of the contrast between every pair of
+    segments in the inventory
+
+    The words are neutralized once per segment (see NeutralizationIndex)
+    and every pair's functional load is derived from those neutralized
+    forms, rather than searching the corpus again for each pair.
+
+    Parameters
+    ----------
+    corpus_context : CorpusContext
+        Context manager for a corpus
+    algorithm : str {'minpair', 'deltah'}
+        Algorithm to use for calculating functional load: "minpair" for
+        minimal pair count or "deltah" for change in entropy.
+    relativization : str {'corpus', 'relevant', 'raw'}
+        For "minpair", divide the number of minimal pairs by the number of
+        words in the corpus, by the number of words with either segment, or
+        not at all
+    distinguish_homophones : bool, optional
+        For "minpair", if False, then you'll count sock~shock (sock=clothing)
+        and sock~shock (sock=punch) as just one minimal pair; but if True,
+        you'll overcount alternative spellings of the same word.
+    minimal_pair_definition : str {'true', 'neutralization'}
+        For "minpair", whether words must differ in exactly one segment or
+        may differ in every occurrence of the segments
+    environment_filter : list of EnvironmentFilter
+        Allows the user to restrict the neutralization process to segments in
+        particular segmental contexts
+    prevent_normalization : bool, optional
+        For "deltah", if True, don't divide the change in entropy by the
+        entropy before the merger
+    segment : str, optional
+        If specified, only calculate the pairs of this segment with every
+        other segment, leaving the rest of the matrix at zero
+    stop_check : callable, optional
+        Optional function to check whether to gracefully terminate early
+    call_back : callable, optional
+        Optional function to supply progress information during the function
+
+    Returns
+    -------
+    list of str
+        Segments of the inventory, in the order of the matrix's rows
+    numpy.ndarray
+        Symmetric matrix of the functional load of each pair of segments,
+        with zeros on the diagonal
+    """
+    if algorithm not in ('minpair', 'deltah'):
+        raise FuncLoadError('{} is not a possible functional load algorithm.'.format(algorithm))
+    index = NeutralizationIndex(corpus_context, environment_filter=environment_filter,
+                                minimal_pair_definition=minimal_pair_definition)
+    return _functional_load_matrix(corpus_context, index, algorithm, relativization,
+                                   distinguish_homophones, prevent_normalization,
+                                   segment, stop_check, call_back)
+
+
+def _functional_load_matrix(corpus_context, index, algorithm, relativization,
+                            distinguish_homophones, prevent_normalization,
+                            segment, stop_check, call_back):
+    segments = [s.symbol for s in corpus_context.inventory if s.symbol != '#']
+    pairs = list(itertools.combinations(range(len(segments)), 2))
+    if segment is not None:
+        if segment not in segments:
+            raise FuncLoadError('{} is not a segment of the inventory.'.format(segment))
+        target = segments.index(segment)
+        pairs = [(i, j) for i, j in pairs if target in (i, j)]
+
+    if algorithm == 'minpair':
+        if call_back is not None:
+            call_back('Neutralizing words...')
+            call_back(0, len(segments))
+        for cur, s in enumerate(segments):
+            if stop_check is not None and stop_check():
+                return
+            index.neutralized(s)
+            if call_back is not None:
+                call_back(cur + 1)
+        matrix = index.minimal_pair_counts(segments, distinguish_homophones)
+        if segment is not None:
+            counts = matrix
+            matrix = np.zeros(counts.shape)
+            matrix[target] = counts[target]
+            matrix[:, target] = counts[:, target]
+
+        if relativization == 'corpus':
+            if distinguish_homophones:
+                num_words_in_corpus = len(corpus_context.corpus)
+            else:
+                num_words_in_corpus = len(index.sequences)
+            matrix /= num_words_in_corpus
+        elif relativization == 'relevant':
+            for i, j in pairs:
+                if not matrix[i, j]:
+                    continue
+                num_possible_words = index.relevant_count((segments[i], segments[j]),
+                                                          distinguish_homophones)
+                matrix[i, j] /= num_possible_words
+                matrix[j, i] = matrix[i, j]
+        return segments, matrix
+
+    matrix = np.zeros((len(segments), len(segments)))
+    type_or_token = corpus_context.type_or_token
+    preneutr_h = index.entropy(type_or_token)
+    if call_back is not None:
+        call_back('Calculating functional load...')
+        call_back(0, len(pairs))
+    for cur, (i, j) in enumerate(pairs):
+        if stop_check is not None and stop_check():
+            return
+        if call_back is not None and cur % 100 == 0:
+            call_back(cur)
+        result = index.entropy_change((segments[i], segments[j]), type_or_token)
+        if result < 1e-10:
+            result = 0.0
+        if not prevent_normalization and preneutr_h > 0.0:
+            result = result / preneutr_h
+        matrix[i, j] = matrix[j, i] = result
+    return segments, matrix
+
+def relative_functional_load(corpus_context, segment=None, algorithm='minpair',
+                             relativization='corpus',  # corpus, relevant, or raw
+                             distinguish_homophones=False,
+                             minimal_pair_definition='true',  # true or neutralization
+                             environment_filter=None, prevent_normalization=False,
+                             output_filename=None, stop_check=None, call_back=None):
+    """Calculate the average functional load of the contrasts between a
+    segment and all other segments, for one segment or for every segment
+    of the inventory
+
+    All the pairs are calculated together by functional_load_matrix, from
+    words neutralized once per segment.
+
+    Parameters
+    ----------
+    corpus_context : CorpusContext
+        Context manager for a corpus
+    segment : str, optional
+        The target segment; if not specified, the relative functional load
+        of every segment is calculated
+    algorithm : str {'minpair', 'deltah'}
+        Algorithm to use for calculating functional load: "minpair" for
+        minimal pair count or "deltah" for change in entropy.
+    relativization : str {'corpus', 'relevant', 'raw'}
+        See functional_load_matrix
+    distinguish_homophones : bool, optional
+        See functional_load_matrix
+    minimal_pair_definition : str {'true', 'neutralization'}
+        See functional_load_matrix
+    environment_filter : list of EnvironmentFilter
+        Allows the user to restrict the neutralization process to segments in
+        particular segmental contexts
+    prevent_normalization : bool, optional
+        See functional_load_matrix
+    output_filename : str, optional
+        If specified, the functional load of each pair that was averaged is
+        written to this file
+    stop_check : callable, optional
+        Optional function to check whether to gracefully terminate early
+    call_back : callable, optional
+        Optional function to supply progress information during the function
+
+    Returns
+    -------
+    float or dict
+        The average functional load of `segment`, or if it is not specified,
+        a dictionary with keys of segments and values of their average
+        functional load
+    """
+    results = functional_load_matrix(corpus_context, algorithm=algorithm,
+                                     relativization=relativization,
+                                     distinguish_homophones=distinguish_homophones,
+                                     minimal_pair_definition=minimal_pair_definition,
+                                     environment_filter=environment_filter,
+                                     prevent_normalization=prevent_normalization,
+                                     segment=segment, stop_check=stop_check, call_back=call_back)
+    if results is None:
+        return
+    segments, matrix = results
+    if segment is not None:
+        rows = [segments.index(segment)]
+    else:
+        rows = range(len(segments))
+
+    if output_filename is not None:
+        save_functional_loads(output_filename,
+                              [((segments[i], segments[j]), matrix[i, j])
+                               for i in rows for j in range(len(segments)) if j != i])
+
+    num_others = max(len(segments) - 1, 1)
+    relative_fls = {segments[i]: matrix[i].sum() / num_others for i in rows}
+    if segment is not None:
+        return relative_fls[segment]
+    return relative_fls
+
 # ========== following code is from the old version; not used anymore ==========
 
 # This is the function I really edited
@@ -506,75 +1156,21 @@ def deltah_fl(corpus_context, segment_pairs, environment_filter=None, prevent_no
         non-homophonous words in the corpus before a merger of `s1`
         and `s2` and b) the entropy of that choice after the merger.
     """
-    if call_back is not None:
-        call_back('Finding instances of segments...')
-        call_back(0, len(corpus_context))
-        cur = 0
-
-    freq_sum = 0
-    original = defaultdict(float)
-
-    all_target_segments = list(itertools.chain.from_iterable(segment_pairs))
-
-    # If environment_filter is specified, then we create corresponding filters
-    # If not, then we have an empty filter
-    if environment_filter:
-        filled_environments = [EnvironmentFilter(tuple(all_target_segments), env.lhs, env.rhs)
-                               for env in environment_filter]
-    else:
-        filled_environments = [EnvironmentFilter(middle_segments=tuple(all_target_segments),
-                                                 lhs=list(),
-                                                 rhs=list())]
-
-    for w in corpus_context:
-        if stop_check is not None and stop_check():
-            return
-        if call_back is not None:
-            cur += 1
-            if cur % 20 == 0:
-                call_back(cur)
-
-        f = w.frequency
-
-        original[getattr(w, corpus_context.sequence_type)] += f
-        freq_sum += f
-
-    if corpus_context.type_or_token == 'type':
-        original_probs = {k[0]: 1 / len(original) for k in original.items()}
-        preneutr_h = log(len(original), 2)
-    else:
-        original_probs = {k: v / freq_sum for k, v in original.items()}
-        preneutr_h = entropy(original_probs.values())
-
     if stop_check is not None and stop_check():
         return
-
-    neutralized_probs = defaultdict(float)
     if call_back is not None:
         call_back('Neutralizing instances of segments...')
-        call_back(0, len(list(original_probs.keys())))
-        cur = 0
-
-    for k, v in original_probs.items():
-        if stop_check is not None and stop_check():
-            return
-        if call_back is not None:
-            cur += 1
-            if cur % 100 == 0:
-                call_back(cur)
 
-        neutralized = neutralize_with_all_envs(k, filled_environments)
-        neutralized_probs[neutralized] += v
-
-    if corpus_context.type_or_token == 'type':
-        postneutr_h = log(len(neutralized_probs), 2)
-    else:
-        postneutr_h = entropy(neutralized_probs.values())
+    # All the target segments are merged into one; only the words that
+    # contain them are neutralized, see NeutralizationIndex.entropy_change
+    all_target_segments = list(itertools.chain.from_iterable(segment_pairs))
+    index = NeutralizationIndex(corpus_context, environment_filter=environment_filter)
+    preneutr_h = index.entropy(corpus_context.type_or_token)
 
     if stop_check is not None and stop_check():
         return
 
-    result = preneutr_h - postneutr_h
+    result = index.entropy_change(all_target_segments, corpus_context.type_or_token)
     if result < 1e-10:
         result = 0.0
 
@@ -606,16 +1202,23 @@ def neutralize_with_all_envs(trans, env_filters):
 # average_minpair_fl
 # It has also been changed so as to have two "relativizer" options:
 # one to words containing the relevant segments and one to all
-# words in the corpus (though it basically does the calculation
-# by calling the above minpair_fl() function).
+# words in the corpus.
 def relative_minpair_fl(corpus_context, segment,
                         relative_count_to_relevant_sounds=False, relative_count_to_whole_corpus=True,
                         distinguish_homophones=False, minimal_pair_definition=False,
                         output_filename=None, environment_filter=None,
-                        prevent_normalization=False, stop_check=None, call_back=None):
+                        prevent_normalization=False, stop_check=None, call_back=None,
+                        num_cores=-1):
     """Calculate the average functional load of the contrasts between a
     segment and all other segments, as a count of minimal pairs.
 
+    Minimal pairs and relative counts are as in minpair_fl, but the pairs
+    of words aren't all compared: for each other segment, only words that
+    are identical once the two segments are merged can be minimal pairs,
+    so the words are grouped by their merged form.  relative_functional_load
+    calculates this for every segment at once with the minimal pairs of
+    minpair_fl_speed instead.
+
     Parameters
     ----------
     corpus_context : CorpusContext
@@ -634,6 +1237,11 @@ def relative_minpair_fl(corpus_context, segment,
         sock~shock (sock=punch) as just one minimal pair; but if True,
         you'll overcount alternative spellings of the same word, e.g.
         axel~actual and axle~actual. False is the value used by Wedel et al.
+    minimal_pair_definition : optional
+        Unused, as in minpair_fl
+    output_filename : str, optional
+        If specified, the minimal pairs of each pair of segments are
+        written to this file
     environment_filter : EnvironmentFilter
         Allows the user to restrict the neutralization process to segments in
         particular segmental contexts
@@ -641,6 +1249,9 @@ def relative_minpair_fl(corpus_context, segment,
         Optional function to check whether to gracefully terminate early
     call_back : callable, optional
         Optional function to supply progress information during the function
+    num_cores : int, optional
+        Unused, as the words are only grouped once per pair; kept for
+        compatibility
 
     Returns
     -------
@@ -655,21 +1266,61 @@ def relative_minpair_fl(corpus_context, segment,
     all_segments = corpus_context.inventory
     segment_pairs = [(segment, other.symbol) for other in all_segments
                      if other.symbol != segment and other.symbol != '#']
+    index = NeutralizationIndex(corpus_context)
+    num_words_in_corpus = len(corpus_context.corpus)
+
+    if call_back is not None:
+        call_back('Finding minimal pairs...')
+        call_back(0, len(segment_pairs))
 
     results = []
     to_output = []
-    for sp in segment_pairs:
-        res = minpair_fl(corpus_context, [sp],
-                         relative_count_to_relevant_sounds=relative_count_to_relevant_sounds,
-                         relative_count_to_whole_corpus=relative_count_to_whole_corpus,
-                         distinguish_homophones=distinguish_homophones,
-                         environment_filter=environment_filter,
-                         prevent_normalization=prevent_normalization,
-                         stop_check=stop_check, call_back=call_back)
-        results.append(res[0])
+    for n, sp in enumerate(segment_pairs):
+        if stop_check is not None and stop_check():
+            return
+        if call_back is not None:
+            call_back(n)
+        merged = {index.segment_table[s] for s in sp if s in index.segment_table}
+        relevant = sorted(set(index.containing(sp[0])) | set(index.containing(sp[1])))
+
+        # Words with the same form once the segments are merged, by their
+        # distinct transcriptions
+        groups = defaultdict(list)
+        for t in relevant:
+            groups[tuple(MASK if s in merged else s for s in index.sequences[t])].append(t)
+
+        count = 0
+        minpairs = []
+        for group in groups.values():
+            for t1, t2 in itertools.combinations(group, 2):
+                first = index.words[index.members[t1][0]]
+                second = index.words[index.members[t2][0]]
+                # Without environments, the merged form is enough
+                if environment_filter and not is_minpair(first, second, corpus_context,
+                                                         [sp], environment_filter):
+                    continue
+                if distinguish_homophones:
+                    count += len(index.members[t1]) * len(index.members[t2])
+                else:
+                    count += 1
+                if output_filename is not None:
+                    for i in index.members[t1]:
+                        for j in index.members[t2]:
+                            pair = [(index.words[i], index.transcriptions[t1]),
+                                    (index.words[j], index.transcriptions[t2])]
+                            minpairs.append(tuple(sorted(pair, key=lambda x: x[1])))
+
+        num_relevant = sum(len(index.members[t]) for t in relevant)
+        if relative_count_to_relevant_sounds and num_relevant > 0:
+            result = count / num_relevant
+        elif relative_count_to_whole_corpus:
+            result = count / num_words_in_corpus
+        else:
+            result = count
+        results.append(result)
 
         if output_filename is not None:
-            to_output.append((sp, res[1]))
+            to_output.append((sp, result, {sp: minpairs}))
     if output_filename is not None:
         save_minimal_pairs(output_filename, to_output)
     return sum(results) / len(segment_pairs)
@@ -677,11 +1328,15 @@ def relative_minpair_fl(corpus_context, segment,
 
 def relative_deltah_fl(corpus_context, segment,
                        environment_filter=None, prevent_normalization=False,
-                       stop_check=None, call_back=None):
+                       stop_check=None, call_back=None, num_cores=-1):
     """Calculate the average functional load of the contrasts between a
     segment and all other segments, as the decrease in corpus entropy
     caused by a merger.
 
+    All the pairs are merged in the same distinct transcriptions, neutralizing
+    only the words that contain them; see relative_functional_load to
+    calculate this for every segment at once.
+
     Parameters
     ----------
     corpus_context : CorpusContext
@@ -692,6 +1347,9 @@ def relative_deltah_fl(corpus_context, segment,
         Optional function to check whether to gracefully terminate early
     call_back : callable, optional
         Optional function to supply progress information during the function
+    num_cores : int, optional
+        Unused, as all the pairs are calculated in a single pass; kept for
+        compatibility
 
     Returns
     -------
@@ -700,16 +1358,10 @@ def relative_deltah_fl(corpus_context, segment,
         non-homophonous words in the corpus before a merger of `s1`
         and `s2` and b) the entropy of that choice after the merger.
     """
-    all_segments = corpus_context.inventory
-    segment_pairs = [(segment, other.symbol) for other in all_segments
-                     if other.symbol != segment and other.symbol != '#']
-
-    results = []
-    for sp in segment_pairs:
-        results.append(deltah_fl(corpus_context, [sp], prevent_normalization=prevent_normalization,
-                                 environment_filter=environment_filter,
-                                 stop_check=stop_check, call_back=call_back))
-    return sum(results) / len(segment_pairs)
+    return relative_functional_load(corpus_context, segment, algorithm='deltah',
+                                    environment_filter=environment_filter,
+                                    prevent_normalization=prevent_normalization,
+                                    stop_check=stop_check, call_back=call_back)
 
 
 def collapse_segpairs_fl(corpus_context, **kwargs):
@@ -776,13 +1428,16 @@ def neutralize_segment(segment, segment_pairs):
 def all_pairwise_fls(corpus_context, relative_fl=False,
                      algorithm='minpair',
                      relative_count_to_relevant_sounds=False, relative_count_to_whole_corpus=True,
-                     distinguish_homophones=False,
-                     environment_filter=None,
-                     call_back=None, stop_check=None):
+                     distinguish_homophones=False, minimal_pair_definition='true',
+                     environment_filter=None, prevent_normalization=False,
+                     call_back=None, stop_check=None, num_cores=-1):
     """Calculate the functional load of the contrast between two segments as a count of minimal pairs.
     This version calculates the functional load for ALL pairs of segments in the inventory,
     which could be useful for visually mapping out phoneme inventories.
 
+    All pairs are calculated together from words neutralized once per
+    segment; see functional_load_matrix.
+
     Parameters
     ----------
     corpus_context : CorpusContext
@@ -805,9 +1460,18 @@ def all_pairwise_fls(corpus_context, relative_fl=False,
         sock~shock (sock=punch) as just one minimal pair; but if True,
         you'll overcount alternative spellings of the same word, e.g.
         axel~actual and axle~actual. False is the value used by Wedel et al.
+    minimal_pair_definition : str {'true', 'neutralization'}
+        Whether minimal pairs must differ in exactly one segment or may
+        differ in every occurrence of the segments
     environment_filter : EnvironmentFilter
         Allows the user to restrict the neutralization process to segments in
         particular segmental contexts
+    prevent_normalization : bool, optional
+        For "deltah", if True, don't divide the change in entropy by the
+        entropy before the merger
+    num_cores : int, optional
+        Unused, as all pairs are calculated in a single pass; kept for
+        compatibility
 
     Returns
     -------
@@ -817,124 +1481,35 @@ def all_pairwise_fls(corpus_context, relative_fl=False,
         Normally returns a list of all Segment pairs and their respective functional load values, as length-2 tuples ordered by FL.
         If calculating relative FL (i.e., average FL for a segment), returns a dictionary of each segment and its relative (average) FL, with entries ordered by FL.
     """
-    fls = {}
-    total_calculations = ((((len(corpus_context.inventory) - 1) ** 2) - len(corpus_context.inventory) - 1) / 2) + 1
-    ct = 1
-    t = time.time()
     if '' in corpus_context.inventory:
         raise Exception(
             'Warning: Calculation of functional load for all segment pairs requires that all items in corpus have a non-null transcription.')
 
-    # Count the number of words in the corpus (needed if relative_count_to_whole_corpus is True)
-    num_words_in_corpus = len(corpus_context.corpus)
+    if relative_count_to_relevant_sounds:
+        relativization = 'relevant'
+    elif relative_count_to_whole_corpus:
+        relativization = 'corpus'
+    else:
+        relativization = 'raw'
+    results = functional_load_matrix(corpus_context, algorithm=algorithm,
+                                     relativization=relativization,
+                                     distinguish_homophones=distinguish_homophones,
+                                     minimal_pair_definition=minimal_pair_definition,
+                                     environment_filter=environment_filter,
+                                     prevent_normalization=prevent_normalization,
+                                     stop_check=stop_check, call_back=call_back)
+    if results is None:
+        return
+    segments, matrix = results
 
-    for i, s1 in enumerate(corpus_context.inventory[:-1]):
-        for s2 in corpus_context.inventory[i + 1:]:
-            if s1 != '#' and s2 != '#':
-                print('Performing FL calculation {} out of {} possible'.format(str(ct), str(total_calculations)))
-                ct += 1
-                print('Duration of last calculation: {}'.format(str(time.time() - t)))
-                t = time.time()
-                if type(s1) != str:
-                    s1 = s1.symbol
-                if type(s2) != str:
-                    s2 = s2.symbol
-                if algorithm == 'minpair':
-                    fl = minpair_fl(corpus_context, [(s1, s2)],
-                                    relative_count_to_relevant_sounds=relative_count_to_relevant_sounds,
-                                    relative_count_to_whole_corpus=relative_count_to_whole_corpus,
-                                    distinguish_homophones=distinguish_homophones,
-                                    environment_filter=environment_filter)[0]
-                elif algorithm == 'deltah':
-                    fl = deltah_fl(corpus_context, [(s1, s2)],
-                                   environment_filter=environment_filter)
-                fls[(s1, s2)] = fl
     if not relative_fl:
-        ordered_fls = sorted([(pair, fls[pair]) for pair in fls], key=lambda p: p[1], reverse=True)
+        fls = [((segments[i], segments[j]), matrix[i, j])
+               for i, j in itertools.combinations(range(len(segments)), 2)]
+        ordered_fls = sorted(fls, key=lambda p: p[1], reverse=True)
         return ordered_fls
-    elif relative_fl:
-        rel_fls = {}
-        for s in corpus_context.inventory:
-            if type(s) != str:
-                s = s.symbol
-            if s != '#':
-                total = 0.0
-                for pair in fls:
-                    if s == pair[0] or s == pair[1]:
-                        total += fls[pair]
-                rel_fls[s] = total / (len(corpus_context.inventory) - 1)
-        ordered_rel_fls = sorted([(s, rel_fls[s]) for s in rel_fls], key=lambda p: p[1], reverse=True)
-        return ordered_rel_fls
-
-    ## Filter out words that have none of the target segments
-    ## (for relative_count_to_relevant_sounds as well as improving runtime)
-    contain_target_segment = []
-    if call_back is not None:
-        call_back('Finding words with the specified segments...')
-        call_back(0, len(corpus_context))
-        cur = 0
-
-    all_target_segments = list(
-        itertools.chain.from_iterable(segment_pairs))  # creates a list of target segments from the list of tuples
-    for w in corpus_context:  # loops through the words in the context manager
-        if stop_check is not None and stop_check():
-            return
-        if call_back is not None:
-            cur += 1
-            if cur % 100 == 0:
-                call_back(cur)
-        tier = getattr(w, corpus_context.sequence_type)
-        if any([s in tier for s in all_target_segments]):
-            contain_target_segment.append(w)
-    if stop_check is not None and stop_check():
-        return
-
-    ## Find minimal pairs
-    minpairs = []
-    if call_back is not None:
-        call_back('Finding minimal pairs...')
-        if len(contain_target_segment) >= 2:
-            call_back(0, factorial(len(contain_target_segment)) / (factorial(len(contain_target_segment) - 2) * 2))
-        cur = 0
-    for first, second in itertools.combinations(contain_target_segment, 2):
-        if stop_check is not None and stop_check():
-            return
-        if call_back is not None:
-            cur += 1
-            if cur % 100 == 0:
-                call_back(cur)
-        if is_minpair(first, second, corpus_context, segment_pairs, environment_filter):
-            ordered_pair = sorted([(first, getattr(first, corpus_context.sequence_type)),
-                                   (second, getattr(second, corpus_context.sequence_type))],
-                                  key=lambda x: x[1])  # sort by tier/transcription
-            minpairs.append(tuple(ordered_pair))
-
-    ## Generate output
-    if not distinguish_homophones:
-        actual_minpairs = {}
-
-        for pair in minpairs:
-            if stop_check is not None and stop_check():
-                return
-            key = (pair[0][1], pair[1][1])  # Keys are tuples of transcriptions
-            if key not in actual_minpairs:
-                actual_minpairs[key] = (pair[0][0], pair[1][0])  # Values are words
-            else:
-                pair_freq = pair[0][0].frequency + pair[1][0].frequency
-                existing_freq = actual_minpairs[key][0].frequency + \
-                                actual_minpairs[key][1].frequency
-                if pair_freq > existing_freq:
-                    actual_minpairs[key] = (pair[0][0], pair[1][0])
-        result = sum((x[0].frequency + x[1].frequency) / 2
-                     for x in actual_minpairs.values())
     else:
-        result = sum((x[0][0].frequency + x[1][0].frequency) / 2 for x in minpairs)
-
-    if relative_count_to_relevant_sounds and len(contain_target_segment) > 0:
-        result /= sum(x.frequency for x in contain_target_segment)
-
-    # added what to do if the relative count to the whole corpus is true, namely, divide by the number of words in the corpus
-    elif relative_count_to_whole_corpus:
-        result = result / num_words_in_corpus
-
-    return result, minpairs
+        # Averaged over the other segments, as in relative_functional_load
+        rel_fls = [(s, matrix[i].sum() / (len(segments) - 1))
+                   for i, s in enumerate(segments)]
+        ordered_rel_fls = sorted(rel_fls, key=lambda p: p[1], reverse=True)
+        return ordered_rel_fls
@@ -23,3 +23,21 @@ def save_minimal_pairs(output_filename, to_output, write_header=True):
 
     if needs_closed:
         outf.close()
+
+
+def save_functional_loads(output_filename, to_output, write_header=True):
+    if isinstance(output_filename, str):
+        outf = open(output_filename, mode='w', encoding='utf-8-sig', newline='')
+        needs_closed = True
+    else:
+        outf = output_filename
+        needs_closed = False
+
+    writer = csv.writer(outf, delimiter='\t')
+    if write_header:
+        writer.writerow(['FIRST_SEGMENT', 'SECOND_SEGMENT', 'FUNCTIONAL_LOAD'])
+    for seg_pair, fl in to_output:
+        writer.writerow([seg_pair[0], seg_pair[1], fl])
+
+    if needs_closed:
+        outf.close()
@@ -309,7 +309,7 @@ class ASDialog(FunctionDialog):
                 'freq_lims':freq_lims,
                 'output_sim':self.outputSimWidget.isChecked(),
                 'use_multi':self.settings['use_multi'],
-                'num_cores':self.settings['num_cores'],
+                'num_cores':self.numCores(),
                 'return_all':True}
         if rep == 'mfcc':
             kwargs['num_coeffs'] = coeffs
@@ -35,7 +35,8 @@ class FAWorker(FunctionWorker):
                                 from_gui = True, phono_align=kwargs['phono_align'],
                                 output_filename=kwargs['output_filename'],
                                 stop_check = kwargs['stop_check'],
-                                call_back = kwargs['call_back'])
+                                call_back = kwargs['call_back'],
+                                num_cores = kwargs['num_cores'])
                     if self.stopped:
                         break
                     self.results.append(res)
@@ -322,6 +323,7 @@ class FADialog(FunctionDialog):
         kwargs['pair_behavior'] = pairBehaviour
         kwargs['frequency_cutoff'] = frequency_cutoff
         kwargs['output_filename'] = out_file
+        kwargs['num_cores'] = self.numCores()
         return kwargs
 
     def setResults(self, results):
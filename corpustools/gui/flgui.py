@@ -36,7 +36,8 @@ class FLWorker(FunctionWorker):
                 output_filename = kwargs.pop('output_filename', None)
 
                 if fl_algorithm == 'min_pairs':
-                    self.results = FL.minpair_fl_speed(c, pairs, **kwargs)
+                    # The minimal pairs are only listed for the output file
+                    self.results = FL.minpair_fl_speed(c, pairs, list_pairs=bool(output_filename), **kwargs)
 
                 else:  # use vectorized algorithm for entropy change
                     self.results = FL.deltah_fl_vectorized(c, pairs, **kwargs)
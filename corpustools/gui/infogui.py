@@ -137,6 +137,7 @@ class InformativityDialog(FunctionDialog):
         self.kwargs['preceding_context'] = self.precedingContext.value()
         self.kwargs['rounding'] = self.settings['sigfigs']
         self.kwargs['type_or_token'] = self.typeTokenWidget.value()
+        self.kwargs['num_cores'] = self.numCores()
         return self.kwargs
 
 class InformativityWorker(FunctionWorker):
@@ -171,7 +172,8 @@ class InformativityWorker(FunctionWorker):
                 #         self.stopped = True #result is None if user cancelled
                 # else:
                 results = informativity.get_multiple_informativity(c, kwargs['segs'], sequence_type, type_or_token=kwargs['type_or_token'],
-                            rounding=rounding, stop_check= kwargs['stop_check'], call_back=kwargs['call_back'])
+                            rounding=rounding, stop_check= kwargs['stop_check'], call_back=kwargs['call_back'],
+                            num_cores=kwargs['num_cores'])
                 try:
                     for result in results:
                         result.pop('Rounding')
@@ -34,7 +34,8 @@ class KLWorker(FunctionWorker):
                                     outfile = None,
                                     side = kwargs['side'],
                                     stop_check = kwargs['stop_check'],
-                                    call_back = kwargs['call_back'])
+                                    call_back = kwargs['call_back'],
+                                    num_cores = kwargs['num_cores'])
                     if self.stopped:
                         break
                     self.results.append(res)
@@ -159,6 +160,7 @@ class KLDialog(FunctionDialog):
         kwargs['type_token'] = self.typeTokenWidget.value()
         kwargs['side'] = self.contextRadioWidget.value()[0]
         kwargs['frequency_cutoff'] = frequency_cutoff
+        kwargs['num_cores'] = self.numCores()
         return kwargs
 
     def setResults(self,results):
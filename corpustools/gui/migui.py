@@ -1,6 +1,6 @@
 from collections import OrderedDict
 
-from corpustools.mutualinfo.mutual_information import mi_env_filter, pointwise_mi
+from corpustools.mutualinfo.mutual_information import mi_env_filter, pointwise_mis
 from .imports import *
 from .environments import EnvironmentSelectWidget
 from .widgets import (BigramWidget, RadioSelectWidget, TierWidget, ContextWidget, SaveFileWidget)
@@ -36,16 +36,15 @@ class MIWorker(FunctionWorker):
                     c = mi_env_filter(c, envs, context_output_path, word_boundary=kwargs['word_boundary'])
                     kwargs['in_word'] = False
 
-                for pair in kwargs['segment_pairs']:
-                    res = pointwise_mi(c, pair,
-                                       env_filtered=bool(envs),
-                                       word_boundary = kwargs['word_boundary'],
-                                       in_word = kwargs['in_word'],
-                                       stop_check = kwargs['stop_check'],
-                                       call_back = kwargs['call_back'])
-                    if self.stopped:
-                        break
-                    self.results.append(res)
+                results = pointwise_mis(c, kwargs['segment_pairs'],
+                                        env_filtered=bool(envs),
+                                        word_boundary = kwargs['word_boundary'],
+                                        in_word = kwargs['in_word'],
+                                        stop_check = kwargs['stop_check'],
+                                        call_back = kwargs['call_back'],
+                                        num_cores = kwargs['num_cores'])
+                if results is not None:
+                    self.results.extend(results)
             except PCTError as e:
                 self.errorEncountered.emit(e)
                 return
@@ -246,6 +245,7 @@ class MIDialog(FunctionDialog):
         self.kwargs['env_checked'] = self.envCheck.checkState()  # 0 if env_filter unchecked, 2 if checked.
         self.kwargs['word_boundary'] = self.wordBoundaryWidget.value() if not self.envCheck.checkState() \
             else self.envWBWidget.value()
+        self.kwargs['num_cores'] = self.numCores()
         return self.kwargs
 
     def setResults(self,results):
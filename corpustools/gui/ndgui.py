@@ -469,7 +469,7 @@ class NDDialog(FunctionDialog):
                 'type_token':typeToken,
                 'max_distance':max_distance,
                 'frequency_cutoff':frequency_cutoff,
-                'num_cores':self.settings['num_cores'],
+                'num_cores':self.numCores(),
                 'force_quadratic': self.useQuadratic.isChecked(),
                 'file_type': self.fileOptions.currentText().split()[-1],   # "----" out of file contains "----"
                 'collapse_homophones': self.collapseHomophones.isChecked(),
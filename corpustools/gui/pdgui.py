@@ -44,7 +44,8 @@ class PDWorker(FunctionWorker):
                                 ordered_pair = ordered_pair,
                                 all_info = True,
                                 stop_check = kwargs['stop_check'],
-                                call_back = kwargs['call_back'])
+                                call_back = kwargs['call_back'],
+                                num_cores = kwargs['num_cores'])
                     else:
                         res = calc_prod_all_envs(c, pair[0], pair[1],
                             all_info = True,
@@ -240,6 +241,7 @@ class PDDialog(FunctionDialog):
         self.kwargs['strict'] = self.enforceCheck.isChecked()
         self.kwargs['type_token'] = self.typeTokenWidget.value()
         self.kwargs['frequency_cutoff'] = frequency_cutoff
+        self.kwargs['num_cores'] = self.numCores()
         return self.kwargs
 
     def setResults(self,results):
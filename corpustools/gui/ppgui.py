@@ -46,7 +46,7 @@ class PPWorker(FunctionWorker):
                     phonotactic_probability_all_words(c,
                                             algorithm = kwargs['algorithm'],
                                             probability_type = kwargs['probability_type'],
-                                            #num_cores = kwargs['num_cores'],
+                                            num_cores = kwargs['num_cores'],
                                             stop_check = kwargs['stop_check'],
                                             call_back = kwargs['call_back'])
                     end = kwargs['corpusModel'].endAddColumn(end)
@@ -278,7 +278,8 @@ class PPDialog(FunctionDialog):
                 'type_token':self.typeTokenWidget.value(),
                 'frequency_cutoff':frequency_cutoff,
                 'probability_type':self.probabilityTypeWidget.value(),
-                'log_count': self.useLogScale.isEnabled() and self.useLogScale.isChecked()}
+                'log_count': self.useLogScale.isEnabled() and self.useLogScale.isChecked(),
+                'num_cores': self.numCores()}
 
         if self.compType is None:
             reply = QMessageBox.critical(self,
@@ -850,6 +850,7 @@ class PhonoSearchDialog(FunctionDialog):
         kwargs['mode'] = self.mode
         kwargs['result_type'] = self.resultType
         kwargs['seg_summary'] = self.segsum
+        kwargs['num_cores'] = self.numCores()
 
         return kwargs
 
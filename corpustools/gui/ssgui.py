@@ -335,7 +335,8 @@ class SSDialog(FunctionDialog):
                   'type_token': self.typeTokenWidget.value(),
                   'frequency_cutoff': frequency_cutoff,
                   'min_rel': min_rel,
-                  'max_rel': max_rel}
+                  'max_rel': max_rel,
+                  'num_cores': self.numCores()}
         # Error checking
         if self.compType is None:
             reply = QMessageBox.critical(self,
@@ -242,6 +242,13 @@ class FunctionDialog(PCTDialog):
     def generateKwargs(self):
         pass  # Implemented by subclasses
 
+    def numCores(self):
+        """Number of cores set in the preferences, or -1 if multiprocessing
+        is turned off"""
+        if not self.settings['use_multi']:
+            return -1
+        return self.settings['num_cores']
+
     def calc(self):
         kwargs = self.generateKwargs()
         if kwargs is None:
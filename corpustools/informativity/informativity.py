@@ -1,6 +1,8 @@
 from math import log2
 from collections import defaultdict
+from functools import partial
 from corpustools import __version__
+from corpustools.multiproc import get_backend, index_ranges
 
 
 def context(index, word, sequence_type = 'transcription'):
@@ -127,27 +129,11 @@ def conditional_probability(segment_frs, context_frs, stop_check=None, call_back
             conditional_prs[c] = segment_frs[c]
     return conditional_prs
 
-def get_multiple_informativity(corpus, segment_list, sequence_type = 'transcription', rounding=3, type_or_token='token',
-                               call_back = None, stop_check=None):
-    # s_frs = segment_in_context_frequencies(segment, corpus_context, sequence_type)
-    # seg_frequencies = {seg:segment_in_context_frequencies(seg, corpus, sequence_type) for seg in segment_list}
+def _segment_frequencies_range(words, segment_list, sequence_type, type_or_token, start, stop):
+    """Count the contexts of the segments in a range of words"""
     seg_frequencies = {seg:defaultdict(int) for seg in segment_list}
-    context_frequencies = {seg:defaultdict(int) for seg in segment_list}
-    seg_conditional_probs = {seg:defaultdict(float) for seg in segment_list}
-    corpus_size = len(corpus)
-    if call_back is not None:
-        call_back('Calculating segment frequencies...')
-        call_back(0, corpus_size)
-        cur = 0
-    for word in corpus:
+    for word in words[start:stop]:
         i = 0
-        if stop_check is not None and stop_check():
-            return
-        if call_back is not None:
-            cur += 1
-            if cur % 100 == 0:
-                call_back(cur)
-
         for seg in getattr(word, sequence_type):
             i += 1
             if seg in segment_list:
@@ -155,26 +141,60 @@ def get_multiple_informativity(corpus, segment_list, sequence_type = 'transcript
                     seg_frequencies[seg][context(i, word, sequence_type)] += word.frequency
                 else:
                     seg_frequencies[seg][context(i, word, sequence_type)] += 1
+    return seg_frequencies
 
-    if call_back is not None:
-        call_back('Calculating context frequencies...')
-        call_back(0, corpus_size)
-        cur = 0
-    for word in corpus:
-        if stop_check is not None and stop_check():
-            return
-        if call_back is not None:
-            cur += 1
-            if cur % 100 == 0:
-                call_back(cur)
-        for seg in segment_list:
-            for c in seg_frequencies[seg]:
+
+def _context_frequencies_range(words, seg_contexts, sequence_type, type_or_token, start, stop):
+    """Count the words in a range that begin with each segment's contexts"""
+    context_frequencies = {seg:defaultdict(int) for seg in seg_contexts}
+    for word in words[start:stop]:
+        for seg, contexts in seg_contexts.items():
+            for c in contexts:
                 if c is not None:
                     if tuple(getattr(word, sequence_type)[0:len(c)]) == c:
                         if type_or_token == 'token':
                             context_frequencies[seg][c] += word.frequency
                         else:
                             context_frequencies[seg][c] += 1
+    return context_frequencies
+
+
+def _merge_counts(totals, counts):
+    for seg, seg_counts in counts.items():
+        for c, count in seg_counts.items():
+            totals[seg][c] += count
+
+
+def get_multiple_informativity(corpus, segment_list, sequence_type = 'transcription', rounding=3, type_or_token='token',
+                               call_back = None, stop_check=None, num_cores=-1):
+    # s_frs = segment_in_context_frequencies(segment, corpus_context, sequence_type)
+    # seg_frequencies = {seg:segment_in_context_frequencies(seg, corpus, sequence_type) for seg in segment_list}
+    seg_frequencies = {seg:defaultdict(int) for seg in segment_list}
+    context_frequencies = {seg:defaultdict(int) for seg in segment_list}
+    seg_conditional_probs = {seg:defaultdict(float) for seg in segment_list}
+    backend = get_backend(num_cores)
+    words = list(corpus)
+    ranges = list(index_ranges(len(words), backend.num_procs, max_size=100))
+    if call_back is not None:
+        call_back('Calculating segment frequencies...')
+        call_back(0, len(ranges))
+    function = partial(_segment_frequencies_range, words, segment_list, sequence_type, type_or_token)
+    results = backend.map(function, ranges, call_back=call_back, stop_check=stop_check)
+    if results is None:
+        return
+    for counts in results:
+        _merge_counts(seg_frequencies, counts)
+
+    if call_back is not None:
+        call_back('Calculating context frequencies...')
+        call_back(0, len(ranges))
+    seg_contexts = {seg: list(seg_frequencies[seg]) for seg in segment_list}
+    function = partial(_context_frequencies_range, words, seg_contexts, sequence_type, type_or_token)
+    results = backend.map(function, ranges, call_back=call_back, stop_check=stop_check)
+    if results is None:
+        return
+    for counts in results:
+        _merge_counts(context_frequencies, counts)
 
     if call_back is not None:
         call_back('Calculating context frequencies...')
@@ -1,9 +1,11 @@
 from math import log
 from collections import defaultdict
+from functools import partial
 import os
 from codecs import open
 
 from corpustools.exceptions import KLError
+from corpustools.multiproc import get_backend, index_ranges
 
 class Context(object):
 
@@ -18,8 +20,39 @@ class Context(object):
     def __repr__(self):
         return str((self.seg1, self.seg2, self.other))
 
+def _count_contexts(words, sequence_type, seg1, seg2, side, start, stop):
+    """Count the contexts of the two sets of segments, and of all other
+    segments, in a range of words"""
+    allC = defaultdict(Context)
+    seg_counts = {'seg1':0, 'seg2':0}
+    for word in words[start:stop]:
+        tier = getattr(word, sequence_type)
+        symbols = tier.with_word_boundaries()
+        for pos in range(1, len(symbols)-1):
+            seg = symbols[pos]
+            thisc = (symbols[pos-1],symbols[pos+1])
+            if side.startswith('r'):
+                thisc = thisc[0]
+            elif side.startswith('l'):
+                thisc = thisc[1]
+
+            flag = False
+            if seg in seg1:
+                allC[thisc].seg1 += word.frequency
+                seg_counts['seg1'] += word.frequency
+                flag = True
+
+            if seg in seg2:
+                allC[thisc].seg2 += word.frequency
+                seg_counts['seg2'] += word.frequency
+                flag = True
+
+            if not flag:
+                allC[thisc].other += word.frequency
+    return allC, seg_counts
+
 def KullbackLeibler(corpus_context, seg1, seg2, side, outfile = None,
-                        stop_check = False, call_back = False):
+                        stop_check = None, call_back = None, num_cores = -1):
     """
     Calculates KL distances between two Phoneme objects in some context,
     either the left or right-hand side.
@@ -43,6 +76,9 @@ def KullbackLeibler(corpus_context, seg1, seg2, side, outfile = None,
         Optional function to check whether to gracefully terminate early
     call_back : callable or None
         Optional function to supply progress information during the function
+    num_cores : int
+        Number of cores to count contexts with, -1 (default) to count them
+        serially
     """
     ## FIXME:  This function should be refactored into in KL proper and
     ## another function that determines underlying form type things
@@ -68,31 +104,23 @@ def KullbackLeibler(corpus_context, seg1, seg2, side, outfile = None,
     allC = defaultdict(Context)
     seg_counts = {'seg1':0, 'seg2':0}
 
-
-    for word in corpus_context:
-        tier = getattr(word, corpus_context.sequence_type)
-        symbols = tier.with_word_boundaries()
-        for pos in range(1, len(symbols)-1):
-            seg = symbols[pos]
-            thisc = (symbols[pos-1],symbols[pos+1])
-            if side.startswith('r'):
-                thisc = thisc[0]
-            elif side.startswith('l'):
-                thisc = thisc[1]
-
-            flag = False
-            if seg in seg1:
-                allC[thisc].seg1 += word.frequency
-                seg_counts['seg1'] += word.frequency
-                flag = True
-
-            if seg in seg2:
-                allC[thisc].seg2 += word.frequency
-                seg_counts['seg2'] += word.frequency
-                flag = True
-
-            if not flag:
-                allC[thisc].other += word.frequency
+    backend = get_backend(num_cores)
+    words = corpus_context.words
+    ranges = list(index_ranges(len(words), backend.num_procs))
+    if call_back is not None:
+        call_back('Counting contexts...')
+        call_back(0, len(ranges))
+    function = partial(_count_contexts, words, corpus_context.sequence_type, seg1, seg2, side)
+    results = backend.map(function, ranges, call_back = call_back, stop_check = stop_check)
+    if results is None:
+        return
+    for contexts, counts in results:
+        for c, result in contexts.items():
+            allC[c].seg1 += result.seg1
+            allC[c].seg2 += result.seg2
+            allC[c].other += result.other
+        seg_counts['seg1'] += counts['seg1']
+        seg_counts['seg2'] += counts['seg2']
 
     totalC = len(allC)
     freq_c = defaultdict(int)
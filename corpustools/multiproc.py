@@ -1,281 +1,526 @@
+"""
+Execution backends and the persistent worker pool used by the analyses.
 
-from multiprocessing import Process, process, Manager, Queue, cpu_count, Value, Lock, Pool, JoinableQueue
-from queue import Empty, Full
+Analyses get a backend from ``get_backend`` with the number of cores set in
+the preferences; a backend maps a function over tuples of arguments
+serially, on threads, or on the session's worker pool.  The pool is started
+once per session (see ``get_pool``) and reused by every call.  With the
+shared memory backend (the default), the function to run, which usually
+holds a whole corpus context, is published to the workers once per call
+through shared memory, and each job only carries a handle to it along with
+its own arguments.  Results are streamed back as the workers finish them.
+"""
+import atexit
+import itertools
+import pickle
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from multiprocessing import Pool, RawArray, resource_tracker, shared_memory
 
-import time
 
+def chunks(l, n):
+    for i in range(0,len(l), n):
+        yield l[i:i+n]
 
-def pool_filter(func, candidates, num_cores):
-    pool = Pool(num_cores)
-    return [c for c, keep in zip(candidates,pool.map(func,candidates)) if keep]
 
-class Counter(object):
-    def __init__(self, initval=0):
-        self.val = Value('i', initval)
-        self.lock = Lock()
+def index_ranges(length, num_procs, max_size=500):
+    """
+    Split ``range(length)`` into contiguous ranges, about four per process
+    so that workers that finish early can pick up more work
 
-    def increment(self):
-        with self.lock:
-            self.val.value += 1
+    Yields
+    ------
+    tuple
+        Start and stop of each range
+    """
+    size = max(1, min(max_size, -(-length // (4 * max(1, num_procs)))))
+    for start in range(0, length, size):
+        yield (start, min(start + size, length))
 
-    def value(self):
-        with self.lock:
-            return self.val.value
 
-class Stopped(object):
-    def __init__(self, initval=False):
-        self.val = Value('i', initval)
-        self.lock = Lock()
+class PublishedObject(object):
+    """
+    Handle to an object published to the workers of a WorkerPool
 
-    def stop(self):
-        with self.lock:
-            self.val.value = True
+    Parameters
+    ----------
+    name : str
+        Name of the shared memory block holding the pickled object
+    size : int
+        Size of the pickled object in bytes
+    token : int
+        Identifier of the object within the session
+    """
+    __slots__ = ('name', 'size', 'token')
 
-    def stop_check(self):
-        with self.lock:
-            return self.val.value
+    def __init__(self, name, size, token):
+        self.name = name
+        self.size = size
+        self.token = token
 
-class QueueAdder(Process):
-    def __init__(self, iterable, queue, stopped):
-        Process.__init__(self)
-        self.iterable = iterable
-        self.queue = queue
-        self.stopped = stopped
+    def __getstate__(self):
+        return (self.name, self.size, self.token)
 
-    def run(self):
-        for item in self.iterable:
-            if self.stopped.stop_check():
-                break
-            while True:
-                if self.stopped.stop_check():
-                    break
-                try:
-                    self.queue.put(item,False)
-                    break
-                except Full:
-                    pass
-        self.queue.close()
-        print('queue adder worker returning!')
-        return
-
-class FilterWorker(Process):
-    def __init__(self, job_q, filtered_q, filter_function, counter, stopped):
-        Process.__init__(self)
-        self.job_q = job_q
-        self.filtered_q = filtered_q
-        self.filter_function = filter_function
-        self.counter = counter
-        self.stopped = stopped
-
-    def run(self):
-        results = list()
-        while True:
-            self.counter.increment()
-            try:
-                args = self.job_q.get(timeout=1)
-            except Empty:
-                break
-            try:
-                for a in args:
-                    if self.filter_function(*a):
-                        results.append(a)
-            except Exception as e:
-                self.stopped.stop()
-                self.filtered_q.put(e)
-                break
-            self.job_q.task_done()
-        if self.stopped.stop_check():
-            return
-        if len(results) > 0:
-            self.filtered_q.put(results)
-
-
-        print('filter worker returning!')
-        return
+    def __setstate__(self, state):
+        self.name, self.size, self.token = state
 
-def chunks(l, n):
-    for i in range(0,len(l), n):
-        yield l[i:i+n]
 
+# Cancellation flags of the calls to WorkerPool.imap, indexed by call ID
+_max_calls = 64
 
-def filter_mp(iterable, filter_function, num_procs, call_back, stop_check, debug = False):
-    job_queue = JoinableQueue(100)
-    filtered_queue = Queue()
-    stopped = Stopped()
-    done = False
-    while not done:
-        chunk = []
-        while len(chunk) < 500:
-            try:
-                item = next(iterable)
-            except StopIteration:
-                done = True
-                break
-            chunk.append(item)
-        try:
-            job_queue.put(chunk,False)
-        except Full:
-            break
-    procs = []
-
-    counter = Counter()
-    for i in range(num_procs):
-        p = FilterWorker(job_queue, filtered_queue, filter_function, counter, stopped)
-        procs.append(p)
-        p.start()
-    val = 0
-    done = False
-    while not done:
-        if stop_check is None:
-            break
-        if stop_check is not None and stop_check():
-            stopped.stop()
-            time.sleep(1)
-            break
-        chunk = []
-        while len(chunk) < 500:
-            try:
-                item = next(iterable)
-            except StopIteration:
-                done = True
-                break
-            chunk.append(item)
-        job_queue.put(chunk)
-
-        if call_back is not None:
-            value = counter.value()
-            call_back(value)
-    job_queue.join()
-    if debug:
-        print('queueadder joined!')
-    return_list = list()
-    error = None
-    while True:
+# Worker process state, set up by _init_worker
+_cancelled = None
+_objects = OrderedDict()
+_max_cached_objects = 4
+
+
+def _init_worker(cancelled):
+    global _cancelled
+    _cancelled = cancelled
+
+
+def _resolve(handle):
+    if not isinstance(handle, PublishedObject):
+        # Sent along with the job
+        return handle
+    try:
+        obj = _objects[handle.token]
+        _objects.move_to_end(handle.token)
+        return obj
+    except KeyError:
+        pass
+    # Workers share the parent's resource tracker, so attaching here does not
+    # change who unlinks the block (the parent, in WorkerPool.release)
+    shm = shared_memory.SharedMemory(name=handle.name)
+    data = shm.buf[:handle.size]
+    try:
+        obj = pickle.loads(data)
+    finally:
+        data.release()
+        shm.close()
+    _objects[handle.token] = obj
+    while len(_objects) > _max_cached_objects:
+        _objects.popitem(last=False)
+    return obj
+
+
+def _run_job(job):
+    call_id, handle, mode, chunk = job
+    if _cancelled is not None and _cancelled[call_id % _max_calls]:
+        return len(chunk), []
+    function = _resolve(handle)
+    results = []
+    for args in chunk:
+        value = function(*args)
+        if mode == 'map':
+            results.append((args, value))
+        elif mode == 'filter':
+            if value:
+                results.append(args)
+        elif value is not None:
+            results.append(tuple(args) + (value,))
+    return len(chunk), results
+
+
+class WorkerPool(object):
+    """
+    Pool of worker processes that is kept alive between analyses
+
+    Parameters
+    ----------
+    num_procs : int
+        Number of worker processes
+    """
+    def __init__(self, num_procs):
+        self.num_procs = max(1, num_procs)
+        self._cancelled = RawArray('b', _max_calls)
+        # Start the resource tracker first so that the workers share it
+        resource_tracker.ensure_running()
+        self._pool = Pool(self.num_procs, initializer=_init_worker, initargs=(self._cancelled,))
+        self._published = {}
+        self._tokens = itertools.count(1)
+        self._call_ids = itertools.count(1)
+
+    def publish(self, obj):
+        """
+        Make an object available to the workers, it is pickled once here
+        and unpickled once per worker
+
+        Parameters
+        ----------
+        obj : object
+            Picklable object, such as a function bound to a corpus context
+
+        Returns
+        -------
+        PublishedObject
+            Handle to pass to jobs in place of the object
+        """
+        data = pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+        shm = shared_memory.SharedMemory(create=True, size=max(len(data), 1))
+        shm.buf[:len(data)] = data
+        handle = PublishedObject(shm.name, len(data), next(self._tokens))
+        self._published[handle.token] = shm
+        return handle
+
+    def release(self, handle):
+        """
+        Free the shared memory of a published object
+        """
+        shm = self._published.pop(handle.token, None)
+        if shm is not None:
+            shm.close()
+            shm.unlink()
+
+    def imap(self, function, iterable, mode='score', chunk_size=500,
+             call_back=None, stop_check=None, shared=True):
+        """
+        Apply a function to every tuple of arguments in an iterable, yielding
+        results in the order the workers complete them
+
+        Parameters
+        ----------
+        function : callable
+            Function to apply, it is published once for the whole call
+        iterable : iterable of tuples
+            Arguments for each call of the function
+        mode : str
+            'score' to yield the arguments with the function's return value
+            appended (skipping None), 'filter' to yield the arguments for
+            which the function returns a true value, 'map' to yield every
+            tuple of arguments paired with the function's return value
+        chunk_size : int
+            Number of calls per job sent to a worker
+        call_back : callable, optional
+            Called with the number of calls completed so far
+        stop_check : callable, optional
+            If it returns True, remaining jobs are cancelled and iteration
+            stops
+        shared : bool
+            If True (default), the function is published through shared
+            memory once for the call, otherwise it is pickled with every job
+
+        Yields
+        ------
+        tuple
+            Arguments (with the score appended in 'score' mode, or paired
+            with the return value in 'map' mode)
+        """
+        handle = self.publish(function) if shared else function
+        call_id = next(self._call_ids)
+        flag = call_id % _max_calls
+        self._cancelled[flag] = 0
+
+        def jobs():
+            iterator = iter(iterable)
+            while not self._cancelled[flag]:
+                chunk = list(itertools.islice(iterator, chunk_size))
+                if not chunk:
+                    return
+                yield (call_id, handle, mode, chunk)
+
+        done = 0
+        completed = False
         try:
-            l = filtered_queue.get(timeout=2)
-        except Empty:
-            break
-        if isinstance(l, Exception):
-            error = l
-        else:
-            return_list.extend(l)
-    if debug:
-        print('emptied result queue')
-    for p in procs:
-        p.join()
-    if error is not None:
-        raise(error)
-    if debug:
-        print('joined')
-        print(len(return_list))
-    return return_list
-
-class ScoreWorker(Process):
-    def __init__(self, job_q, scored_q, function, counter, stopped):
-        Process.__init__(self)
-        self.job_q = job_q
-        self.scored_q = scored_q
+            for count, results in self._pool.imap_unordered(_run_job, jobs()):
+                if stop_check is not None and stop_check():
+                    break
+                done += count
+                if call_back is not None:
+                    call_back(done)
+                for r in results:
+                    yield r
+            else:
+                completed = True
+        finally:
+            if not completed:
+                # Jobs that have not started yet are skipped by the workers
+                self._cancelled[flag] = 1
+            if shared:
+                self.release(handle)
+
+    def close(self):
+        for token in list(self._published):
+            shm = self._published.pop(token)
+            shm.close()
+            shm.unlink()
+        self._pool.terminate()
+        self._pool.join()
+
+
+_session_pool = None
+
+
+def get_pool(num_procs):
+    """
+    Get the worker pool of the session, starting it (or restarting it with
+    a new number of processes) if needed
+
+    Parameters
+    ----------
+    num_procs : int
+        Number of worker processes
+
+    Returns
+    -------
+    WorkerPool
+        Pool shared by all analyses in the session
+    """
+    global _session_pool
+    num_procs = max(1, num_procs)
+    if _session_pool is not None and _session_pool.num_procs != num_procs:
+        _session_pool.close()
+        _session_pool = None
+    if _session_pool is None:
+        _session_pool = WorkerPool(num_procs)
+    return _session_pool
+
+
+@atexit.register
+def shutdown_pool():
+    """
+    Stop the worker pool of the session, if one was started
+    """
+    global _session_pool
+    if _session_pool is not None:
+        _session_pool.close()
+        _session_pool = None
+
+
+class _Indexed(object):
+    """
+    Wrapper of a function that takes the position of its arguments in the
+    input as an extra first argument, so that results can be put back in
+    order
+    """
+    def __init__(self, function):
         self.function = function
-        self.counter = counter
-        self.stopped = stopped
-
-    def run(self):
-        while True:
-            self.counter.increment()
-            try:
-                args = self.job_q.get(timeout=1)
-            except Empty:
-                break
-            results = list()
-            for a in args:
-                try:
-                    score = self.function(*a)
-                    if score is None:
-                        continue
-                    return_value = tuple([x for x in a] + [score])
-                    results.append(return_value)
-                except Exception as e:
-                    self.scored_q.put(e)
-                    self.stopped.stop()
+
+    def __call__(self, index, *args):
+        return self.function(*args)
+
+
+class Backend(object):
+    """
+    Base class of the execution backends
+
+    Every backend applies a function to tuples of arguments, with the same
+    progress and cancellation semantics: ``call_back`` is called with the
+    number of calls completed so far, and ``stop_check`` is checked as
+    calls complete; once it returns True no further results are produced.
+
+    Attributes
+    ----------
+    num_procs : int
+        Number of calls that can run at the same time
+    parallel : bool
+        False for the serial backend
+    """
+    num_procs = 1
+    parallel = True
+
+    def imap(self, function, iterable, chunk_size=1, call_back=None, stop_check=None):
+        """
+        Apply a function to every tuple of arguments in an iterable
+
+        Parameters
+        ----------
+        function : callable
+            Function to apply, it must be picklable for the process backends
+        iterable : iterable of tuples
+            Arguments for each call of the function
+        chunk_size : int
+            Number of calls sent to a worker at once
+        call_back : callable, optional
+            Called with the number of calls completed so far
+        stop_check : callable, optional
+            If it returns True, iteration stops
+
+        Yields
+        ------
+        tuple
+            Arguments and the function's return value, in the order the
+            calls complete
+        """
+        raise NotImplementedError
+
+    def map(self, function, iterable, chunk_size=1, call_back=None, stop_check=None):
+        """
+        Apply a function to every tuple of arguments in an iterable, see
+        ``imap`` for the parameters
+
+        Returns
+        -------
+        list or None
+            Return values of the function in the order of the input, or None
+            if the calculation was stopped
+        """
+        items = [tuple(args) for args in iterable]
+        results = [None] * len(items)
+        done = 0
+        indexed = ((i,) + args for i, args in enumerate(items))
+        for args, value in self.imap(_Indexed(function), indexed, chunk_size=chunk_size,
+                                     call_back=call_back, stop_check=stop_check):
+            results[args[0]] = value
+            done += 1
+        if done < len(items):
+            return None
+        return results
+
+
+class SerialBackend(Backend):
+    """
+    Backend that runs every call in the calling thread
+    """
+    parallel = False
+
+    def imap(self, function, iterable, chunk_size=1, call_back=None, stop_check=None):
+        done = 0
+        for args in iterable:
+            if stop_check is not None and stop_check():
+                return
+            value = function(*args)
+            done += 1
+            if call_back is not None:
+                call_back(done)
+            yield args, value
+
+
+def _run_chunk(function, chunk):
+    return [function(*args) for args in chunk]
+
+
+class ThreadBackend(Backend):
+    """
+    Backend that runs calls on a pool of threads, for functions that
+    spend their time outside of the interpreter (NumPy, file access)
+
+    Parameters
+    ----------
+    num_procs : int
+        Number of threads
+    """
+    def __init__(self, num_procs):
+        self.num_procs = max(1, num_procs)
+
+    def imap(self, function, iterable, chunk_size=1, call_back=None, stop_check=None):
+        iterator = iter(iterable)
+        executor = ThreadPoolExecutor(self.num_procs)
+        pending = {}
+
+        def submit():
+            chunk = list(itertools.islice(iterator, chunk_size))
+            if chunk:
+                pending[executor.submit(_run_chunk, function, chunk)] = chunk
+            return bool(chunk)
+
+        done = 0
+        try:
+            for _ in range(2 * self.num_procs):
+                if not submit():
                     break
-            self.job_q.task_done()
-            if self.stopped.stop_check():
-                continue
-            self.scored_q.put(results)
+            while pending:
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    chunk = pending.pop(future)
+                    values = future.result()
+                    if stop_check is not None and stop_check():
+                        return
+                    done += len(chunk)
+                    if call_back is not None:
+                        call_back(done)
+                    for args, value in zip(chunk, values):
+                        yield args, value
+                    submit()
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+class ProcessBackend(Backend):
+    """
+    Backend that runs calls on the session's worker pool, sending the
+    function with every job
+
+    Parameters
+    ----------
+    num_procs : int
+        Number of worker processes
+    """
+    shared = False
+
+    def __init__(self, num_procs):
+        self.num_procs = max(1, num_procs)
+
+    def imap(self, function, iterable, chunk_size=1, call_back=None, stop_check=None):
+        pool = get_pool(self.num_procs)
+        return pool.imap(function, iterable, mode='map', chunk_size=chunk_size,
+                         call_back=call_back, stop_check=stop_check, shared=self.shared)
+
+
+class SharedMemoryBackend(ProcessBackend):
+    """
+    Backend that runs calls on the session's worker pool, publishing the
+    function (and the corpus it holds) to the workers once per call
+    """
+    shared = True
+
 
-        return
+backend_types = {'serial': SerialBackend,
+                 'thread': ThreadBackend,
+                 'process': ProcessBackend,
+                 'shared_memory': SharedMemoryBackend}
+
+
+def get_backend(num_cores=-1, kind='shared_memory'):
+    """
+    Get the backend to run an analysis with
+
+    Parameters
+    ----------
+    num_cores : int
+        Number of cores to use, -1 (the value used when multiprocessing is
+        turned off) or 1 to run serially
+    kind : str
+        One of 'serial', 'thread', 'process' or 'shared_memory'
+
+    Returns
+    -------
+    Backend
+        Backend with a uniform ``map``/``imap`` interface
+    """
+    if kind not in backend_types:
+        raise ValueError('{} is not a valid execution backend.'.format(kind))
+    if num_cores is None or num_cores <= 1 or kind == 'serial':
+        return SerialBackend()
+    return backend_types[kind](num_cores)
 
 
 def score_mp(iterable, function, num_procs, call_back, stop_check, debug = False, chunk_size = 500):
-    job_queue = JoinableQueue(100)
-    scored_queue = Queue()
-    stopped = Stopped()
-    done = False
-    while not done:
-        chunk = []
-        while len(chunk) < chunk_size:
-            try:
-                item = next(iterable)
-            except StopIteration:
-                done = True
-                break
-            chunk.append(item)
-        try:
-            job_queue.put(chunk,False)
-        except Full:
-            break
-    procs = []
-
-    counter = Counter()
-    for i in range(num_procs):
-        p = ScoreWorker(job_queue, scored_queue, function, counter, stopped)
-        procs.append(p)
-        p.start()
-    val = 0
-    done = False
-    while not done:
-        if stop_check is None:
-            break
-        if stop_check is not None and stop_check():
-            stopped.stop()
-            time.sleep(1)
-            break
-        chunk = []
-        while len(chunk) < chunk_size:
-            try:
-                item = next(iterable)
-            except StopIteration:
-                done = True
-                break
-            chunk.append(item)
-        job_queue.put(chunk)
-
-        if call_back is not None:
-            value = counter.value()
-            call_back(value)
-    job_queue.join()
-    time.sleep(2)
-    if debug:
-        print('queueadder joined!')
-    return_list = list()
-    error = None
-    while True:
-        try:
-            l = scored_queue.get(timeout=2)
-        except Empty:
-            break
-        if isinstance(l, Exception):
-            error = l
-        else:
-            return_list.extend(l)
-    if debug:
-        print('emptied result queue')
-    for p in procs:
-        p.join()
-    if error is not None:
-        raise(error)
-    if debug:
-        print('joined')
-        print(len(return_list))
-    return return_list
+    """
+    Score every tuple of arguments in an iterable with a function using the
+    session's worker pool
+
+    Returns
+    -------
+    list of tuples
+        Arguments with their score appended, in no particular order, for the
+        calls that did not return None
+    """
+    pool = get_pool(num_procs)
+    return list(pool.imap(function, iterable, mode='score', chunk_size=chunk_size,
+                          call_back=call_back, stop_check=stop_check))
+
+
+def filter_mp(iterable, filter_function, num_procs, call_back, stop_check, debug = False, chunk_size = 500):
+    """
+    Keep the tuples of arguments in an iterable for which a function
+    returns a true value, using the session's worker pool
 
+    Returns
+    -------
+    list of tuples
+        Arguments that passed the filter, in no particular order
+    """
+    pool = get_pool(num_procs)
+    return list(pool.imap(filter_function, iterable, mode='filter', chunk_size=chunk_size,
+                          call_back=call_back, stop_check=stop_check))
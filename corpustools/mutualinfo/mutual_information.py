@@ -1,9 +1,10 @@
 import math
-import time
 import csv
 import regex as re
+from functools import partial
 
 from corpustools.exceptions import MutualInfoError
+from corpustools.multiproc import get_backend
 from corpustools.corpus.classes.lexicon import Corpus, Word
 
 
@@ -194,6 +195,35 @@ def pointwise_mi(corpus_context, query, env_filtered=False, word_boundary='Word-
     return math.log((prob_bg/(prob_s1*prob_s2)), 2)
 
 
+def pointwise_mis(corpus_context, queries, env_filtered=False, word_boundary='Word-end only', in_word=False,
+                  stop_check=None, call_back=None, num_cores=-1):
+    """
+    Calculate the mutual information of several bigrams, see
+    `pointwise_mi` for the parameters
+
+    Parameters
+    ----------
+    queries : list of tuples
+        Bigrams to calculate mutual information for
+    num_cores : int
+        Number of cores to spread the bigrams over, -1 (default) to
+        calculate them serially
+
+    Returns
+    -------
+    list of floats or None
+        Mutual information of each bigram, or None if the calculation was
+        stopped
+    """
+    if call_back is not None:
+        call_back('Calculating mutual information...')
+        call_back(0, len(queries))
+    function = partial(pointwise_mi, corpus_context, env_filtered=env_filtered,
+                       word_boundary=word_boundary, in_word=in_word)
+    return get_backend(num_cores).map(function, [(query,) for query in queries],
+                                      call_back=call_back, stop_check=stop_check)
+
+
 def get_in_word_unigram_frequencies(corpus_context, query):
     totals = [0 for x in query]
     for word in corpus_context:
@@ -214,24 +244,20 @@ def get_in_word_bigram_frequency(corpus_context, query):
 
 def all_mis(corpus_context,
             word_boundary, in_word = False,
-            stop_check = None, call_back = None):
-    mis = {}
-    total_calculations = ((len(corpus_context.inventory)**2)-len(corpus_context.inventory)/2)+1
-    ct = 1
-    t = time.time()
+            stop_check = None, call_back = None, num_cores = -1):
+    pairs = []
     for s1 in corpus_context.inventory:
         for s2 in corpus_context.inventory:
-                #print('Performing MI calculation {} out of {} possible'.format(str(ct), str(total_calculations)))
-                ct += 1
-                #print('Duration of last calculation: {}'.format(str(time.time() - t)))
-                t = time.time()
                 if type(s1) != str:
                     s1 = s1.symbol
                 if type(s2) != str:
                     s2 = s2.symbol
-                #print(s1,s2)
-                mi = pointwise_mi(corpus_context, (s1, s2), word_boundary = word_boundary, in_word = in_word)
-                mis[(s1,s2)] = mi
+                pairs.append((s1, s2))
+    results = pointwise_mis(corpus_context, pairs, word_boundary = word_boundary, in_word = in_word,
+                            stop_check = stop_check, call_back = call_back, num_cores = num_cores)
+    if results is None:
+        return
+    mis = dict(zip(pairs, results))
 
     ordered_mis = sorted([(pair, str(mis[pair])) for pair in mis], key=lambda p: p[1])
 
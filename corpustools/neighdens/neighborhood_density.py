@@ -1,24 +1,35 @@
 from functools import partial
 
+import numpy as np
+
 from corpustools.corpus.classes import Word
 from corpustools.symbolsim.edit_distance import edit_distance
+from corpustools.symbolsim.string_similarity import corpus_edit_distances, corpus_khorsi
 from corpustools.symbolsim.khorsi import khorsi
 from corpustools.symbolsim.phono_edit_distance import phono_edit_distance
-from corpustools.symbolsim.phono_align import Aligner
 from corpustools.multiproc import filter_mp, score_mp
+from corpustools.exceptions import NeighDenError
 
 
-def _is_edit_distance_neighbor(w, query, sequence_type, max_distance):
-    w_len = len(getattr(w, sequence_type))
-    query_len = len(getattr(query, sequence_type))
-    if w_len > query_len + max_distance:
-        return False
-    if w_len < query_len - max_distance:
+# Largest edit distance that neighborhood density looks up in a deletion
+# index (see BaseCorpusContext.deletion_index) rather than comparing the
+# query to every word; the number of deletion variants per word grows
+# quickly with the distance
+max_indexed_distance = 3
+
+
+def _use_deletion_index(algorithm, max_distance):
+    if algorithm != 'edit_distance' or max_distance is None:
         return False
+    return float(max_distance).is_integer() and 1 <= max_distance <= max_indexed_distance
+
+
+def _is_edit_distance_neighbor(w, query, sequence_type, max_distance):
+    distance = edit_distance(getattr(w, sequence_type), getattr(query, sequence_type),
+                             sequence_type, max_distance)
 
     # should be greater than 0, because two identical words (i.e., an edit distance of 0) are not phono neighbours!
-    return 0 < edit_distance(getattr(w, sequence_type), getattr(query, sequence_type),
-                         sequence_type, max_distance) <= max_distance
+    return distance is not None and distance > 0
 
 
 def _is_phono_edit_distance_neighbor(w, query, sequence_type, specifier, max_distance):
@@ -29,6 +40,13 @@ def _is_khorsi_neighbor(w, query, freq_base, sequence_type, max_distance):
     return khorsi(getattr(w, sequence_type), getattr(query, sequence_type), freq_base, sequence_type, max_distance) >= max_distance
 
 
+def _summarize_neighbors(function, words, index, output_format):
+    # Runs in worker processes: only the count and the neighbors' output
+    # strings are sent back, not the neighboring Words themselves
+    res = function(words[index])
+    return res[0], [getattr(r, output_format) for r in res[1]]
+
+
 def neighborhood_density_all_words(corpus_context, tierdict, tier_type = None, sequence_type = None,
             algorithm = 'edit_distance', max_distance = 1, output_format = 'spelling',
             num_cores = -1, settable_attr = None, collapse_homophones = False,
@@ -51,6 +69,11 @@ def neighborhood_density_all_words(corpus_context, tierdict, tier_type = None, s
     settable_attr: string
         Name of attribute that neighbourhood density results will be assigned to
     """
+    if _use_deletion_index(algorithm, max_distance):
+        # Built here so that it is sent to worker processes with the context
+        corpus_context.deletion_index(max_distance)
+    elif algorithm == 'phono_edit_distance':
+        corpus_context.phono_edit_distance_index()
     function = partial(neighborhood_density, corpus_context,
                         tierdict = tierdict,
                         tier_type = tier_type,
@@ -116,14 +139,23 @@ def neighborhood_density_all_words(corpus_context, tierdict, tier_type = None, s
         #     #the -1 is to account for the fact that words are counted as their own neighbour, and this is incorrect
         #     #subtracting 1 here is easier than fixing the neighbourhood density algorithm
     else:
-        iterable = ((w,) for w in corpus_context)
-        neighbors = score_mp(iterable, function, num_cores, call_back, stop_check, chunk_size = 1)
-        for n in neighbors:
-            #Have to look up the key, then look up the object due to how
-            #multiprocessing pickles objects
-            setattr(corpus_context.corpus.find(corpus_context.corpus.key(n[0])),
-                    #corpus_context.attribute.name, n[1][0])
-                    settable_attr.name, n[1][0])
+        # Words are sent to the workers once, along with the function, and
+        # jobs refer to them by index
+        words = corpus_context.words
+        iterable = ((i,) for i in range(len(words)))
+        summarize = partial(_summarize_neighbors, function, words, output_format = output_format)
+        neighbors = score_mp(iterable, summarize, num_cores, call_back, stop_check, chunk_size = 1)
+        # The workers finish in any order; go through the words in corpus
+        # order so that homographs get the same key suffixes as when serial
+        for i, (density, neighbor_list) in sorted(neighbors, key = lambda x: x[0]):
+            w = words[i]
+            n = 0
+            w_t_key = f'{w} [{w.transcription}]{n}'
+            while w_t_key in results:
+                n += 1
+                w_t_key = f'{w} [{w.transcription}]{n}'
+            results[w_t_key] = neighbor_list
+            setattr(w.original, settable_attr.name, density)
 
     return results
 
@@ -157,56 +189,92 @@ def neighborhood_density(corpus_context, query, tierdict,
         Tuple of the number of neighbors and the set of neighbor Words.
     """
 
-    matches = []                # list to contain phono neighbours
     query = ensure_query_is_word(query, corpus_context, corpus_context.sequence_type, tier_type)
 
     if call_back is not None:
         call_back('Finding neighbors for {}...'.format(query))
         call_back(0,len(corpus_context))
-        cur = 0
 
     if algorithm == 'edit_distance' and max_distance == 1 and force_quadratic:
         return fast_neighborhood_density(corpus_context, query, corpus_context.sequence_type, tier_type, tierdict,
                                          file_type=file_type, collapse_homophones=collapse_homophones)
 
+    if _use_deletion_index(algorithm, max_distance):
+        return _indexed_neighborhood_density(corpus_context, query, max_distance,
+                                             collapse_homophones = collapse_homophones)
+
     if algorithm == 'edit_distance':
-        is_neighbor = partial(_is_edit_distance_neighbor,
-                                sequence_type = corpus_context.sequence_type,
-                                max_distance = max_distance)
-    elif algorithm == 'phono_edit_distance':
-        is_neighbor = partial(_is_phono_edit_distance_neighbor,
-                                specifier = corpus_context.specifier,
-                                sequence_type = corpus_context.sequence_type,
-                                max_distance = max_distance)
-    elif algorithm == 'khorsi':
-        freq_base = corpus_context.get_frequency_base()
-        is_neighbor = partial(_is_khorsi_neighbor,
-                                freq_base = freq_base,
-                                sequence_type = corpus_context.sequence_type,
-                                max_distance = max_distance)
-    for w in corpus_context:            # loop over each word (w) in the corpus
-        if stop_check is not None and stop_check():
-            return
-        if call_back is not None:
-            cur += 1
-            if cur % 10 == 0:
-                call_back(cur)
-        if not is_neighbor(w, query):                  # if *not* neighbor then do not add to 'matches'
-            continue
+        return _batch_neighborhood_density(corpus_context, query, max_distance,
+                                           collapse_homophones = collapse_homophones)
 
-        # the following conditional checks whether collapse homophones is True. If so, remove homophones
-        if collapse_homophones:
-            w_sequence = getattr(w, sequence_type)
+    if algorithm == 'phono_edit_distance':
+        return _metric_neighborhood_density(corpus_context, query, max_distance,
+                                            collapse_homophones = collapse_homophones)
 
-            # if the transcription of the just-found potential neighbor is identical to
-            # anything we already have as previously found neighbours, do not add the current result into 'matches.'
-            if any(getattr(m, sequence_type) == w_sequence for m in matches):
-                continue
+    if algorithm == 'khorsi':
+        return _khorsi_neighborhood_density(corpus_context, query, max_distance,
+                                            collapse_homophones = collapse_homophones)
 
-        matches.append(w)
-    neighbors = matches
+    raise(NeighDenError('{} is not a possible neighborhood density algorithm.'.format(algorithm)))
+
+
+def _indexed_neighborhood_density(corpus_context, query, max_distance, collapse_homophones = False):
+    """Find the edit distance neighbors of a query with the context's
+    deletion index; the neighbors are the same, and in the same order, as
+    when comparing the query to every word"""
+    index = corpus_context.deletion_index(max_distance)
+    query_ids = corpus_context.segment_table.encode(getattr(query, corpus_context.sequence_type))
+    return _collect_neighbors(corpus_context, index.neighbors(query_ids, max_distance),
+                              collapse_homophones = collapse_homophones)
 
-    return (len(neighbors), neighbors)
+
+def _batch_neighborhood_density(corpus_context, query, max_distance, collapse_homophones = False):
+    """Find the edit distance neighbors of a query by computing its distance
+    to every word at once"""
+    distances = corpus_edit_distances(corpus_context, query, max_distance)
+    found = ((i, distances[i]) for i in np.flatnonzero(distances <= max_distance))
+    return _collect_neighbors(corpus_context, found, collapse_homophones = collapse_homophones)
+
+
+def _metric_neighborhood_density(corpus_context, query, max_distance, collapse_homophones = False):
+    """Find the phonological edit distance neighbors of a query with the
+    context's metric index; as when comparing the query to every word,
+    words identical to the query are counted"""
+    index = corpus_context.phono_edit_distance_index()
+    query_sequence = [str(s) for s in getattr(query, corpus_context.sequence_type)]
+    return _collect_neighbors(corpus_context, index.neighbors(query_sequence, max_distance),
+                              collapse_homophones = collapse_homophones, include_identical = True)
+
+
+def _khorsi_neighborhood_density(corpus_context, query, max_distance, collapse_homophones = False):
+    """Find the words whose Khorsi similarity to a query is at least
+    max_distance, scoring all the words at once"""
+    scores = corpus_khorsi(corpus_context, query, query_first = False)
+    found = ((i, scores[i]) for i in np.flatnonzero(scores >= max_distance))
+    # Scores are similarities, so a score of 0 doesn't mean identical words
+    return _collect_neighbors(corpus_context, found, collapse_homophones = collapse_homophones,
+                              include_identical = True)
+
+
+def _collect_neighbors(corpus_context, found, collapse_homophones = False, include_identical = False):
+    """Turn positions of words in the context and their distances to a
+    query into a neighborhood density result"""
+    sequence_type = corpus_context.sequence_type
+    words = corpus_context.words
+    matches = []
+    seen = set()
+    for i, distance in found:
+        # two identical words (i.e., an edit distance of 0) are not phono neighbours
+        if distance == 0 and not include_identical:
+            continue
+        w = words[i]
+        if collapse_homophones:
+            w_sequence = str(getattr(w, sequence_type))
+            if w_sequence in seen:
+                continue
+            seen.add(w_sequence)
+        matches.append(w)
+    return (len(matches), matches)
 
 
 def fast_neighborhood_density(corpus_context, query, sequence_type, tier_type,
@@ -256,6 +324,8 @@ def find_mutation_minpairs_all_words(corpus_context, tierdict, tier_type = None,
                                      output_format = 'spelling', collapse_homophones=False,
                                      stop_check = None, call_back = None):
 
+    # Built here so that it is sent to worker processes with the context
+    corpus_context.substitution_index()
     function = partial(find_mutation_minpairs, corpus_context, tier_type=tier_type, collapse_homophones = collapse_homophones)
     if call_back is not None:
         call_back('Calculating neighborhood densities...')
@@ -292,12 +362,14 @@ def find_mutation_minpairs_all_words(corpus_context, tierdict, tier_type = None,
         #     results[str(w)] = res[1]#[str(r) for r in res[1]]
         #     setattr(w.original, corpus_context.attribute.name, res[0])
     else:
-        iterable = ((w,) for w in corpus_context)
-        neighbors = score_mp(iterable, function, num_cores, call_back, stop_check, chunk_size= 1)
-        for n in neighbors:
-            #Have to look up the key, then look up the object due to how
-            #multiprocessing pickles objects
-            setattr(corpus_context.corpus.find(corpus_context.corpus.key(n[0])), corpus_context.attribute.name, n[1][0])
+        words = corpus_context.words
+        iterable = ((i,) for i in range(len(words)))
+        summarize = partial(_summarize_neighbors, function, words, output_format = output_format)
+        neighbors = score_mp(iterable, summarize, num_cores, call_back, stop_check, chunk_size= 1)
+        for i, (count, neighbor_list) in sorted(neighbors, key = lambda x: x[0]):
+            w = words[i]
+            results[f'{w} [{w.transcription}]'] = neighbor_list
+            setattr(w.original, corpus_context.attribute.name, count)
 
     return results
 
@@ -328,30 +400,24 @@ def find_mutation_minpairs(corpus_context, query, tier_type = None, collapse_hom
     if call_back is not None:
         call_back('Finding neighbors...')
         call_back(0,len(corpus_context))
-        cur = 0
-    al = Aligner(features_tf=False, ins_penalty=float('inf'), del_penalty=float('inf'), sub_penalty=1)
-    for w in corpus_context:
-        w_sequence = getattr(w, sequence_type)
-        query_sequence = getattr(query, sequence_type)
-        if stop_check is not None and stop_check():
-            return
-        if call_back is not None:
-            cur += 1
-            if cur % 10 == 0:
-                call_back(cur)
-        if (len(w_sequence) > len(query_sequence)+1 or
-            len(w_sequence) < len(query_sequence)-1):
-            continue
-        m = al.make_similarity_matrix(query_sequence, w_sequence)
-        if m[-1][-1]['f'] != 1:
-            continue
-
-        w_sequence = getattr(w, sequence_type)  # This is identical to the one right after the start of for-loop. why?
-        if collapse_homophones and any(getattr(m, sequence_type) == w_sequence for m in matches):
-            continue
-        else:
-            #matches.append(str(w_sequence))
-            matches.append(w)
+    if stop_check is not None and stop_check():
+        return
+    # Words that differ from the query by one substitution share one of its
+    # masked variants in the context's substitution index
+    index = corpus_context.substitution_index()
+    query_ids = corpus_context.segment_table.encode(getattr(query, sequence_type))
+    words = corpus_context.words
+    seen = set()
+    for i in index.neighbors(query_ids):
+        w = words[i]
+        if collapse_homophones:
+            w_sequence = str(getattr(w, sequence_type))
+            if w_sequence in seen:
+                continue
+            seen.add(w_sequence)
+        matches.append(w)
+    if call_back is not None:
+        call_back(len(corpus_context))
 
     neighbors = set(matches)-set([query])
     return (len(neighbors), neighbors)
@@ -1,4 +1,5 @@
 # -*- coding: utf-8 -*-
+from functools import partial
 
 from corpustools.corpus.classes import Word
 
@@ -6,6 +7,14 @@ from corpustools.exceptions import PhonoProbError
 
 from corpustools.contextmanagers import ensure_context
 
+from corpustools.multiproc import get_backend, index_ranges
+
+def _phonotactic_probability_range(corpus_context, words, probability_type, start, stop):
+    """Calculate the phonotactic probability of a range of words"""
+    return [phonotactic_probability_vitevitch(corpus_context, w,
+                                              probability_type = probability_type)
+            for w in words[start:stop]]
+
 def phonotactic_probability_all_words(corpus_context, algorithm,
                                     probability_type = 'unigram',
                                     num_cores = -1,
@@ -22,30 +31,29 @@ def phonotactic_probability_all_words(corpus_context, algorithm,
         only 'vitevitch')
     probability_type : str
         Either 'unigram' or 'bigram' probability
+    num_cores : int, optional
+        Number of cores to calculate the probabilities with, -1 (default)
+        to calculate them serially
     stop_check : callable, optional
         Optional function to check whether to gracefully terminate early
     call_back : callable, optional
         Optional function to supply progress information during the function
     """
     ensure_context(corpus_context)
+    if algorithm != 'vitevitch':
+        return
+    backend = get_backend(num_cores)
+    words = corpus_context.words
+    ranges = list(index_ranges(len(words), backend.num_procs, max_size = 20))
     if call_back is not None:
         call_back('Calculating phonotactic probabilities...')
-        call_back(0,len(corpus_context))
-        cur = 0
-    num_cores = -1 # Multiprocessing not yet implemented
-    if num_cores == -1:
-        for w in corpus_context:
-            if stop_check is not None and stop_check():
-                break
-            if call_back is not None:
-                cur += 1
-                if cur % 20 == 0:
-                    call_back(cur)
-            if algorithm == 'vitevitch':
-                res = phonotactic_probability_vitevitch(corpus_context, w,
-                                        probability_type = probability_type,
-                                        stop_check = stop_check)
-                setattr(w.original, corpus_context.attribute.name,res)
+        call_back(0,len(ranges))
+    function = partial(_phonotactic_probability_range, corpus_context, words, probability_type)
+    results = backend.map(function, ranges, call_back = call_back, stop_check = stop_check)
+    if results is not None:
+        for (start, stop), probs in zip(ranges, results):
+            for w, res in zip(words[start:stop], probs):
+                setattr(w.original, corpus_context.attribute.name, res)
     if stop_check is not None and stop_check():
         corpus_context.corpus.remove_attribute(corpus_context.attribute)
 
@@ -1,9 +1,38 @@
+from functools import partial
+
 from corpustools.corpus.classes import Word
+from corpustools.multiproc import get_backend, index_ranges
+
+
+def _search_range(words, envs, sequence_type, mode, result_type, start, stop):
+    """Search a range of words for the environments, returning the indices
+    of the words to keep along with the environments that were found"""
+    results = []
+    for index in range(start, stop):
+        tier = getattr(words[index], sequence_type)
+        found = []
+
+        for i, env in enumerate(envs):
+            es = tier.find(env, mode)
+            try:
+                found.extend([[i, e] for e in es])
+            except TypeError:  # when es == None
+                found.append([i, es])
+
+        fo = [f[1] for f in found]
+        if result_type == 'positive':
+            if not all(e is None for e in fo):   # if the word satisfies at least one environment,
+                results.append((index, found))    # add it to 'results'
+        else:
+            if all(e is None for e in fo):
+                results.append((index, found))
+    return results
 
 
 def phonological_search(corpus, envs, sequence_type='transcription', call_back=None, stop_check=None,
                         mode='segMode', result_type='positive', min_word_freq=0.0, max_word_freq=float('inf'),
-                        min_phon_num = 0.0, max_phon_num=float('inf'), min_syl_num=0.0, max_syl_num=float('inf'), seg_summary=False):
+                        min_phon_num = 0.0, max_phon_num=float('inf'), min_syl_num=0.0, max_syl_num=float('inf'), seg_summary=False,
+                        num_cores=-1):
     """
     Perform a search of a corpus for segments, with the option of only
     searching in certain phonological environments. Can filter by minimum word frequency,
@@ -34,7 +63,10 @@ def phonological_search(corpus, envs, sequence_type='transcription', call_back=N
     min_syl_num, max_syl_num : float 
         Minimum / Maximum number of syllables in a word, used for filtering the results. 
         Only applicable if syllable delimiters are provided
-    
+    num_cores : int
+        Number of cores to search the corpus with, -1 (default) to search
+        it serially
+
 
     Returns
     -------
@@ -44,35 +76,18 @@ def phonological_search(corpus, envs, sequence_type='transcription', call_back=N
     """
     if sequence_type == 'spelling':
         return None
+    backend = get_backend(num_cores)
+    words = list(corpus)
+    ranges = list(index_ranges(len(words), backend.num_procs))
     if call_back is not None:
         call_back('Searching...')
-        call_back(0, len(corpus))
-        cur = 0
-    results = []
-    for word in corpus:
-        if stop_check is not None and stop_check():
-            return
-        if call_back is not None:
-            cur += 1
-            if cur % 20 == 0:
-                call_back(cur)
-        tier = getattr(word, sequence_type)
-        found = []
-
-        for i, env in enumerate(envs):
-            es = tier.find(env, mode)
-            try:
-                found.extend([[i, e] for e in es])
-            except TypeError:  # when es == None
-                found.append([i, es])
-
-        fo = [f[1] for f in found]
-        if result_type == 'positive':
-            if not all(e is None for e in fo):   # if the word satisfies at least one environment,
-                results.append((word, found))       # add it to 'results'
-        else:
-            if all(e is None for e in fo):
-                results.append((word, found))
+        call_back(0, len(ranges))
+    function = partial(_search_range, words, envs, sequence_type, mode, result_type)
+    found_ranges = backend.map(function, ranges, call_back=call_back, stop_check=stop_check)
+    if found_ranges is None:
+        return
+    results = [(words[index], found) for found_range in found_ranges for index, found in found_range]
+    found = [[i, None] for i in range(len(envs))]
 
     # additional filters
     final_results = []
@@ -1,36 +1,27 @@
 from collections import defaultdict, OrderedDict
+from functools import partial
 from math import log2
 import os
 
 from corpustools.corpus.classes import EnvironmentFilter
 from corpustools.exceptions import ProdError, PCTError
+from corpustools.multiproc import get_backend, index_ranges
 
-def check_envs(corpus_context, envs, stop_check, call_back):
+def _check_envs_range(words, sequence_type, envs, is_sets, start, stop):
     """
-    Search for the specified segments in the specified environments in
-    the corpus.
-"""
-    env_matches = {env: {seg: 0 for seg in env.middle} for env in envs}
-    is_sets = not all(isinstance(x, str) for x in envs[0].middle)
+    Search for the environments in a range of words, with the counts of
+    each environment's middle segments indexed by the environment's
+    position in `envs`
+    """
+    env_matches = [{seg: 0 for seg in env.middle} for env in envs]
     missing_envs = defaultdict(set)
     overlapping_envs = defaultdict(dict)
 
-    if call_back is not None:
-        call_back('Finding instances of environments...')
-        call_back(0,len(corpus_context))
-        cur = 0
-    for word in corpus_context:
-        if stop_check is not None and stop_check():
-            return
-        if call_back is not None:
-            cur += 1
-            if cur % 100 == 0:
-                call_back(cur)
-
-        tier = getattr(word, corpus_context.sequence_type)
+    for word in words[start:stop]:
+        tier = getattr(word, sequence_type)
         overlaps = defaultdict(list)
         found_env = False
-        for env in envs:
+        for i, env in enumerate(envs):
             a = env.is_applicable(tier.with_word_boundaries())
             if not a:
                 continue
@@ -41,9 +32,9 @@ def check_envs(corpus_context, envs, stop_check, call_back):
                     if is_sets:
                         for x in env.middle:
                             if e.middle in x:
-                                env_matches[env][x] += word.frequency
+                                env_matches[i][x] += word.frequency
                     else:
-                        env_matches[env][e.middle] += word.frequency
+                        env_matches[i][e.middle] += word.frequency
                     overlaps[e].append(env)
 
         has_sounds = False
@@ -70,6 +61,41 @@ def check_envs(corpus_context, envs, stop_check, call_back):
 
     return env_matches, missing_envs, overlapping_envs
 
+def check_envs(corpus_context, envs, stop_check, call_back, num_cores = -1):
+    """
+    Search for the specified segments in the specified environments in
+    the corpus.
+"""
+    env_matches = {env: {seg: 0 for seg in env.middle} for env in envs}
+    is_sets = not all(isinstance(x, str) for x in envs[0].middle)
+    missing_envs = defaultdict(set)
+    overlapping_envs = defaultdict(dict)
+
+    backend = get_backend(num_cores)
+    words = corpus_context.words
+    ranges = list(index_ranges(len(words), backend.num_procs, max_size = 100))
+    if call_back is not None:
+        call_back('Finding instances of environments...')
+        call_back(0,len(ranges))
+    function = partial(_check_envs_range, words, corpus_context.sequence_type, envs, is_sets)
+    results = backend.map(function, ranges, call_back = call_back, stop_check = stop_check)
+    if results is None:
+        return
+
+    for matches, missing, overlapping in results:
+        for env, counts in zip(envs, matches):
+            for seg, count in counts.items():
+                env_matches[env][seg] += count
+        for k, v in missing.items():
+            missing_envs[k].update(v)
+        for k, v in overlapping.items():
+            for k2, found in v.items():
+                if k2 not in overlapping_envs[k]:
+                    overlapping_envs[k][k2] = set()
+                overlapping_envs[k][k2].update(found)
+
+    return env_matches, missing_envs, overlapping_envs
+
 def calc_prod_all_envs(corpus_context, seg1, seg2, all_info = False, stop_check = None,
                 call_back = None):
     """
@@ -127,7 +153,7 @@ def calc_prod_all_envs(corpus_context, seg1, seg2, all_info = False, stop_check
 
 
 def calc_prod(corpus_context, envs, strict = True, all_info = False, ordered_pair = None,
-              stop_check = None, call_back = None):
+              stop_check = None, call_back = None, num_cores = -1):
     """
     Main function for calculating predictability of distribution for
     two segments over specified environments in a corpus.
@@ -150,6 +176,9 @@ def calc_prod(corpus_context, envs, strict = True, all_info = False, ordered_pai
         Optional function to check whether to gracefully terminate early
     call_back : callable, optional
         Optional function to supply progress information during the function
+    num_cores : int, optional
+        Number of cores to search the corpus with, -1 (default) to search
+        it serially
 
     Returns
     -------
@@ -163,7 +192,7 @@ def calc_prod(corpus_context, envs, strict = True, all_info = False, ordered_pai
         if not all(s in seg_list for s in e.middle):#e.middle != seg_list:
             raise(PCTError("Middle segments of all environments must be the same."))
 
-    returned = check_envs(corpus_context, envs, stop_check, call_back)
+    returned = check_envs(corpus_context, envs, stop_check, call_back, num_cores = num_cores)
 
     if stop_check is not None and stop_check():
         return
@@ -0,0 +1,146 @@
+import numpy as np
+
+from corpustools.symbolsim.edit_distance import bit_parallel_edit_distance
+
+
+def deletion_variants(sequence, max_deletions):
+    """
+    Get every sequence that can be made by deleting up to
+    `max_deletions` elements from a sequence
+
+    Parameters
+    ----------
+    sequence : tuple
+        Sequence to delete elements from
+    max_deletions : int
+        Maximum number of elements to delete
+
+    Returns
+    -------
+    set of tuples
+        Deletion variants, including the sequence itself
+    """
+    variants = {sequence}
+    current = variants
+    for _ in range(max_deletions):
+        current = {v[:i] + v[i + 1:] for v in current for i in range(len(v))}
+        if not current:
+            break
+        variants |= current
+    return variants
+
+
+class DeletionIndex(object):
+    """
+    Index of the deletion variants of a list of sequences, for finding
+    every sequence within an edit distance of a query without comparing
+    the query to all of them (the symmetric delete algorithm used by
+    SymSpell)
+
+    Two sequences are within edit distance k of each other only if
+    deleting at most k elements from each can make them equal, so the
+    candidates for a query are the sequences that share a deletion variant
+    with it.  Candidates are then verified with a bounded edit distance.
+
+    Variants are stored by hash in a sorted array, so the index takes about
+    12 bytes per variant and can be pickled along with a corpus context.
+
+    Parameters
+    ----------
+    sequences : list of sequences
+        Sequences to index, usually the segment IDs of each word's
+        transcription
+    max_distance : int
+        Largest edit distance the index can be queried for
+
+    Attributes
+    ----------
+    sequences : list of tuples
+        Distinct indexed sequences
+    members : list of lists
+        Positions in `sequences` (the parameter) of each distinct sequence
+    """
+    def __init__(self, sequences, max_distance=1):
+        self.max_distance = int(max_distance)
+        distinct = {}
+        self.sequences = []
+        self.members = []
+        for i, seq in enumerate(sequences):
+            seq = tuple(seq)
+            try:
+                self.members[distinct[seq]].append(i)
+            except KeyError:
+                distinct[seq] = len(self.sequences)
+                self.sequences.append(seq)
+                self.members.append([i])
+
+        keys = []
+        values = []
+        for n, seq in enumerate(self.sequences):
+            variants = deletion_variants(seq, self.max_distance)
+            keys.extend(hash(v) for v in variants)
+            values.extend([n] * len(variants))
+        keys = np.array(keys, dtype=np.int64)
+        values = np.array(values, dtype=np.int32)
+        order = np.argsort(keys, kind='stable')
+        self._keys = keys[order]
+        self._values = values[order]
+
+    def __len__(self):
+        return sum(len(m) for m in self.members)
+
+    def candidates(self, query, max_distance=None):
+        """
+        Get the distinct sequences that share a deletion variant with a
+        query, a superset of those within `max_distance` of it
+
+        Returns
+        -------
+        numpy.ndarray
+            Indices into the ``sequences`` attribute, in increasing order
+        """
+        if max_distance is None:
+            max_distance = self.max_distance
+        hashes = np.array([hash(v) for v in deletion_variants(tuple(query), max_distance)],
+                          dtype=np.int64)
+        starts = np.searchsorted(self._keys, hashes, side='left')
+        ends = np.searchsorted(self._keys, hashes, side='right')
+        found = [self._values[s:e] for s, e in zip(starts, ends) if e > s]
+        if not found:
+            return np.zeros(0, dtype=np.int32)
+        return np.unique(np.concatenate(found))
+
+    def neighbors(self, query, max_distance=None):
+        """
+        Find the indexed sequences within an edit distance of a query
+
+        Parameters
+        ----------
+        query : sequence
+            Sequence to find the neighbors of, encoded the same way as the
+            indexed sequences
+        max_distance : int, optional
+            Edit distance to search within, at most the index's
+            `max_distance` (the default)
+
+        Returns
+        -------
+        list of tuples
+            Position of each indexed sequence within the distance (in the
+            order they were given to the index) and its edit distance to
+            the query
+        """
+        if max_distance is None:
+            max_distance = self.max_distance
+        max_distance = int(max_distance)
+        if max_distance > self.max_distance:
+            raise ValueError('The index only covers edit distances up to {}.'.format(self.max_distance))
+        query = tuple(query)
+        found = []
+        for n in self.candidates(query, max_distance):
+            distance = bit_parallel_edit_distance(query, self.sequences[n], max_distance)
+            if distance is None:
+                continue
+            found.extend((i, distance) for i in self.members[n])
+        found.sort()
+        return found
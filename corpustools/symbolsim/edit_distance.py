@@ -1,3 +1,7 @@
+import math
+
+import numpy as np
+
 from corpustools.corpus.classes import Word
 #from corpustools.symbolsim.phono_align import Aligner
 
@@ -59,8 +63,7 @@ from corpustools.corpus.classes import Word
 
 def edit_distance(word1, word2, sequence_type, max_distance = None):
     """Returns the Levenshtein edit distance between a string from
-    two words word1 and word2, code drawn from
-    http://en.wikibooks.org/wiki/Algorithm_Implementation/Strings/Levenshtein_distance#Python.
+    two words word1 and word2.
     The number is the number of operations needed to transform word1 into word2,
     three operations are possible: insert, delete, substitute
 
@@ -73,27 +76,278 @@ def edit_distance(word1, word2, sequence_type, max_distance = None):
     string_type : string
         String specifying what attribute of the Word objects to compare,
         can be "spelling", "transcription" or a tier
+    max_distance : int or None
+        Largest edit distance of interest; when given, the calculation
+        stops as soon as the distance is certain to be greater
+
+    Returns
+    -------
+    int or None:
+        the edit distance between two words, or None if it is greater
+        than max_distance
+    """
+    return bounded_edit_distance(word1, word2, max_distance)
+
+
+def _encoded(s1, s2):
+    """Use the segment IDs of two transcriptions when both were encoded by
+    the same SegmentTable, comparing integers is cheaper than comparing
+    segment symbols"""
+    ids1 = getattr(s1, 'ids', None)
+    ids2 = getattr(s2, 'ids', None)
+    if ids1 is None or ids2 is None:
+        return s1, s2, False
+    table = getattr(s1, '_table', None)
+    if table is None or table is not getattr(s2, '_table', None):
+        return s1, s2, False
+    return ids1, ids2, True
+
+
+def bounded_edit_distance(s1, s2, max_distance = None, bit_parallel = None):
+    """Levenshtein edit distance between two sequences that gives up as soon
+    as the distance is certain to be greater than max_distance
+
+    Parameters
+    ----------
+    s1 : sequence
+        First sequence (string, Transcription, tuple of segment IDs, ...)
+    s2 : sequence
+        Second sequence
+    max_distance : int or None
+        Largest distance of interest, None to always get the distance
+    bit_parallel : bool or None
+        Whether to use the bit-parallel algorithm rather than the banded
+        dynamic programming one; by default it is used for integer-encoded
+        transcriptions and whenever there is no max_distance
 
     Returns
     -------
-    int:
-        the edit distance between two words
+    int or None
+        The edit distance, or None if it is greater than max_distance
     """
-    s1 = word1
-    s2 = word2
-
-    longer, shorter = (s1,s2) if len(s1) > len(s2) else (s2,s1)
-
-    previous_row = range(len(shorter) + 1)
-    for i, c1 in enumerate(longer):
-        current_row = [i + 1]
-        for j, c2 in enumerate(shorter):
-            insertions = previous_row[j + 1] + 1 # j+1 instead of j since previous_row and current_row are one character longer
-            deletions = current_row[j] + 1       # than s2
-            substitutions = previous_row[j] + (c1 != c2)
-            current_row.append(min(insertions, deletions, substitutions))
+    s1, s2, encoded = _encoded(s1, s2)
+    if max_distance is not None:
+        max_distance = math.floor(max_distance)
+        if max_distance < 0 or abs(len(s1) - len(s2)) > max_distance:
+            return None
+    if bit_parallel is None:
+        bit_parallel = encoded or max_distance is None
+    if bit_parallel:
+        return bit_parallel_edit_distance(s1, s2, max_distance)
+    return banded_edit_distance(s1, s2, max_distance)
+
+
+def banded_edit_distance(s1, s2, max_distance):
+    """Levenshtein edit distance limited to a diagonal band (Ukkonen, 1985)
+
+    Only the cells within max_distance of the main diagonal of the dynamic
+    programming table can lie on a path costing at most max_distance, so the
+    rest are never computed, and the calculation stops as soon as a whole
+    row exceeds max_distance.
+
+    Parameters
+    ----------
+    s1 : sequence
+        First sequence
+    s2 : sequence
+        Second sequence
+    max_distance : int
+        Largest distance of interest
+
+    Returns
+    -------
+    int or None
+        The edit distance, or None if it is greater than max_distance
+    """
+    n = len(s1)
+    m = len(s2)
+    if abs(n - m) > max_distance:
+        return None
+    cap = max_distance + 1
+    previous_row = [j if j < cap else cap for j in range(m + 1)]
+    for i in range(1, n + 1):
+        c1 = s1[i - 1]
+        low = i - max_distance if i > max_distance else 1
+        high = i + max_distance if i + max_distance < m else m
+        current_row = [cap] * (m + 1)
+        if i < cap:
+            current_row[0] = i
+        left = row_min = current_row[0]
+        for j in range(low, high + 1):
+            value = previous_row[j - 1] + (c1 != s2[j - 1])
+            if previous_row[j] + 1 < value:
+                value = previous_row[j] + 1
+            if left + 1 < value:
+                value = left + 1
+            if value > cap:
+                value = cap
+            current_row[j] = left = value
+            if value < row_min:
+                row_min = value
+        if row_min > max_distance:
+            return None
         previous_row = current_row
-        #if max_distance is not None and previous_row[-1] > max_distance:
-        #    break
-    return previous_row[-1]
+    if previous_row[m] > max_distance:
+        return None
+    return previous_row[m]
+
+
+def bit_parallel_edit_distance(s1, s2, max_distance = None):
+    """Levenshtein edit distance computed a column at a time with bit
+    vectors (Myers, 1999; Hyyrö, 2001)
+
+    Each column of the dynamic programming table is represented by the
+    positive and negative vertical differences between its cells, packed
+    into integers, so a whole column is computed in a few integer
+    operations.  Elements of the sequences only need to be hashable, but
+    this is fastest with integer-encoded segments.
+
+    Parameters
+    ----------
+    s1 : sequence
+        First sequence
+    s2 : sequence
+        Second sequence
+    max_distance : int or None
+        Largest distance of interest, None to always get the distance
+
+    Returns
+    -------
+    int or None
+        The edit distance, or None if it is greater than max_distance
+    """
+    n = len(s1)
+    m = len(s2)
+    if max_distance is not None and abs(n - m) > max_distance:
+        return None
+    if m == 0:
+        return n
+    match_masks = {}
+    for i, c in enumerate(s2):
+        match_masks[c] = match_masks.get(c, 0) | (1 << i)
+    mask = (1 << m) - 1
+    last = 1 << (m - 1)
+    positive = mask
+    negative = 0
+    score = m
+    remaining = n
+    for c in s1:
+        eq = match_masks.get(c, 0)
+        xv = eq | negative
+        xh = (((eq & positive) + positive) ^ positive) | eq
+        horizontal_positive = negative | (~(xh | positive) & mask)
+        horizontal_negative = positive & xh
+        if horizontal_positive & last:
+            score += 1
+        elif horizontal_negative & last:
+            score -= 1
+        horizontal_positive = ((horizontal_positive << 1) | 1) & mask
+        horizontal_negative = (horizontal_negative << 1) & mask
+        positive = horizontal_negative | (~(xv | horizontal_positive) & mask)
+        negative = horizontal_positive & xv
+        remaining -= 1
+        # The distance can fall by at most one for each remaining element
+        if max_distance is not None and score - remaining > max_distance:
+            return None
+    if max_distance is not None and score > max_distance:
+        return None
+    return score
+
+
+def pack_sequences(sequences):
+    """Concatenate integer-encoded sequences into the layout used for tiers
+    by CorpusFrame, for use with batch_edit_distance
+
+    Parameters
+    ----------
+    sequences : list of sequences
+        Sequences of segment IDs
+
+    Returns
+    -------
+    numpy.ndarray
+        All the segment IDs, concatenated
+    numpy.ndarray
+        Offsets of each sequence in the first array
+    """
+    offsets = np.zeros(len(sequences) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(s) for s in sequences])
+    flat = np.zeros(offsets[-1], dtype=np.int64)
+    for i, s in enumerate(sequences):
+        flat[offsets[i]:offsets[i + 1]] = s
+    return flat, offsets
+
+
+def batch_edit_distance(query, flat, offsets, max_distance = None):
+    """Levenshtein edit distances between a query and many sequences at once
+
+    The sequences are grouped by length and each group is stacked into a
+    two dimensional array, so that the dynamic programming table advances a
+    row (one element of the query) at a time for the whole group with NumPy
+    operations.
+
+    Parameters
+    ----------
+    query : sequence of int
+        Segment IDs of the query
+    flat : numpy.ndarray
+        Segment IDs of all the sequences, concatenated, such as the first
+        array returned by CorpusFrame.tier
+    offsets : numpy.ndarray
+        Offsets of each sequence in `flat`; sequence ``i`` is
+        ``flat[offsets[i]:offsets[i+1]]``
+    max_distance : int or None
+        Largest distance of interest, groups of sequences are abandoned once
+        all of them are further than this from the query
+
+    Returns
+    -------
+    numpy.ndarray
+        Edit distance of each sequence to the query, in the same order as
+        the sequences; distances greater than `max_distance` are given as
+        ``max_distance + 1``
+    """
+    query = np.asarray(query, dtype=np.int64)
+    flat = np.asarray(flat)
+    offsets = np.asarray(offsets)
+    lengths = np.diff(offsets)
+    n = len(query)
+    if max_distance is not None:
+        max_distance = max(math.floor(max_distance), -1)
+    distances = np.empty(len(lengths), dtype=np.int32)
+    for length in np.unique(lengths):
+        members = np.flatnonzero(lengths == length)
+        if max_distance is not None and abs(int(length) - n) > max_distance:
+            distances[members] = max_distance + 1
+            continue
+        block = flat[offsets[members][:, None] + np.arange(length)]
+        distances[members] = _block_edit_distance(query, block, max_distance)
+    return distances
+
 
+def _block_edit_distance(query, block, max_distance):
+    """Edit distances between a query and each row of a block of equal
+    length sequences"""
+    count, length = block.shape
+    # Rows of the table are stored with one column per sequence, so that
+    # the running minimum below runs across contiguous memory
+    block = np.ascontiguousarray(block.T)
+    columns = np.arange(length + 1, dtype=np.int32)[:, None]
+    previous_row = np.repeat(columns, count, axis=1)
+    current_row = np.empty_like(previous_row)
+    for i, c in enumerate(query, 1):
+        current_row[0] = i
+        np.minimum(previous_row[:-1] + (block != c),
+                   previous_row[1:] + 1, out=current_row[1:])
+        # Insertions chain along the row: cell j is the minimum over k <= j
+        # of cell k plus j - k, which is a running minimum of cell - column
+        current_row -= columns
+        np.minimum.accumulate(current_row, axis=0, out=current_row)
+        current_row += columns
+        if max_distance is not None and current_row.min() > max_distance:
+            return max_distance + 1
+        previous_row, current_row = current_row, previous_row
+    distances = previous_row[-1]
+    if max_distance is not None:
+        distances = np.minimum(distances, max_distance + 1)
+    return distances
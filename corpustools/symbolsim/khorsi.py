@@ -2,6 +2,68 @@
 from collections import defaultdict
 from math import log
 
+import numpy as np
+
+def common_substring(x1, x2):
+    """Find the longest common substring of two sequences with dynamic
+    programming, keeping two rows of match lengths
+
+    Of the longest common substrings, the one that starts first in the
+    shorter sequence (x2 if they are the same length) is found, at its
+    first occurrence in the longer sequence.
+
+    Parameters
+    ----------
+    x1: sequence
+        First sequence of segments (or segment IDs)
+
+    x2: sequence
+        Second sequence of segments (or segment IDs)
+
+    Returns
+    -------
+    int
+        Start of the common substring in x1
+
+    int
+        Start of the common substring in x2
+
+    int
+        Length of the common substring, 0 if there is none
+    """
+    x1 = list(x1)
+    x2 = list(x2)
+    swapped = len(x1) < len(x2)
+    if swapped:
+        longer, shorter = x2, x1
+    else:
+        longer, shorter = x1, x2
+    best = 0
+    best_end = 0
+    previous_row = [0] * (len(longer) + 1)
+    for i, s in enumerate(shorter):
+        current_row = [0]
+        for j, l in enumerate(longer):
+            if s == l:
+                length = previous_row[j] + 1
+                current_row.append(length)
+                if length > best:
+                    best = length
+                    best_end = i + 1
+            else:
+                current_row.append(0)
+        previous_row = current_row
+    short_begin = best_end - best
+    substring = shorter[short_begin:best_end]
+    long_begin = 0
+    for j in range(len(longer) - best + 1):
+        if longer[j:j + best] == substring:
+            long_begin = j
+            break
+    if swapped:
+        return short_begin, long_begin, best
+    return long_begin, short_begin, best
+
 def lcs(x1, x2):
     """Returns the longest common sequence of two lists of characters
     and the remainder elements not in the longest common sequence
@@ -23,51 +85,28 @@ def lcs(x1, x2):
         the list of remaining elements of both x1 and x2 that are not in
         the longest common sequence
     """
+    x1 = list(x1)
+    x2 = list(x2)
     if len(x1) >= len(x2):
         longer = x1
         shorter = x2
     else:
         longer = x2
         shorter = x1
-    stringMatches = []
-    largestMatch = None
-    for i in range(len(shorter),0,-1):
-        #Get all possible substrings of word x1
-        shorter_strings = substring_set(shorter, i)
-        longer_strings = substring_set(longer, i)
-
-        s = shorter_strings & longer_strings
-
-        if len(s):
-            break
-    else:
+    begin1, begin2, length = common_substring(x1, x2)
+    if not length:
         return [], longer+shorter
-
+    if longer is x1:
+        long_begin, short_begin = begin1, begin2
+    else:
+        long_begin, short_begin = begin2, begin1
+    longest = shorter[short_begin:short_begin + length]
     leftover = []
-    for i in range(len(shorter)):
-
-        begin = i
-        for lcs in s:
-            lcs = lcs.split('.') #back to list
-            end = i+len(lcs)
-            if shorter[begin:end] == lcs:
-                break
-        else:
-            lcs = None
-        if lcs is not None:
-            break
-    if lcs is None:
-        lcs = []
-    leftover.extend(shorter[:begin])
-    leftover.extend(shorter[end:])
-    for i in range(len(longer)):
-        begin = i
-        end = i+len(lcs)
-        if longer[begin:end] == lcs:
-            break
-    leftover.extend(longer[:begin])
-    leftover.extend(longer[end:])
-    return lcs,leftover
+    leftover.extend(shorter[:short_begin])
+    leftover.extend(shorter[short_begin + length:])
+    leftover.extend(longer[:long_begin])
+    leftover.extend(longer[long_begin + length:])
+    return longest, leftover
 
 def substring_set(w, l):
     """Returns all substrings of a word w of length l
@@ -139,3 +178,158 @@ def khorsi(word1, word2, freq_base, sequence_type, max_distance = None):
             break
     return khorsi_sum
 
+
+def surprisal_sums(flat, offsets, surprisals):
+    """Sum the surprisals of the segments of many sequences
+
+    Parameters
+    ----------
+    flat: numpy.ndarray
+        Segment IDs of the sequences, concatenated
+
+    offsets: numpy.ndarray
+        Offsets of each sequence in `flat`, as from CorpusFrame.tier
+
+    surprisals: numpy.ndarray
+        Surprisal of each segment, indexed by segment ID
+
+    Returns
+    -------
+    numpy.ndarray
+        Cumulative surprisal of the segments in `flat`, starting with 0, so
+        that the surprisal of ``flat[i:j]`` is ``cumulative[j] - cumulative[i]``
+
+    numpy.ndarray
+        Total surprisal of each sequence
+    """
+    cumulative = np.concatenate(([0.], np.cumsum(surprisals[flat])))
+    return cumulative, cumulative[offsets[1:]] - cumulative[offsets[:-1]]
+
+def khorsi_upper_bound(query_total, totals):
+    """Upper bound on the Khorsi similarity of a query to sequences, from
+    their total surprisals alone: the common substring can't be more
+    surprising than either sequence
+
+    Parameters
+    ----------
+    query_total: float
+        Total surprisal of the query
+
+    totals: numpy.ndarray
+        Total surprisal of each sequence
+
+    Returns
+    -------
+    numpy.ndarray
+        Largest possible Khorsi similarity of the query to each sequence
+    """
+    return 3 * np.minimum(query_total, totals) - query_total - totals
+
+def sequence_khorsi(x1, x2, surprisals):
+    """Calculate the Khorsi (2012) similarity of two sequences of segment
+    IDs, adding up the surprisals in the same order as khorsi, so that
+    the scores are the same to the last bit
+
+    Parameters
+    ----------
+    x1: list of int
+        Segment IDs of the first sequence
+
+    x2: list of int
+        Segment IDs of the second sequence
+
+    surprisals: list of float
+        Surprisal of each segment, indexed by segment ID
+
+    Returns
+    -------
+    float
+        Khorsi similarity of the two sequences
+    """
+    begin1, begin2, length = common_substring(x1, x2)
+    if len(x1) >= len(x2):
+        longer, long_begin, shorter, short_begin = x1, begin1, x2, begin2
+    else:
+        longer, long_begin, shorter, short_begin = x2, begin2, x1, begin1
+    score = 0
+    if not length:
+        for x in longer + shorter:
+            score -= surprisals[x]
+        return score
+    for x in shorter[short_begin:short_begin + length]:
+        score += surprisals[x]
+    for x in shorter[:short_begin]:
+        score -= surprisals[x]
+    for x in shorter[short_begin + length:]:
+        score -= surprisals[x]
+    for x in longer[:long_begin]:
+        score -= surprisals[x]
+    for x in longer[long_begin + length:]:
+        score -= surprisals[x]
+    return score
+
+def batch_khorsi(query_ids, flat, offsets, surprisals, query_first=True, min_score=None):
+    """Calculate the Khorsi (2012) similarity of one sequence to many
+    sequences at once
+
+    A pair's score is the surprisal of their longest common substring less
+    that of the leftover segments, added up as in khorsi (see
+    sequence_khorsi).  With min_score, the sequences' total surprisals are
+    summed for all of them at once to rule out the ones that can't reach
+    it; as those sums are rounded differently, sequences within 1e-9 of
+    min_score are scored anyway.
+
+    Parameters
+    ----------
+    query_ids: sequence of int
+        Segment IDs of the sequence to compare to the others
+
+    flat: numpy.ndarray
+        Segment IDs of the other sequences, concatenated
+
+    offsets: numpy.ndarray
+        Offsets of each sequence in `flat`, as from CorpusFrame.tier
+
+    surprisals: numpy.ndarray
+        Surprisal (log of the total frequency over the segment's frequency)
+        of each segment, indexed by segment ID
+
+    query_first: bool
+        Whether the query is the first word of each pair, which decides
+        which of several equally long common substrings is used
+
+    min_score: float or None
+        Lowest score of interest; sequences whose upper bound (see
+        khorsi_upper_bound) is lower are given that bound instead of their
+        score, without finding their common substring
+
+    Returns
+    -------
+    numpy.ndarray
+        Khorsi similarity of the query to each sequence
+    """
+    query_ids = [int(x) for x in query_ids]
+    query_surprisals = surprisals[np.asarray(query_ids, dtype=np.int64)]
+    if np.isnan(query_surprisals).any():
+        missing = [x for x, v in zip(query_ids, query_surprisals) if np.isnan(v)]
+        raise KeyError(missing[0])
+    scores = np.zeros(len(offsets) - 1)
+    if min_score is not None:
+        _, totals = surprisal_sums(flat, offsets, surprisals)
+        upper_bounds = khorsi_upper_bound(query_surprisals.sum(), totals)
+        pruned = upper_bounds < min_score - 1e-9
+        scores[pruned] = upper_bounds[pruned]
+        candidates = np.flatnonzero(~pruned).tolist()
+    else:
+        candidates = range(len(offsets) - 1)
+
+    surprisals = surprisals.tolist()
+    flat = flat.tolist()
+    offsets = offsets.tolist()
+    for i in candidates:
+        seq = flat[offsets[i]:offsets[i + 1]]
+        if query_first:
+            scores[i] = sequence_khorsi(query_ids, seq, surprisals)
+        else:
+            scores[i] = sequence_khorsi(seq, query_ids, surprisals)
+    return scores
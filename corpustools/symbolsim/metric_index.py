@@ -0,0 +1,176 @@
+import statistics
+
+
+class MetricIndex(object):
+    """
+    Vantage-point tree over a list of sequences, for finding every sequence
+    within a distance of a query without comparing the query to all of them
+
+    Each node holds a vantage sequence and the median distance from it to
+    the sequences below the node; those closer than the median go in the
+    inside subtree and the others in the outside subtree.  By the triangle
+    inequality a query at distance d from the vantage sequence can only have
+    neighbors within r in the inside subtree if d - r <= median, and in the
+    outside subtree if d + r >= median.  Small subtrees are kept as buckets
+    that are scanned directly.
+
+    The pruning is only correct if the distance is a metric; otherwise the
+    index compares the query to every sequence.  In both cases sequences
+    whose lengths differ by more than r / `min_indel_cost` are skipped
+    without computing their distance.
+
+    Parameters
+    ----------
+    sequences : list of sequences
+        Sequences to index
+    distance : callable
+        Function taking two sequences and returning the distance between
+        them
+    min_indel_cost : float, optional
+        Smallest cost of inserting or deleting an element, used to bound
+        the distance between sequences of different lengths
+    metric : bool, optional
+        Whether the distance satisfies the triangle inequality, defaults to
+        True
+
+    Attributes
+    ----------
+    sequences : list of tuples
+        Distinct indexed sequences
+    members : list of lists
+        Positions in `sequences` (the parameter) of each distinct sequence
+    """
+    leaf_size = 8
+
+    def __init__(self, sequences, distance, min_indel_cost=0, metric=True):
+        self.distance = distance
+        self.min_indel_cost = min_indel_cost
+        self.metric = metric
+        distinct = {}
+        self.sequences = []
+        self.members = []
+        for i, seq in enumerate(sequences):
+            seq = tuple(seq)
+            try:
+                self.members[distinct[seq]].append(i)
+            except KeyError:
+                distinct[seq] = len(self.sequences)
+                self.sequences.append(seq)
+                self.members.append([i])
+
+        # Nodes are stored in parallel lists; a node with a vantage of None
+        # is a bucket whose sequences are in _buckets
+        self._vantages = []
+        self._radii = []
+        self._children = []
+        self._buckets = []
+        if metric:
+            self._root = self._build(list(range(len(self.sequences))))
+        else:
+            self._root = self._add_bucket(list(range(len(self.sequences))))
+
+    def __len__(self):
+        return sum(len(m) for m in self.members)
+
+    def _add_bucket(self, items):
+        self._vantages.append(None)
+        self._radii.append(0)
+        self._children.append(None)
+        self._buckets.append(items)
+        return len(self._vantages) - 1
+
+    def _build(self, items):
+        # Built with an explicit stack, as equal distances can make the
+        # tree much deeper than the recursion limit
+        root = None
+        stack = [(items, None, 0)]
+        while stack:
+            items, parent, side = stack.pop()
+            if len(items) <= self.leaf_size:
+                node = self._add_bucket(items)
+            else:
+                vantage = items[0]
+                rest = items[1:]
+                distances = [self.distance(self.sequences[vantage], self.sequences[n]) for n in rest]
+                radius = statistics.median(distances)
+                inside = [n for n, d in zip(rest, distances) if d <= radius]
+                outside = [n for n, d in zip(rest, distances) if d > radius]
+                self._vantages.append(vantage)
+                self._radii.append(radius)
+                self._children.append([None, None])
+                self._buckets.append(None)
+                node = len(self._vantages) - 1
+                stack.append((inside, node, 0))
+                stack.append((outside, node, 1))
+            if parent is None:
+                root = node
+            else:
+                self._children[parent][side] = node
+        return root
+
+    def _within_length(self, query, seq, max_distance):
+        return abs(len(query) - len(seq)) * self.min_indel_cost <= max_distance
+
+    def neighbor_sequences(self, query, max_distance):
+        """
+        Find the distinct sequences within a distance of a query
+
+        Returns
+        -------
+        list of tuples
+            Index into the ``sequences`` attribute of each distinct sequence
+            within the distance, in increasing order, and its distance to
+            the query
+        """
+        query = tuple(query)
+        # Distances are sums of feature costs, so allow for rounding
+        slack = max_distance + 1e-9
+        found = []
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            vantage = self._vantages[node]
+            if vantage is None:
+                for n in self._buckets[node]:
+                    seq = self.sequences[n]
+                    if not self._within_length(query, seq, slack):
+                        continue
+                    d = self.distance(query, seq)
+                    if d <= slack:
+                        found.append((n, d))
+                continue
+            d = self.distance(query, self.sequences[vantage])
+            if d <= slack:
+                found.append((vantage, d))
+            radius = self._radii[node]
+            inside, outside = self._children[node]
+            if d - slack <= radius:
+                stack.append(inside)
+            if d + slack >= radius:
+                stack.append(outside)
+        found.sort()
+        return found
+
+    def neighbors(self, query, max_distance):
+        """
+        Find the indexed sequences within a distance of a query
+
+        Parameters
+        ----------
+        query : sequence
+            Sequence to find the neighbors of
+        max_distance : float
+            Distance to search within
+
+        Returns
+        -------
+        list of tuples
+            Position of each indexed sequence within the distance (in the
+            order they were given to the index) and its distance to the
+            query
+        """
+        found = []
+        for n, d in self.neighbor_sequences(query, max_distance):
+            found.extend((i, d) for i in self.members[n])
+        found.sort()
+        return found
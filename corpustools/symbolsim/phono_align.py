@@ -4,9 +4,52 @@
 ## Based on aligner.js (by Michael Becker and Blake Allen),
 ## which in turn was based on Peter Kleiweg's Levenshtein Demo.
 
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
 from codecs import open
 
+import numpy as np
+
+# Direction bits stored by Aligner.traceback_matrix for each cell
+ABOVELEFT = 1
+ABOVE = 2
+LEFT = 4
+
+# Aligners made by get_aligner, most recently used last; they keep their
+# FeatureMatrix alive, so only a few are kept
+_aligners = OrderedDict()
+_max_cached_aligners = 4
+
+
+def get_aligner(features, **kwargs):
+    """
+    Get an Aligner for a feature system, reusing the one made by an earlier
+    call with the same FeatureMatrix and settings so that its segment cost
+    matrix is only computed once
+
+    Parameters
+    ----------
+    features : FeatureMatrix
+        Feature system to align with
+    kwargs
+        Other arguments to Aligner
+
+    Returns
+    -------
+    Aligner
+        Aligner for the feature system
+    """
+    key = (id(features), tuple(sorted(kwargs.items())))
+    aligner = _aligners.get(key)
+    if aligner is not None and aligner.features is features:
+        _aligners.move_to_end(key)
+        return aligner
+    aligner = Aligner(features=features, **kwargs)
+    _aligners[key] = aligner
+    while len(_aligners) > _max_cached_aligners:
+        _aligners.popitem(last=False)
+    return aligner
+
+
 class Aligner(object):
 
     def __init__(self, features_tf=True, ins_penalty=1, del_penalty=1,
@@ -21,6 +64,10 @@ class Aligner(object):
         self.features = features
         self.underspec_cost = underspec_cost # should be set to 1.0 to disable underspecification
         self.ins_del_basis = ins_del_basis
+        self._cost_matrix = None
+        self._cost_table = None
+        self._segment_ids = None
+        self._matrix_revision = None
 
         if features_tf:
             if self.ins_del_basis == 'empty':
@@ -40,10 +87,99 @@ class Aligner(object):
                 self.ins_del_difference = total / (len(self.features)^2 - len(self.features))
 
     def align(self, seq1=None, seq2=None):
-        similarity_matrix = self.make_similarity_matrix(seq1, seq2)
-        alignment = self.generate_alignment(seq1, seq2, similarity_matrix)
+        distance, directions = self.traceback_matrix(seq1, seq2)
+        alignment = self.generate_alignment(seq1, seq2, directions)
         return alignment
 
+    def distance(self, seq1, seq2):
+        """
+        Get the alignment cost of two sequences, the final cell of
+        make_similarity_matrix, keeping only two rows of the table
+
+        Parameters
+        ----------
+        seq1 : sequence
+            First sequence of segments
+        seq2 : sequence
+            Second sequence of segments
+
+        Returns
+        -------
+        int or float
+            Cost of the best alignment, an int if the segment costs it adds
+            up are (as from compare_segments)
+        """
+        seq1 = list(seq1)
+        seq2 = list(seq2)
+        deletions, insertions, substitutions = self.segment_costs(seq1, seq2)
+
+        previous_row = [0]
+        for insertion in insertions:
+            previous_row.append(previous_row[-1] + insertion)
+        for x, deletion in enumerate(deletions):
+            row = substitutions[x]
+            current_row = [previous_row[0] + deletion]
+            for y, insertion in enumerate(insertions):
+                current_row.append(min(previous_row[y] + row[y],
+                                       current_row[y] + insertion,
+                                       previous_row[y + 1] + deletion))
+            previous_row = current_row
+        return previous_row[-1]
+
+    def traceback_matrix(self, seq1, seq2):
+        """
+        Get the alignment cost of two sequences along with the directions
+        of the best steps into each cell, for generate_alignment
+
+        Parameters
+        ----------
+        seq1 : sequence
+            First sequence of segments
+        seq2 : sequence
+            Second sequence of segments
+
+        Returns
+        -------
+        float
+            Cost of the best alignment
+        numpy.ndarray
+            Array of uint8 with a row for each segment of seq1 and a column
+            for each segment of seq2 (plus an initial row and column), whose
+            bits are ABOVELEFT, ABOVE and LEFT for the steps within the
+            tolerance of the best one
+        """
+        seq1 = list(seq1)
+        seq2 = list(seq2)
+        deletions, insertions, substitutions = self.segment_costs(seq1, seq2)
+        tolerance = self.tolerance
+        width = len(seq2) + 1
+        directions = bytearray(width * (len(seq1) + 1))
+
+        previous_row = [0]
+        for y, insertion in enumerate(insertions, 1):
+            previous_row.append(previous_row[-1] + insertion)
+            directions[y] = ABOVE
+        for x, deletion in enumerate(deletions, 1):
+            row = substitutions[x - 1]
+            current_row = [previous_row[0] + deletion]
+            offset = x * width
+            directions[offset] = LEFT
+            for y, insertion in enumerate(insertions):
+                aboveleft = previous_row[y] + row[y]
+                above = current_row[y] + insertion
+                left = previous_row[y + 1] + deletion
+                flags = 0
+                if aboveleft - above <= tolerance and aboveleft - left <= tolerance:
+                    flags |= ABOVELEFT
+                if above - aboveleft <= tolerance and above - left <= tolerance:
+                    flags |= ABOVE
+                if left - aboveleft <= tolerance and left - above <= tolerance:
+                    flags |= LEFT
+                directions[offset + y + 1] = flags
+                current_row.append(min(aboveleft, above, left))
+            previous_row = current_row
+        directions = np.frombuffer(directions, dtype=np.uint8).reshape(len(seq1) + 1, width)
+        return previous_row[-1], directions
 
 
     def make_similarity_matrix(self, seq1=None, seq2=None):
@@ -56,6 +192,8 @@ class Aligner(object):
         def compare(x, y):
             return x - y <= self.tolerance
 
+        deletions, insertions, substitutions = self.segment_costs(seq1, seq2)
+
         initial_vals = {'aboveleft': 0,
                         'above': 0,
                         'left': 0,
@@ -66,18 +204,19 @@ class Aligner(object):
         d[0][0]['f'] = 0
 
         for x in range(1, len(seq1)+1):
-            d[x][0]['f'] = d[x-1][0]['f'] + self.compare_segments(seq1[x-1], 'empty', self.underspec_cost)
+            d[x][0]['f'] = d[x-1][0]['f'] + deletions[x-1]
             d[x][0]['left'] = 1
 
         for y in range(1, len(seq2)+1):
-            d[0][y]['f'] = d[0][y-1]['f'] + self.compare_segments('empty', seq2[y-1], self.underspec_cost)
+            d[0][y]['f'] = d[0][y-1]['f'] + insertions[y-1]
             d[0][y]['above'] = 1
 
         for x in range(1, len(seq1)+1):
+            row = substitutions[x-1]
             for y in range(1, len(seq2)+1):
-                aboveleft = (d[x - 1][y - 1]['f'] + self.compare_segments(seq1[x-1], seq2[y-1], self.underspec_cost))
-                left = d[x - 1][y]['f'] + self.compare_segments(seq1[x-1], 'empty', self.underspec_cost)
-                above = d[x][y - 1]['f'] + self.compare_segments('empty', seq2[y-1], self.underspec_cost)
+                aboveleft = d[x - 1][y - 1]['f'] + row[y-1]
+                left = d[x - 1][y]['f'] + deletions[x-1]
+                above = d[x][y - 1]['f'] + insertions[y-1]
 
                 if compare(aboveleft,above) and compare(aboveleft,left):
                     d[x][y]['f'] = aboveleft
@@ -95,7 +234,177 @@ class Aligner(object):
 
         return d
 
-
+    def segment_costs(self, seq1, seq2):
+        """
+        Get the costs of deleting each segment of one sequence, inserting
+        each segment of another, and substituting each segment of the first
+        with each of the second
+
+        Returns
+        -------
+        list
+            Deletion cost of each segment in seq1
+        list
+            Insertion cost of each segment in seq2
+        list of lists
+            Substitution cost of each segment in seq1 (rows) with each
+            segment in seq2 (columns)
+        """
+        if not self.features_tf:
+            deletions = [self.del_penalty] * len(seq1)
+            insertions = [self.ins_penalty] * len(seq2)
+            substitutions = [[int(s1 != s2) * self.sub_penalty for s2 in seq2] for s1 in seq1]
+            return deletions, insertions, substitutions
+        if self.ins_del_basis != 'empty':
+            deletions = [self.compare_segments(s, 'empty', self.underspec_cost) for s in seq1]
+            insertions = [self.compare_segments('empty', s, self.underspec_cost) for s in seq2]
+            substitutions = [[self.compare_segments(s1, s2, self.underspec_cost) for s2 in seq2]
+                             for s1 in seq1]
+            return deletions, insertions, substitutions
+        self.cost_matrix
+        costs = self._cost_table
+        ids1 = [self.segment_id(s) for s in seq1]
+        ids2 = [self.segment_id(s) for s in seq2]
+        return (costs[ids1, 0].tolist(), costs[0, ids2].tolist(),
+                costs[np.ix_(ids1, ids2)].tolist())
+
+    def segment_id(self, segment):
+        """
+        Get the row and column of a segment in the cost matrix, the row
+        and column for 'empty' (insertions and deletions) are 0
+        """
+        if type(segment) is not str:
+            segment = segment.symbol
+        if segment == 'empty':
+            return 0
+        if self._segment_ids is None or self._matrix_revision != self._features_revision():
+            self._build_cost_matrix()
+        return self._segment_ids[segment]
+
+    @property
+    def cost_matrix(self):
+        """
+        Substitution, insertion and deletion costs of every pair of segments
+        in the feature system, indexed by segment_id: row 0 holds insertion
+        costs and column 0 deletion costs
+
+        It is computed the first time it is needed and again whenever the
+        feature system has changed since (see FeatureMatrix.revision).
+        """
+        if self._cost_matrix is None or self._matrix_revision != self._features_revision():
+            self._build_cost_matrix()
+        return self._cost_matrix
+
+    @property
+    def min_indel_cost(self):
+        """
+        Smallest cost of inserting or deleting any segment
+        """
+        if not self.features_tf:
+            return min(self.ins_penalty, self.del_penalty)
+        if self.ins_del_basis != 'empty':
+            return 0
+        costs = self.cost_matrix
+        if len(costs) < 2:
+            return 0
+        return min(costs[0, 1:].min(), costs[1:, 0].min())
+
+    def is_metric(self):
+        """
+        Check whether alignment costs are a metric, so that they can be
+        used with MetricIndex
+
+        The alignment cost is a metric when the segment costs are, with
+        'empty' as one more segment: they must be symmetric and obey the
+        triangle inequality.  Underspecification costs below half the cost
+        of a feature difference break the triangle inequality.
+
+        Returns
+        -------
+        bool
+            True if the alignment cost is a metric
+        """
+        if not self.features_tf:
+            return (self.ins_penalty == self.del_penalty and
+                    self.sub_penalty <= self.ins_penalty + self.del_penalty)
+        if self.ins_del_basis != 'empty':
+            return False
+        costs = self.cost_matrix
+        if not np.allclose(costs, costs.T):
+            return False
+        for k in range(len(costs)):
+            if np.any(costs > costs[:, k:k + 1] + costs[k:k + 1, :] + 1e-9):
+                return False
+        return True
+
+    def _build_cost_matrix(self):
+        # Same sums as compare_segments, added up in the same order, but
+        # each segment is compared with all the others at once
+        symbols = sorted(s for s in getattr(self.features, 'matrix', self.features).keys() if s != 'empty')
+        specs = [self.features[s] for s in symbols]
+        values = defaultdict(dict)
+        for i, spec in enumerate(specs):
+            for feature, value in spec.items():
+                values[feature][i] = value
+        codes = {}
+        unspecified = {}
+        for feature, by_segment in values.items():
+            lookup = {}
+            column = np.full(len(symbols), -1, dtype=np.int64)
+            for i, value in by_segment.items():
+                column[i] = lookup.setdefault(value, len(lookup))
+            codes[feature] = (column, lookup)
+            unspecified[feature] = column == lookup.get('0', -2)
+
+        size = len(symbols) + 1
+        costs = np.zeros((size, size))
+        # Whether compare_segments adds up an underspecification cost for
+        # each pair, which makes its cost a float rather than an int
+        underspecified = np.zeros((size, size), dtype=bool)
+        for i, spec in enumerate(specs):
+            row = np.zeros(len(symbols))
+            row_underspecified = np.zeros(len(symbols), dtype=bool)
+            for feature, value in spec.items():
+                column, lookup = codes[feature]
+                if value == '0':
+                    partial = column != lookup[value]
+                else:
+                    partial = (column != lookup[value]) & unspecified[feature]
+                difference = np.where(column == lookup[value], 0,
+                                      np.where(partial, self.underspec_cost, 1))
+                row += difference
+                row_underspecified |= partial
+            costs[i + 1, 1:] = row * self.sub_penalty
+            underspecified[i + 1, 1:] = row_underspecified
+            indel = sum(0 if value == '0' else self.underspec_cost for value in spec.values())
+            costs[0, i + 1] = indel * self.ins_penalty
+            costs[i + 1, 0] = indel * self.del_penalty
+            underspecified[0, i + 1] = underspecified[i + 1, 0] = any(value != '0' for value in spec.values())
+        self._segment_ids = {s: i + 1 for i, s in enumerate(symbols)}
+        self._cost_matrix = costs
+        self._cost_table = self._exact_costs(costs, underspecified)
+        self._matrix_revision = self._features_revision()
+
+    def _exact_costs(self, costs, underspecified):
+        # Costs as compare_segments returns them, ints where it only adds
+        # up and multiplies ints, so that distances have the same type as
+        # when they are computed with it
+        if type(self.underspec_cost) is int:
+            underspecified = np.zeros_like(underspecified)
+        exact = np.zeros_like(underspecified)
+        for penalty, cells in [(self.sub_penalty, (slice(1, None), slice(1, None))),
+                               (self.ins_penalty, (0, slice(1, None))),
+                               (self.del_penalty, (slice(1, None), 0))]:
+            if type(penalty) is int:
+                exact[cells] = ~underspecified[cells]
+        table = costs.astype(object)
+        table[exact] = costs[exact].astype(np.int64).astype(object)
+        return table
+
+    def _features_revision(self):
+        # Plain dictionaries of feature values have no revision, so only
+        # adding or removing segments is noticed for them
+        return getattr(self.features, 'revision', len(self.features))
 
     def compare_segments(self, segment1, segment2, underspec_cost=.25):
 
@@ -147,22 +456,32 @@ class Aligner(object):
 
 
     def generate_alignment(self, seq1, seq2, d):
+        """
+        Follow the best steps back through a table from
+        make_similarity_matrix or traceback_matrix to get the alignment
+        """
         alignments = []
         x = len(seq1)
         y = len(seq2)
         current_alignment = []
+        compact = isinstance(d, np.ndarray)
 
         while x > 0 or y > 0:
-            if d[x][y]['aboveleft']:
+            if compact:
+                flags = d[x, y]
+                aboveleft, above, left = flags & ABOVELEFT, flags & ABOVE, flags & LEFT
+            else:
+                aboveleft, above, left = d[x][y]['aboveleft'], d[x][y]['above'], d[x][y]['left']
+            if aboveleft:
                 current_element = {'elem1': seq1[x-1], 'elem2': seq2[y-1], 'dir': 'aboveleft'}
                 current_alignment = [current_element] + current_alignment
                 x -= 1
                 y -= 1
-            elif d[x][y]['above']:
+            elif above:
                 current_element = {'elem1': None, 'elem2': seq2[y-1], 'dir': 'above'}
                 current_alignment = [current_element] + current_alignment
                 y -= 1
-            elif d[x][y]['left']:
+            elif left:
                 current_element = {'elem1': seq1[x-1], 'elem2': None, 'dir': 'left'}
                 current_alignment = [current_element] + current_alignment
                 x -= 1
@@ -1,6 +1,6 @@
 
 
-from corpustools.symbolsim.phono_align import Aligner
+from corpustools.symbolsim.phono_align import get_aligner
 
 def phono_edit_distance(word1, word2, sequence_type, features):
     """Returns an analogue to Levenshtein edit distance but uses
@@ -32,9 +32,7 @@ def phono_edit_distance(word1, word2, sequence_type, features):
     w1 = word1
     w2 = word2
 
-    a = Aligner(features_tf=True, features=features)
+    a = get_aligner(features)
 
-    m = a.make_similarity_matrix(w1, w2)
-
-    return m[-1][-1]['f']
+    return a.distance(w1, w2)
 
@@ -0,0 +1,186 @@
+import os
+from functools import partial
+
+import numpy as np
+
+from corpustools.symbolsim.edit_distance import batch_edit_distance
+from corpustools.symbolsim.khorsi import batch_khorsi
+from corpustools.symbolsim.phono_align import get_aligner
+
+from corpustools.exceptions import StringSimilarityError
+from corpustools.multiproc import get_backend
+
+
+# Edit distances are stored as unsigned bytes, larger ones are clipped
+max_stored_distance = 255
+
+
+def condensed_index(n, i, j):
+    """
+    Position of the pair (i, j), with i < j, in the condensed upper
+    triangle of an n x n matrix (the layout of scipy.spatial.distance.pdist)
+    """
+    return n * i - i * (i + 1) // 2 + j - i - 1
+
+
+def row_blocks(n, pairs_per_block):
+    """
+    Split the rows of the upper triangle of an n x n matrix into contiguous
+    blocks of about the same number of pairs
+
+    Yields
+    ------
+    tuple
+        Start and stop of each block of rows
+    """
+    start = 0
+    pairs = 0
+    for i in range(n):
+        pairs += n - i - 1
+        if pairs >= pairs_per_block:
+            yield (start, i + 1)
+            start = i + 1
+            pairs = 0
+    if start < n:
+        yield (start, n)
+
+
+def _edit_distance_row(flat, offsets, i):
+    distances = batch_edit_distance(flat[offsets[i]:offsets[i + 1]], flat, offsets[i + 1:])
+    return np.minimum(distances, max_stored_distance)
+
+
+def _khorsi_row(flat, offsets, surprisals, i):
+    return batch_khorsi(flat[offsets[i]:offsets[i + 1]], flat, offsets[i + 1:], surprisals)
+
+
+def _phono_edit_distance_row(aligner, sequences, i):
+    return np.array([aligner.distance(sequences[i], s) for s in sequences[i + 1:]])
+
+
+def _fill_rows(path, n, score_row, start, stop):
+    """Score the pairs of a block of rows and write them to the matrix file"""
+    matrix = np.load(path, mmap_mode='r+')
+    for i in range(start, stop):
+        if i + 1 >= n:
+            continue
+        begin = condensed_index(n, i, i + 1)
+        matrix[begin:begin + n - i - 1] = score_row(i)
+    matrix.flush()
+    del matrix
+
+
+def _read_checkpoint(checkpoint_path, header):
+    try:
+        with open(checkpoint_path, 'r') as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return None
+    if not lines or lines[0] != header:
+        return None
+    done = set()
+    for line in lines[1:]:
+        try:
+            start, stop = line.split()
+            done.add((int(start), int(stop)))
+        except ValueError:
+            # A line cut short when the calculation was interrupted
+            continue
+    return done
+
+
+def similarity_matrix(corpus_context, algorithm, path, num_cores = -1, pairs_per_block = 100000,
+                      stop_check = None, call_back = None):
+    """
+    Compute the string similarity of every pair of words in a corpus
+    context and write it to a memory-mapped ``.npy`` file
+
+    The file holds the condensed upper triangle of the word x word matrix,
+    in the layout of scipy.spatial.distance.pdist, so it can be passed to
+    scipy.cluster.hierarchy.linkage; see condensed_index for the position
+    of a pair.  Edit distances are stored as uint8 (clipped at 255) and
+    other scores as float32.
+
+    Blocks of rows are computed in parallel and each one is recorded in a
+    checkpoint file next to the matrix (``path + '.checkpoint'``) as it is
+    written.  If the calculation is stopped, calling this function again
+    with the same arguments resumes it; the checkpoint is removed once the
+    matrix is complete.
+
+    Parameters
+    ----------
+    corpus_context : CorpusContext
+        Context manager for a corpus
+    algorithm : string
+        'khorsi', 'edit_distance' or 'phono_edit_distance'
+    path : str
+        Path of the ``.npy`` file to write
+    num_cores : int
+        Number of cores to use, -1 (default) to compute the blocks serially
+    pairs_per_block : int
+        Approximate number of pairs in each block of rows
+    stop_check : callable, optional
+        Optional function to check whether to gracefully terminate early
+    call_back : callable, optional
+        Optional function to supply progress information during the function
+
+    Returns
+    -------
+    numpy.memmap or None
+        Read-only condensed matrix, or None if the calculation was stopped
+    """
+    sequence_type = corpus_context.sequence_type
+    n = len(corpus_context)
+    if algorithm == 'edit_distance':
+        flat, offsets = corpus_context.frame.tier(sequence_type)
+        score_row = partial(_edit_distance_row, flat, offsets)
+        dtype = np.uint8
+    elif algorithm == 'khorsi':
+        flat, offsets = corpus_context.frame.tier(sequence_type)
+        surprisals = corpus_context.segment_surprisals(count_boundaries = False)
+        score_row = partial(_khorsi_row, flat, offsets, surprisals)
+        dtype = np.float32
+    elif algorithm == 'phono_edit_distance':
+        aligner = get_aligner(corpus_context.specifier)
+        sequences = [[str(s) for s in getattr(w, sequence_type)] for w in corpus_context]
+        score_row = partial(_phono_edit_distance_row, aligner, sequences)
+        dtype = np.float32
+    else:
+        raise(StringSimilarityError('{} is not a possible string similarity algorithm.'.format(algorithm)))
+
+    size = n * (n - 1) // 2
+    checkpoint_path = path + '.checkpoint'
+    header = '{} {} {} {}'.format(algorithm, sequence_type, n, pairs_per_block)
+    done = None
+    if os.path.exists(path):
+        done = _read_checkpoint(checkpoint_path, header)
+        if done is not None:
+            existing = np.load(path, mmap_mode='r')
+            if existing.shape != (size,) or existing.dtype != dtype:
+                done = None
+            del existing
+    if done is None:
+        matrix = np.lib.format.open_memmap(path, mode='w+', dtype=dtype, shape=(size,))
+        matrix.flush()
+        del matrix
+        with open(checkpoint_path, 'w') as f:
+            f.write(header + '\n')
+        done = set()
+
+    blocks = [b for b in row_blocks(n, pairs_per_block) if b not in done]
+    if call_back is not None:
+        call_back('Calculating similarity matrix...')
+        call_back(0, len(blocks))
+    backend = get_backend(num_cores)
+    function = partial(_fill_rows, path, n, score_row)
+    finished = 0
+    with open(checkpoint_path, 'a') as checkpoint:
+        for (start, stop), _ in backend.imap(function, blocks, call_back = call_back,
+                                             stop_check = stop_check):
+            checkpoint.write('{} {}\n'.format(start, stop))
+            checkpoint.flush()
+            finished += 1
+    if finished < len(blocks):
+        return None
+    os.remove(checkpoint_path)
+    return np.load(path, mmap_mode='r')
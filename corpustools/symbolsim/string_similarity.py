@@ -1,10 +1,18 @@
+import heapq
 from functools import partial
+
+import numpy as np
+
 from corpustools.corpus.classes import Word
-from corpustools.symbolsim.khorsi import khorsi
-from corpustools.symbolsim.edit_distance import edit_distance
+from corpustools.symbolsim.khorsi import (khorsi, batch_khorsi, sequence_khorsi,
+                                         surprisal_sums, khorsi_upper_bound)
+from corpustools.symbolsim.edit_distance import (edit_distance, batch_edit_distance,
+                                                _block_edit_distance)
 from corpustools.symbolsim.phono_edit_distance import phono_edit_distance
+from corpustools.symbolsim.phono_align import get_aligner
 
 from corpustools.exceptions import StringSimilarityError
+from corpustools.multiproc import get_backend, index_ranges
 
 def khorsi_wrapper(w1, w2, freq_base,sequence_type, max_distance):
     score = khorsi(getattr(w1, sequence_type), getattr(w2, sequence_type),
@@ -15,11 +23,8 @@ def khorsi_wrapper(w1, w2, freq_base,sequence_type, max_distance):
         return None
 
 def edit_distance_wrapper(w1, w2, sequence_type, max_distance):
-    score = edit_distance(getattr(w1, sequence_type), getattr(w2, sequence_type), sequence_type)
-    if score <= max_distance:
-        return score
-    else:
-        return None
+    return edit_distance(getattr(w1, sequence_type), getattr(w2, sequence_type),
+                         sequence_type, max_distance)
 
 def phono_edit_distance_wrapper(w1, w2, sequence_type, features, max_distance):
     score = phono_edit_distance(getattr(w1, sequence_type), getattr(w2, sequence_type),
@@ -29,6 +34,295 @@ def phono_edit_distance_wrapper(w1, w2, sequence_type, features, max_distance):
     else:
         return None
 
+def corpus_edit_distances(corpus_context, query, max_distance = None):
+    """Edit distances from a word to every word in a corpus context,
+    computed for all the words at once (see batch_edit_distance)
+
+    Parameters
+    ----------
+    corpus_context : CorpusContext
+        Context manager for a corpus
+    query : Word
+        Word to compare to the corpus
+    max_distance : int or None
+        Largest distance of interest, distances greater than it are given
+        as max_distance + 1
+
+    Returns
+    -------
+    numpy.ndarray
+        Edit distance of each word, in the order of ``corpus_context.words``
+    """
+    sequence_type = corpus_context.sequence_type
+    query_ids = corpus_context.segment_table.encode(getattr(query, sequence_type))
+    flat, offsets = corpus_context.frame.tier(sequence_type)
+    return batch_edit_distance(query_ids, flat, offsets, max_distance)
+
+def corpus_khorsi(corpus_context, query, count_boundaries = True, query_first = True):
+    """Khorsi similarities of a word to every word in a corpus context,
+    computed with the context's segment surprisals (see batch_khorsi)
+
+    Parameters
+    ----------
+    corpus_context : CorpusContext
+        Context manager for a corpus
+    query : Word
+        Word to compare to the corpus
+    count_boundaries : bool
+        Whether word boundaries count towards the total frequency
+    query_first : bool
+        Whether the query is the first word of each pair
+
+    Returns
+    -------
+    numpy.ndarray
+        Khorsi similarity of each word, in the order of ``corpus_context.words``
+    """
+    sequence_type = corpus_context.sequence_type
+    query_ids = corpus_context.segment_table.encode(getattr(query, sequence_type))
+    flat, offsets = corpus_context.frame.tier(sequence_type)
+    # Looked up after encoding, which may add segments to the table
+    surprisals = corpus_context.segment_surprisals(count_boundaries)
+    return batch_khorsi(query_ids, flat, offsets, surprisals, query_first)
+
+def _relate_function(corpus_context, algorithm):
+    """Get the function that scores a pair of sequences with an algorithm"""
+    if algorithm == 'khorsi':
+        freq_base = corpus_context.get_frequency_base()
+        try:
+            bound_count = freq_base['#']
+            freq_base = {k:v for k,v in freq_base.items() if k != '#'}
+            freq_base['total'] -= bound_count
+        except KeyError:
+            pass
+        return partial(khorsi, freq_base=freq_base,
+                       sequence_type = corpus_context.sequence_type)
+    elif algorithm == 'edit_distance':
+        return partial(edit_distance,
+                       sequence_type = corpus_context.sequence_type)
+    elif algorithm == 'phono_edit_distance':
+        return partial(phono_edit_distance,
+                       sequence_type = corpus_context.sequence_type,
+                       features = corpus_context.specifier)
+    else:
+        raise(StringSimilarityError('{} is not a possible string similarity algorithm.'.format(algorithm)))
+
+class _TopK(object):
+    """Bounded heap keeping the k entries with the smallest keys, ties
+    going to the entry that comes first in the corpus"""
+    def __init__(self, k):
+        self.k = k
+        self._heap = []
+
+    @property
+    def bound(self):
+        """Largest key that could still be kept"""
+        if len(self._heap) < self.k:
+            return float('inf')
+        return -self._heap[0][0]
+
+    def push(self, key, index):
+        entry = (-key, -index)
+        if len(self._heap) < self.k:
+            heapq.heappush(self._heap, entry)
+        elif entry > self._heap[0]:
+            heapq.heapreplace(self._heap, entry)
+
+    def items(self):
+        """Kept indices and keys, smallest key first"""
+        return [(-negated_index, -negated_key)
+                for negated_key, negated_index in sorted(self._heap, reverse=True)]
+
+def most_similar_words(corpus_context, query, algorithm, top_k, min_rel = None, max_rel = None):
+    """Find the words of a corpus context most similar to a word, keeping
+    only the best top_k in a bounded heap
+
+    Words are scored in order of a bound on their score, from the length
+    difference for the edit distances and from the segment surprisals for
+    Khorsi, and scoring stops once no remaining word can beat the worst
+    one kept.
+
+    Parameters
+    ----------
+    corpus_context : CorpusContext
+        Context manager for a corpus
+    query : Word
+        Word to compare to the corpus
+    algorithm : string
+        'khorsi', 'edit_distance' or 'phono_edit_distance'
+    top_k : int
+        Number of words to return
+    min_rel : float or None
+        Filters out words with a lower score
+    max_rel : float or None
+        Filters out words with a higher score
+
+    Returns
+    -------
+    list of tuples
+        The query, a word and their relatedness, most similar first (lowest
+        distance, or highest Khorsi score), ties in corpus order
+    """
+    if algorithm == 'edit_distance':
+        best = _top_edit_distances(corpus_context, query, top_k, min_rel, max_rel)
+    elif algorithm == 'phono_edit_distance':
+        best = _top_phono_edit_distances(corpus_context, query, top_k, min_rel, max_rel)
+    elif algorithm == 'khorsi':
+        best = _top_khorsi(corpus_context, query, top_k, min_rel, max_rel)
+    else:
+        raise(StringSimilarityError('{} is not a possible string similarity algorithm.'.format(algorithm)))
+    words = corpus_context.words
+    return [(query, words[i], score) for i, score in best]
+
+def _top_edit_distances(corpus_context, query, top_k, min_rel, max_rel):
+    sequence_type = corpus_context.sequence_type
+    query_ids = np.asarray(corpus_context.segment_table.encode(getattr(query, sequence_type)),
+                           dtype=np.int64)
+    flat, offsets = corpus_context.frame.tier(sequence_type)
+    lengths = np.diff(offsets)
+    top = _TopK(top_k)
+    # Words of each length are scored together, closest lengths first
+    for length in sorted(np.unique(lengths).tolist(), key=lambda l: abs(l - len(query_ids))):
+        limit = top.bound if max_rel is None else min(top.bound, max_rel)
+        if abs(length - len(query_ids)) > limit:
+            break
+        members = np.flatnonzero(lengths == length)
+        block = flat[offsets[members][:, None] + np.arange(length)]
+        distances = np.empty(len(members), dtype=np.int64)
+        distances[:] = _block_edit_distance(query_ids, block, None if limit == float('inf') else limit)
+        for i, distance in zip(members.tolist(), distances.tolist()):
+            if distance > limit or (min_rel is not None and distance < min_rel):
+                continue
+            top.push(distance, i)
+    return top.items()
+
+def _top_phono_edit_distances(corpus_context, query, top_k, min_rel, max_rel):
+    sequence_type = corpus_context.sequence_type
+    aligner = get_aligner(corpus_context.specifier)
+    words = corpus_context.words
+    query_sequence = getattr(query, sequence_type)
+    lower_bounds = np.array([abs(len(getattr(w, sequence_type)) - len(query_sequence))
+                             for w in words]) * aligner.min_indel_cost
+    top = _TopK(top_k)
+    for i in np.argsort(lower_bounds, kind='stable').tolist():
+        limit = top.bound if max_rel is None else min(top.bound, max_rel)
+        if lower_bounds[i] > limit:
+            break
+        distance = aligner.distance(query_sequence, getattr(words[i], sequence_type))
+        if distance > limit or (min_rel is not None and distance < min_rel):
+            continue
+        top.push(distance, i)
+    return top.items()
+
+def _top_khorsi(corpus_context, query, top_k, min_rel, max_rel):
+    sequence_type = corpus_context.sequence_type
+    query_ids = corpus_context.segment_table.encode(getattr(query, sequence_type)).tolist()
+    flat, offsets = corpus_context.frame.tier(sequence_type)
+    surprisals = corpus_context.segment_surprisals(count_boundaries = False)
+    query_total = surprisals[query_ids].sum()
+    if np.isnan(query_total):
+        raise KeyError(str(getattr(query, sequence_type)))
+    _, totals = surprisal_sums(flat, offsets, surprisals)
+    # The bounds are summed in a different order from the scores, so they
+    # are loosened by a rounding margin
+    upper_bounds = khorsi_upper_bound(query_total, totals) + 1e-9
+    surprisals = surprisals.tolist()
+    flat = flat.tolist()
+    offsets = offsets.tolist()
+    # Keys are negated scores, so that the highest scores are kept
+    top = _TopK(top_k)
+    for i in np.argsort(-upper_bounds, kind='stable').tolist():
+        if -upper_bounds[i] > top.bound or (min_rel is not None and upper_bounds[i] < min_rel):
+            break
+        score = sequence_khorsi(query_ids, flat[offsets[i]:offsets[i + 1]], surprisals)
+        if (min_rel is not None and score < min_rel) or (max_rel is not None and score > max_rel):
+            continue
+        top.push(-score, i)
+    return [(i, -key) for i, key in top.items()]
+
+def iter_string_similarity(corpus_context, query, algorithm, min_rel = None, max_rel = None):
+    """Generate the relatedness of a word to each word of a corpus context,
+    one word at a time, without keeping the results
+
+    Words that can't be within the limits, by length difference for the
+    edit distances, are skipped without being scored.
+
+    Parameters
+    ----------
+    corpus_context : CorpusContext
+        Context manager for a corpus
+    query : Word
+        Word to compare to the corpus
+    algorithm : string
+        'khorsi', 'edit_distance' or 'phono_edit_distance'
+    min_rel : float or None
+        Filters out words with a lower score
+    max_rel : float or None
+        Filters out words with a higher score
+
+    Yields
+    ------
+    tuple
+        The query, a word and their relatedness, in corpus order
+    """
+    sequence_type = corpus_context.sequence_type
+    relate_func = _relate_function(corpus_context, algorithm)
+    if algorithm == 'edit_distance' and max_rel is not None:
+        relate_func = partial(relate_func, max_distance = max_rel)
+    min_indel_cost = 0
+    if algorithm == 'phono_edit_distance':
+        min_indel_cost = get_aligner(corpus_context.specifier).min_indel_cost
+    w1 = getattr(query, sequence_type)
+    for w in corpus_context:
+        w2 = getattr(w, sequence_type)
+        if max_rel is not None and abs(len(w1) - len(w2)) * min_indel_cost > max_rel:
+            continue
+        relatedness = relate_func(w1, w2)
+        if relatedness is None:
+            continue
+        if min_rel is not None and relatedness < min_rel:
+            continue
+        if max_rel is not None and relatedness > max_rel:
+            continue
+        yield (query, w, relatedness)
+
+def _relate_to_words(relate_func, sequence_type, target, words, min_rel, max_rel, start, stop):
+    """Score a target word against a range of words, keeping the indices
+    and scores of the words within the relatedness limits"""
+    w1 = getattr(target, sequence_type)
+    related = []
+    for i in range(start, stop):
+        relatedness = relate_func(w1, getattr(words[i], sequence_type))
+        if relatedness is None:
+            continue
+        if min_rel is not None and relatedness < min_rel:
+            continue
+        if max_rel is not None and relatedness > max_rel:
+            continue
+        related.append((i, relatedness))
+    return related
+
+def _relate_pairs(relate_func, sequence_type, pairs, min_rel, max_rel, start, stop):
+    """Score a range of pairs of words, keeping the indices and scores of
+    the pairs within the relatedness limits"""
+    related = []
+    for i in range(start, stop):
+        q1, q2 = pairs[i]
+        try:
+            w1 = getattr(q1, sequence_type)
+            w2 = getattr(q2, sequence_type)
+            relatedness = relate_func(w1, w2)
+            if relatedness is None:
+                continue
+            if min_rel is not None and relatedness < min_rel:
+                continue
+            if max_rel is not None and relatedness > max_rel:
+                continue
+        except:
+            relatedness = "N/A"
+        related.append((i, relatedness))
+    return related
+
 def string_similarity(corpus_context, query, algorithm, **kwargs):
     """
     This function computes similarity of pairs of words across a corpus.
@@ -54,6 +348,12 @@ def string_similarity(corpus_context, query, algorithm, **kwargs):
         Optional function to check whether to gracefully terminate early
     call_back : callable or None
         Optional function to supply progress information during the function
+    num_cores : int
+        Number of cores to score the words with when comparing a word to
+        the corpus or a list of pairs, -1 (default) to score them serially
+    top_k : int or None
+        When comparing a word to the corpus, only return the top_k most
+        similar words (see most_similar_words)
 
     Returns
     -------
@@ -65,54 +365,55 @@ def string_similarity(corpus_context, query, algorithm, **kwargs):
     call_back = kwargs.get('call_back', None)
     min_rel = kwargs.get('min_rel', None)
     max_rel = kwargs.get('max_rel', None)
+    top_k = kwargs.get('top_k', None)
+    backend = get_backend(kwargs.get('num_cores', -1))
 
-    if algorithm == 'khorsi':
-        freq_base = corpus_context.get_frequency_base()
-        try:
-            bound_count = freq_base['#']
-            freq_base = {k:v for k,v in freq_base.items() if k != '#'}
-            freq_base['total'] -= bound_count
-        except KeyError:
-            pass
-        relate_func = partial(khorsi, freq_base=freq_base,
-                                sequence_type = corpus_context.sequence_type)
-    elif algorithm == 'edit_distance':
-        relate_func =  partial(edit_distance,
-                                sequence_type = corpus_context.sequence_type)
-    elif algorithm == 'phono_edit_distance':
-        relate_func = partial(phono_edit_distance,
-                                sequence_type = corpus_context.sequence_type,
-                                features = corpus_context.specifier)
+    if top_k is not None and isinstance(query, Word):
+        return most_similar_words(corpus_context, query, algorithm, top_k,
+                                  min_rel = min_rel, max_rel = max_rel)
+    relate_func = _relate_function(corpus_context, algorithm)
+    if algorithm == 'edit_distance' and max_rel is not None:
+        # Words further apart than max_rel are filtered out, so their
+        # distances only need calculating up to it
+        bounded_func = partial(relate_func, max_distance = max_rel)
     else:
-        raise(StringSimilarityError('{} is not a possible string similarity algorithm.'.format(algorithm)))
+        bounded_func = relate_func
 
     related_data = []
     if isinstance(query, Word):       # 'comparison type' option set to "compare one word to entire corpus"
-        if call_back is not None:
-            total = len(corpus_context)
-            if min_rel is not None or max_rel is not None:
-                total *= 2
-            cur = 0
-            call_back('Calculating string similarity...')
-            call_back(cur,total)
         targ_word = query
-        relate = list()
-        for word in corpus_context:
-            if stop_check is not None and stop_check():
-                return
+        words = corpus_context.words
+        if algorithm in ('edit_distance', 'khorsi'):
+            # Computed for the whole corpus at once, in a single process
             if call_back is not None:
-                cur += 1
-                if cur % 50 == 0:
-                    call_back(cur)
-            w1 = getattr(targ_word, corpus_context.sequence_type)
-            w2 = getattr(word, corpus_context.sequence_type)
-            relatedness = relate_func(w1, w2)
-
-            if min_rel is not None and relatedness < min_rel:
-                continue
-            if max_rel is not None and relatedness > max_rel:
-                continue
-            related_data.append( (targ_word,word,relatedness) )
+                call_back('Calculating string similarity...')
+                call_back(0,1)
+            if algorithm == 'edit_distance':
+                scores = corpus_edit_distances(corpus_context, targ_word, max_rel)
+                convert = int
+            else:
+                scores = corpus_khorsi(corpus_context, targ_word, count_boundaries = False)
+                convert = float
+            if call_back is not None:
+                call_back(1)
+            keep = np.ones(len(words), dtype=bool)
+            if min_rel is not None:
+                keep &= scores >= min_rel
+            if max_rel is not None:
+                keep &= scores <= max_rel
+            related_data.extend((targ_word, words[i], convert(scores[i])) for i in np.flatnonzero(keep))
+        else:
+            ranges = list(index_ranges(len(words), backend.num_procs))
+            if call_back is not None:
+                call_back('Calculating string similarity...')
+                call_back(0,len(ranges))
+            function = partial(_relate_to_words, bounded_func, corpus_context.sequence_type,
+                               targ_word, words, min_rel, max_rel)
+            results = backend.map(function, ranges, call_back=call_back, stop_check=stop_check)
+            if results is None:
+                return
+            for related in results:
+                related_data.extend((targ_word, words[i], relatedness) for i, relatedness in related)
         #Sort the list by most morphologically related
         related_data.sort(key=lambda t:t[-1])
         if related_data[0][1] != targ_word:
@@ -127,31 +428,19 @@ def string_similarity(corpus_context, query, algorithm, **kwargs):
 
         related_data.append((word1,word2,relatedness))
     elif hasattr(query,'__iter__'):
+        query = list(query)
+        ranges = list(index_ranges(len(query), backend.num_procs))
         if call_back is not None:
-            total = len(query)
-            cur = 0
             call_back('Calculating string similarity...')
-            if total:
-                call_back(cur,total)
-        for q1,q2 in query:
-            if stop_check is not None and stop_check():
-                return
-            if call_back is not None:
-                cur += 1
-                if cur % 50 == 0:
-                    call_back(cur)
-            try:
-                w1 = getattr(q1,corpus_context.sequence_type)
-                w2 = getattr(q2,corpus_context.sequence_type)
-                relatedness = relate_func(w1,w2)
-                if min_rel is not None and relatedness < min_rel:
-                    continue
-                if max_rel is not None and relatedness > max_rel:
-                    continue
-            except:
-                relatedness = "N/A"
-
-            related_data.append((q1, q2, relatedness))
+            if ranges:
+                call_back(0,len(ranges))
+        function = partial(_relate_pairs, bounded_func, corpus_context.sequence_type,
+                           query, min_rel, max_rel)
+        results = backend.map(function, ranges, call_back=call_back, stop_check=stop_check)
+        if results is None:
+            return
+        for related in results:
+            related_data.extend((query[i][0], query[i][1], relatedness) for i, relatedness in related)
 
     return related_data
 
@@ -0,0 +1,112 @@
+# Stands in for the masked position of a sequence; segment IDs are never
+# negative, so it can't be confused with a segment
+MASK = -1
+
+
+def masked_variants(sequence):
+    """
+    Get every sequence that can be made by masking one element of a
+    sequence
+
+    Parameters
+    ----------
+    sequence : tuple
+        Sequence to mask elements of
+
+    Returns
+    -------
+    list of tuples
+        One variant for each position of the sequence, in order
+    """
+    return [sequence[:i] + (MASK,) + sequence[i + 1:] for i in range(len(sequence))]
+
+
+class SubstitutionIndex(object):
+    """
+    Index of the masked variants of a list of sequences, for finding every
+    sequence that differs from a query by exactly one substitution without
+    comparing the query to all of them
+
+    Two sequences differ by one substitution only if they have the same
+    length and are equal once the position where they differ is masked,
+    so the neighbors of a query are found with one lookup per position of
+    the query.
+
+    Parameters
+    ----------
+    sequences : list of sequences
+        Sequences to index, usually the segment IDs of each word's
+        transcription
+
+    Attributes
+    ----------
+    sequences : list of tuples
+        Distinct indexed sequences
+    members : list of lists
+        Positions in `sequences` (the parameter) of each distinct sequence
+    """
+    def __init__(self, sequences):
+        distinct = {}
+        self.sequences = []
+        self.members = []
+        for i, seq in enumerate(sequences):
+            seq = tuple(seq)
+            try:
+                self.members[distinct[seq]].append(i)
+            except KeyError:
+                distinct[seq] = len(self.sequences)
+                self.sequences.append(seq)
+                self.members.append([i])
+
+        self._buckets = {}
+        for n, seq in enumerate(self.sequences):
+            for variant in masked_variants(seq):
+                self._buckets.setdefault(variant, []).append(n)
+
+    def __len__(self):
+        return sum(len(m) for m in self.members)
+
+    def neighbor_sequences(self, query):
+        """
+        Get the distinct sequences that differ from a query by exactly one
+        substitution
+
+        Returns
+        -------
+        list of int
+            Indices into the ``sequences`` attribute, in increasing order
+        """
+        query = tuple(query)
+        found = []
+        for variant in masked_variants(query):
+            for n in self._buckets.get(variant, ()):
+                # Every sequence in the bucket matches the query except at
+                # the masked position, where only the query's own segment
+                # has to be ruled out
+                if self.sequences[n] != query:
+                    found.append(n)
+        found.sort()
+        return found
+
+    def neighbors(self, query):
+        """
+        Find the indexed sequences that differ from a query by exactly one
+        substitution
+
+        Parameters
+        ----------
+        query : sequence
+            Sequence to find the neighbors of, encoded the same way as the
+            indexed sequences
+
+        Returns
+        -------
+        list of int
+            Position of each neighboring sequence, in the order they were
+            given to the index
+        """
+        found = []
+        for n in self.neighbor_sequences(query):
+            found.extend(self.members[n])
+        found.sort()
+        return found
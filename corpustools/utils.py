@@ -26,7 +26,7 @@ def generate_discourse(corpus):
                                             transcription = corpus[k].transcription)
         word.frequency += 1
         wordtoken = WordToken(word = word,begin = i)
-        d.lexicon[k].wordtokens.append(wordtoken)
+        d.lexicon[k].add_wordtoken(wordtoken)
         d.add_word(wordtoken)
 
 
@@ -0,0 +1,57 @@
+import pickle
+
+import pytest
+
+from corpustools.corpus.classes import Corpus, Word, WordView, WordToken
+from corpustools.contextmanagers import (CanonicalVariantContext,
+                                        MostFrequentVariantContext,
+                                        SeparatedTokensVariantContext,
+                                        WeightedVariantContext)
+
+
+@pytest.fixture(scope='module')
+def variant_corpus():
+    corpus = Corpus('variants')
+    for spelling, transcription, variants in [('mata', ['m', 'a', 't', 'a'], [['m', 'a', 't'], ['m', 'a', 't'], ['m', 'a', 't', 'a']]),
+                                              ('sasi', ['s', 'a', 's', 'i'], [['s', 'a', 's', 'i']])]:
+        word = Word(spelling=spelling, transcription=transcription, frequency=len(variants))
+        for v in variants:
+            word.add_wordtoken(WordToken(word=word, transcription=v, begin=0, end=1))
+        corpus.add_word(word)
+    corpus.has_wordtokens = True
+    return corpus
+
+
+def test_canonical_views(unspecified_test_corpus):
+    with CanonicalVariantContext(unspecified_test_corpus, 'transcription', 'type') as c:
+        words = list(c)
+        assert all(isinstance(w, WordView) for w in words)
+        assert all(w.frequency == 1 for w in words)
+        assert all(a is b for a, b in zip(words, c))
+        assert len(c) == len(unspecified_test_corpus)
+        w = words[0]
+        assert w.transcription is w.original.transcription
+        assert w == w.original
+        assert w.original.frequency != 1
+        with pytest.raises(AttributeError):
+            w.frequency = 2
+        restored = pickle.loads(pickle.dumps(w))
+        assert restored == w
+        assert restored.frequency == 1
+
+
+def test_variant_views(variant_corpus):
+    with MostFrequentVariantContext(variant_corpus, 'transcription', 'token') as c:
+        w = c.corpus.find('mata')
+        view = [x for x in c if x.original is w][0]
+        assert str(view.transcription) == 'm.a.t'
+        assert view.frequency == 3
+        assert str(w.transcription) == 'm.a.t.a'
+
+    with SeparatedTokensVariantContext(variant_corpus, 'transcription', 'token') as c:
+        views = sorted((str(x.transcription), x.frequency) for x in c)
+        assert views == [('m.a.t', 2), ('m.a.t.a', 1), ('s.a.s.i', 1)]
+
+    with WeightedVariantContext(variant_corpus, 'transcription', 'type') as c:
+        views = sorted((str(x.transcription), x.frequency) for x in c)
+        assert views == [('m.a.t', 0.5), ('m.a.t.a', 0.5), ('s.a.s.i', 1)]
@@ -0,0 +1,36 @@
+
+from corpustools.contextmanagers import CanonicalVariantContext
+
+
+def test_corpus_frame(unspecified_test_corpus):
+    frame = unspecified_test_corpus.frame
+    assert(len(frame) == len(unspecified_test_corpus))
+    for i, key in enumerate(frame.keys):
+        word = unspecified_test_corpus[key]
+        assert(frame.index(key) == i)
+        assert(frame.frequency[i] == word.frequency)
+        ids = frame.sequence(i, 'transcription')
+        assert(unspecified_test_corpus.segment_table.decode(ids) == word.transcription.list)
+        assert(frame.lengths('transcription')[i] == len(word.transcription))
+    codes, categories = frame.factor('spelling')
+    assert([categories[c] for c in codes] == [unspecified_test_corpus[k].spelling for k in frame.keys])
+
+
+def test_corpus_frame_sync(unspecified_test_corpus):
+    frame = unspecified_test_corpus.frame
+    assert(unspecified_test_corpus.frame is frame)
+    word = unspecified_test_corpus.find('ta')
+    unspecified_test_corpus.remove_word('ta')
+    assert(unspecified_test_corpus.frame is not frame)
+    assert(len(unspecified_test_corpus.frame) == len(frame) - 1)
+    unspecified_test_corpus.add_word(word)
+    assert(len(unspecified_test_corpus.frame) == len(frame))
+
+
+def test_context_frame(unspecified_test_corpus):
+    with CanonicalVariantContext(unspecified_test_corpus, 'transcription', 'type') as c:
+        frame = c.frame
+        assert(len(frame) == len(c))
+        assert(all(frame.frequency == 1))
+        flat, offsets = frame.tier('transcription')
+        assert(offsets[-1] == len(flat))
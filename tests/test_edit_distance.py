@@ -3,7 +3,13 @@
 import sys
 import os
 
-from corpustools.symbolsim.string_similarity import string_similarity
+import numpy as np
+
+from corpustools.symbolsim.string_similarity import string_similarity, iter_string_similarity
+from corpustools.symbolsim.similarity_matrix import similarity_matrix, condensed_index
+from corpustools.symbolsim.edit_distance import (edit_distance, banded_edit_distance,
+                                                 bit_parallel_edit_distance,
+                                                 batch_edit_distance, pack_sequences)
 from corpustools.contextmanagers import CanonicalVariantContext, MostFrequentVariantContext, WeightedVariantContext
 
 def test_spelling(unspecified_test_corpus):
@@ -95,3 +101,66 @@ def test_transcription(unspecified_test_corpus):
     calced.sort(key=lambda t:t[1])
     for i, v in enumerate(expected):
         assert(calced[i] == v)
+
+
+def test_bounded_kernels():
+    words = ['', 'a', 'ta', 'sasi', 'shashi', 'tatomi', 'mashomisi', 'tishenishu', 'atema', 'enuta']
+    for w1 in words:
+        for w2 in words:
+            distance = bit_parallel_edit_distance(w1, w2)
+            for max_distance in range(6):
+                expected = distance if distance <= max_distance else None
+                assert(banded_edit_distance(w1, w2, max_distance) == expected)
+                assert(bit_parallel_edit_distance(w1, w2, max_distance) == expected)
+
+
+def test_batch_edit_distance():
+    sequences = [(), (1,), (1, 2), (2, 1), (1, 2, 3), (3, 2, 1), (1, 1, 2, 2), (4, 5, 6, 7, 8)]
+    flat, offsets = pack_sequences(sequences)
+    for query in sequences:
+        expected = [bit_parallel_edit_distance(query, s) for s in sequences]
+        assert(list(batch_edit_distance(query, flat, offsets)) == expected)
+        assert(list(batch_edit_distance(query, flat, offsets, 1)) == [min(d, 2) for d in expected])
+
+
+def test_max_rel(unspecified_test_corpus):
+    with CanonicalVariantContext(unspecified_test_corpus, 'transcription', 'type') as c:
+        full = string_similarity(c, unspecified_test_corpus.find('sasi'), 'edit_distance')
+        bounded = string_similarity(c, unspecified_test_corpus.find('sasi'), 'edit_distance', max_rel = 3)
+    assert(sorted(bounded, key=lambda t:t[1]) == sorted([t for t in full if t[2] <= 3], key=lambda t:t[1]))
+
+
+def test_top_k(unspecified_test_corpus):
+    with CanonicalVariantContext(unspecified_test_corpus, 'transcription', 'type') as c:
+        for query in c:
+            full = string_similarity(c, query, 'edit_distance')
+            distances = {id(w2): d for _, w2, d in full}
+            ranked = sorted(range(len(c.words)), key=lambda i: (distances[id(c.words[i])], i))
+            for top_k in [1, 3, 20]:
+                calced = string_similarity(c, query, 'edit_distance', top_k = top_k)
+                assert([w2 for _, w2, _ in calced] == [c.words[i] for i in ranked[:top_k]])
+            calced = string_similarity(c, query, 'edit_distance', top_k = 5, min_rel = 2, max_rel = 3)
+            assert(all(2 <= d <= 3 for _, _, d in calced))
+            streamed = iter_string_similarity(c, query, 'edit_distance', max_rel = 3)
+            assert([(w2, d) for _, w2, d in streamed] ==
+                   [(w2, distances[id(w2)]) for w2 in c if distances[id(w2)] <= 3])
+
+
+def test_similarity_matrix(unspecified_test_corpus, tmp_path):
+    path = str(tmp_path / 'matrix.npy')
+    with CanonicalVariantContext(unspecified_test_corpus, 'transcription', 'type') as c:
+        n = len(c)
+        progress = []
+        def call_back(*args):
+            if len(args) == 1 and isinstance(args[0], int):
+                progress.append(args[0])
+        stopped = similarity_matrix(c, 'edit_distance', path, pairs_per_block = 10,
+                                    stop_check = lambda: len(progress) >= 2, call_back = call_back)
+        assert(stopped is None)
+        matrix = similarity_matrix(c, 'edit_distance', path, pairs_per_block = 10)
+        assert(matrix.dtype == np.uint8)
+        words = c.words
+        for i in range(n):
+            for j in range(i + 1, n):
+                expected = edit_distance(words[i].transcription, words[j].transcription, 'transcription')
+                assert(matrix[condensed_index(n, i, j)] == expected)
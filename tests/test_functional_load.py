@@ -2,11 +2,17 @@
 import sys
 import os
 import pytest
+from collections import defaultdict
+from math import log
 
 from corpustools.funcload.functional_load import (minpair_fl, deltah_fl,
                                 relative_minpair_fl, relative_deltah_fl,
-                                all_pairwise_fls,)
-from corpustools.corpus.classes import Segment
+                                all_pairwise_fls, minpair_fl_speed,
+                                deltah_fl_vectorized, functional_load_matrix,
+                                neutralize_with_all_envs, entropy,
+                                relative_functional_load)
+from corpustools.corpus.classes.lexicon import EnvironmentFilter
+from corpustools.corpus.classes import Segment, Corpus, Word
 
 from corpustools.contextmanagers import (CanonicalVariantContext,
                                         MostFrequentVariantContext,
@@ -237,42 +243,50 @@ def test_deltah(unspecified_test_corpus):
 #         for kwargs, v in relative_type_calls:
 #             assert(abs(deltah_fl(c, **kwargs)-v) < 0.0001)
 
-def test_relative_minpair(unspecified_test_corpus):
+def test_relative_minpair(export_test_dir, unspecified_test_corpus):
     calls = [({'segment':'s',
-                    'relative_count':True},0.013888),
+                    'relative_count_to_relevant_sounds':True},0.013888),
             ({'segment':'s',
-                    'relative_count':False},0.11111),
+                    'relative_count_to_whole_corpus':False},0.11111),
             ({'segment':'n',
-                    'relative_count':True},0.0123457),
+                    'relative_count_to_relevant_sounds':True},0.0123457),
             ({'segment':'n',
-                    'relative_count':False},0.11111),
+                    'relative_count_to_whole_corpus':False},0.11111),
             ({'segment':'o',
-                    'relative_count':True},0),
+                    'relative_count_to_relevant_sounds':True},0),
             ({'segment':'o',
-                    'relative_count':False},0),]
+                    'relative_count_to_whole_corpus':False},0),]
 
     with CanonicalVariantContext(unspecified_test_corpus, 'transcription', 'type') as c:
         for kwargs, v in calls:
-            assert(abs(relative_minpair_fl(c, **kwargs)[0]-v) < 0.0001)
+            assert(abs(relative_minpair_fl(c, **kwargs)-v) < 0.0001)
 
     calls = [({'segment':'s',
-                    'relative_count':True},0.01587),
+                    'relative_count_to_relevant_sounds':True},0.01587),
             ({'segment':'s',
-                    'relative_count':False},0.11111),
+                    'relative_count_to_whole_corpus':False},0.11111),
             ({'segment':'n',
-                    'relative_count':True},0),
+                    'relative_count_to_relevant_sounds':True},0),
             ({'segment':'n',
-                    'relative_count':False},0),
+                    'relative_count_to_whole_corpus':False},0),
             ({'segment':'o',
-                    'relative_count':True},0),
+                    'relative_count_to_relevant_sounds':True},0),
             ({'segment':'o',
-                    'relative_count':False},0)]
+                    'relative_count_to_whole_corpus':False},0)]
 
 
     with CanonicalVariantContext(unspecified_test_corpus,
                     'transcription', 'type', frequency_threshold = 3) as c:
         for kwargs, v in calls:
-            assert(abs(relative_minpair_fl(c, **kwargs)[0]-v) < 0.0001)
+            assert(abs(relative_minpair_fl(c, **kwargs)-v) < 0.0001)
+
+    path = os.path.join(export_test_dir, 'test_relative_minpair.txt')
+    with CanonicalVariantContext(unspecified_test_corpus, 'transcription', 'type') as c:
+        relative_minpair_fl(c, 's', relative_count_to_whole_corpus=False, output_filename=path)
+    with open(path, encoding='utf-8-sig') as f:
+        lines = f.read().splitlines()
+    assert(len(lines) == 2)
+    assert(lines[1].split('\t')[:2] == ['s', 'ʃ'])
 
 
 def test_relative_deltah(unspecified_test_corpus):
@@ -281,7 +295,7 @@ def test_relative_deltah(unspecified_test_corpus):
             ({'segment':'o'},0),]
     with CanonicalVariantContext(unspecified_test_corpus, 'transcription', 'type') as c:
         for kwargs, v in type_calls:
-            assert(abs(relative_deltah_fl(c, **kwargs)[0]-v) < 0.0001)
+            assert(abs(relative_deltah_fl(c, **kwargs)-v) < 0.0001)
 
     type_calls = [({'segment':'s'}, 0.00389),
             ({'segment':'n'},0),
@@ -289,7 +303,7 @@ def test_relative_deltah(unspecified_test_corpus):
     with CanonicalVariantContext(unspecified_test_corpus,
                         'transcription', 'type', frequency_threshold = 3) as c:
         for kwargs, v in type_calls:
-            assert(abs(relative_deltah_fl(c, **kwargs)[0]-v) < 0.0001)
+            assert(abs(relative_deltah_fl(c, **kwargs)-v) < 0.0001)
 
 
     token_calls = [({'segment':'s'},0.009227777),
@@ -297,7 +311,130 @@ def test_relative_deltah(unspecified_test_corpus):
             ({'segment':'o'},0),]
     with CanonicalVariantContext(unspecified_test_corpus, 'transcription', 'token') as c:
         for kwargs, v in token_calls:
-            assert(abs(relative_deltah_fl(c, **kwargs)[0]-v) < 0.0001)
+            assert(abs(relative_deltah_fl(c, **kwargs)-v) < 0.0001)
+
+
+def test_functional_load_matrix(unspecified_test_corpus):
+    with CanonicalVariantContext(unspecified_test_corpus, 'transcription', 'type') as c:
+        for relativization in ['corpus', 'relevant', 'raw']:
+            segments, matrix = functional_load_matrix(c, 'minpair', relativization=relativization)
+            for i, j in [(0, 1), (segments.index('s'), segments.index('ʃ')),
+                         (segments.index('m'), segments.index('n'))]:
+                pair = (segments[i], segments[j])
+                expected = minpair_fl_speed(c, [pair], relativization=relativization)[0][1]
+                assert(abs(matrix[i, j] - expected) < 0.0001)
+                assert(matrix[i, j] == matrix[j, i])
+
+    for type_or_token in ['type', 'token']:
+        with CanonicalVariantContext(unspecified_test_corpus, 'transcription', type_or_token) as c:
+            segments, matrix = functional_load_matrix(c, 'deltah')
+            for i, j in [(0, 1), (segments.index('s'), segments.index('ʃ')),
+                         (segments.index('m'), segments.index('n'))]:
+                expected = deltah_fl(c, [(segments[i], segments[j])])
+                assert(abs(matrix[i, j] - expected) < 0.0001)
+            assert(all(matrix[i, i] == 0 for i in range(len(segments))))
+
+
+def test_minpair_fl_speed_counts(unspecified_test_corpus):
+    with CanonicalVariantContext(unspecified_test_corpus, 'transcription', 'type') as c:
+        for definition in ['true', 'neutralization']:
+            for distinguish_homophones in [False, True]:
+                kwargs = {'relativization': 'raw',
+                          'minimal_pair_definition': definition,
+                          'distinguish_homophones': distinguish_homophones}
+                listed = minpair_fl_speed(c, [('s', 'ʃ'), ('m', 'n'), ('t',)], **kwargs)
+                counted = minpair_fl_speed(c, [('s', 'ʃ'), ('m', 'n'), ('t',)], list_pairs=False, **kwargs)
+                for (pair, fl, pair_dict), (_, count, empty) in zip(listed, counted):
+                    assert(fl == count)
+                    assert(fl == sum(len(v) for v in pair_dict.values()) / len(pair_dict))
+                    assert(sorted(empty) == sorted(pair_dict))
+                    assert(all(not v for v in empty.values()))
+        results = minpair_fl_speed(c, [('s', 'ʃ')], relativization='raw',
+                                   minimal_pair_definition='neutralization')
+        assert(results[0][1] == 1)
+        ((w1, w2),) = results[0][2][('s', 'ʃ')]
+        assert((w1[0], w2[0]) == ('sasi', 'shashi'))
+
+    # Duplicate entries of a word are one word of the minimal pairs
+    corpus = Corpus('duplicates')
+    for w in unspecified_test_corpus:
+        for _ in range(3 if w.spelling in ('sasi', 'shashi') else 1):
+            corpus.add_word(Word(spelling=w.spelling, transcription=list(w.transcription),
+                                 frequency=w.frequency), allow_duplicates=True)
+    corpus.add_word(Word(spelling='sassy', transcription=['s', 'ɑ', 's', 'i'], frequency=1.0))
+    with CanonicalVariantContext(corpus, 'transcription', 'type') as c:
+        for relativization, v in [('raw', 2), ('relevant', 2 / 9)]:
+            results = minpair_fl_speed(c, [('s', 'ʃ')], relativization=relativization,
+                                       distinguish_homophones=True,
+                                       minimal_pair_definition='neutralization')
+            assert(abs(results[0][1] - v) < 0.0001)
+            assert(len(results[0][2][('s', 'ʃ')]) == 2)
+
+
+def test_relative_functional_load(export_test_dir, unspecified_test_corpus):
+    with CanonicalVariantContext(unspecified_test_corpus, 'transcription', 'type') as c:
+        segments = [s.symbol for s in c.inventory if s.symbol != '#']
+        for algorithm in ['minpair', 'deltah']:
+            relative_fls = relative_functional_load(c, algorithm=algorithm)
+            assert(sorted(relative_fls) == sorted(segments))
+            for segment in ['s', 'n', 'o']:
+                pairs = [(segment, other) for other in segments if other != segment]
+                if algorithm == 'minpair':
+                    fls = [minpair_fl_speed(c, [pair])[0][1] for pair in pairs]
+                else:
+                    fls = [deltah_fl(c, [pair]) for pair in pairs]
+                expected = sum(fls) / len(pairs)
+                assert(abs(relative_fls[segment] - expected) < 0.0001)
+                assert(abs(relative_functional_load(c, segment, algorithm=algorithm) - expected) < 0.0001)
+
+            pairwise = dict(all_pairwise_fls(c, relative_fl=True, algorithm=algorithm))
+            assert(sorted(pairwise) == sorted(segments))
+            assert(all(abs(pairwise[s] - relative_fls[s]) < 1e-10 for s in segments))
+
+        path = os.path.join(export_test_dir, 'test_relative_fl.txt')
+        relative_functional_load(c, 'n', algorithm='deltah', output_filename=path)
+        with open(path, encoding='utf-8-sig') as f:
+            lines = f.read().splitlines()
+        assert(lines[0] == 'FIRST_SEGMENT\tSECOND_SEGMENT\tFUNCTIONAL_LOAD')
+        assert(len(lines) == len(segments))
+        assert(all(line.startswith('n\t') for line in lines[1:]))
+
+
+def regex_deltah(c, pair, environment_filter):
+    # Entropy change with every word neutralized through regular expressions
+    if environment_filter:
+        filled = [EnvironmentFilter(pair, env.lhs, env.rhs) for env in environment_filter]
+    else:
+        filled = [EnvironmentFilter(pair, [], [])]
+    original = defaultdict(float)
+    neutralized = defaultdict(float)
+    for w in c:
+        trans = getattr(w, c.sequence_type)
+        original[trans] += w.frequency
+        neutralized[neutralize_with_all_envs(trans, filled)] += w.frequency
+    if c.type_or_token == 'type':
+        return log(len(original), 2) - log(len(neutralized), 2)
+    total = sum(original.values())
+    return (entropy([v / total for v in original.values()]) -
+            entropy([v / total for v in neutralized.values()]))
+
+
+def test_deltah_vectorized_environments(unspecified_test_corpus):
+    environments = [None,
+                    [EnvironmentFilter([], [{'ɑ'}], [])],
+                    [EnvironmentFilter([], [], [{'i'}])],
+                    [EnvironmentFilter([], [{'#'}], [])],
+                    [EnvironmentFilter([], [{'#'}], []), EnvironmentFilter([], [{'ɑ'}], [])],
+                    [EnvironmentFilter([], [{'ɑ', 'i'}], [{'ɑ', 'i'}]),
+                     EnvironmentFilter([], [{'#'}], [{'ɑ'}, {'t'}])]]
+    pairs = [('s', 'ʃ'), ('m', 'n'), ('t', 'n')]
+    for type_or_token in ['type', 'token']:
+        with CanonicalVariantContext(unspecified_test_corpus, 'transcription', type_or_token) as c:
+            for environment_filter in environments:
+                results = deltah_fl_vectorized(c, pairs, environment_filter=environment_filter)
+                for pair, fl, _ in results:
+                    expected = regex_deltah(c, pair, environment_filter)
+                    assert(abs(fl - expected) < 0.0001)
 
 
 @pytest.mark.xfail
@@ -0,0 +1,17 @@
+
+from corpustools.informativity.informativity import get_multiple_informativity
+from corpustools.contextmanagers import CanonicalVariantContext
+
+
+def test_multiple_informativity(unspecified_test_corpus):
+    calls = [('token', [0.907, 0.286, 0.586]),
+             ('type', [0.981, 0.969, 0.534])]
+    for type_or_token, v in calls:
+        results = get_multiple_informativity(unspecified_test_corpus, ['s', 'm', 'ɑ'],
+                                             type_or_token=type_or_token)
+        assert([r['Segment'] for r in results] == ['s', 'm', 'ɑ'])
+        assert([r['Result'] for r in results] == v)
+
+        with CanonicalVariantContext(unspecified_test_corpus, 'transcription', type_or_token) as c:
+            results = get_multiple_informativity(c, ['s', 'm', 'ɑ'], type_or_token=type_or_token)
+            assert([r['Result'] for r in results] == v)
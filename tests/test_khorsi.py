@@ -3,8 +3,10 @@ import unittest
 import sys
 import os
 
-from corpustools.symbolsim.khorsi import lcs
-from corpustools.symbolsim.string_similarity import string_similarity
+from corpustools.symbolsim.khorsi import lcs, khorsi, common_substring, batch_khorsi
+from corpustools.symbolsim.string_similarity import string_similarity, corpus_khorsi, most_similar_words
+from corpustools.neighdens.neighborhood_density import neighborhood_density
+from corpustools.corpus.classes import Corpus, Word
 from corpustools.contextmanagers import (CanonicalVariantContext,
                                         MostFrequentVariantContext,
                                         WeightedVariantContext)
@@ -83,6 +85,26 @@ def test_freq_base_transcription_token(unspecified_test_corpus):
         freq_base = c.get_frequency_base()
     assert(freq_base == expected)
 
+def test_freq_base_parameters(unspecified_test_corpus):
+    with CanonicalVariantContext(unspecified_test_corpus, 'transcription', 'type') as c:
+        both = c.get_frequency_base()
+        halved = c.get_frequency_base(halve_edges=True)
+        no_wb = c.get_frequency_base(need_wb=False)
+        bigrams = c.get_frequency_base(gramsize=2, need_wb=False, probability=True)
+        assert(c.get_frequency_base() is both)
+    assert(both['#'] == 30)
+    assert(halved['#'] == 15)
+    assert(halved['total'] == 87)
+    assert('#' not in no_wb)
+    assert(no_wb['total'] == 72)
+    assert(abs(sum(v for k, v in bigrams.items() if k != 'total') - 1) < 1e-9)
+    try:
+        both['#'] = 0
+    except TypeError:
+        pass
+    else:
+        assert(False)
+
 def test_lcs_spelling(unspecified_test_corpus):
     expected = [('atema','atema','atema',''),
                 ('atema','enuta','e','atmatnua'),
@@ -160,6 +182,61 @@ def test_lcs_transcription(unspecified_test_corpus):
         assert(calced == (v[2],sorted(v[3])))
 
 
+def test_common_substring():
+    assert(common_substring([1, 2, 3, 4], [5, 3, 4, 2, 3]) == (1, 3, 2))
+    assert(common_substring([5, 3, 4, 2, 3], [1, 2, 3, 4]) == (3, 1, 2))
+    assert(common_substring([1, 2], [3]) == (0, 0, 0))
+
+def test_corpus_khorsi(unspecified_test_corpus):
+    for sequence_type in ['spelling', 'transcription']:
+        with CanonicalVariantContext(unspecified_test_corpus, sequence_type, 'token') as c:
+            freq_base = c.get_frequency_base()
+            for query in c:
+                for query_first in [True, False]:
+                    scores = corpus_khorsi(c, query, query_first = query_first)
+                    for w, score in zip(c, scores):
+                        if query_first:
+                            pair = (getattr(query, sequence_type), getattr(w, sequence_type))
+                        else:
+                            pair = (getattr(w, sequence_type), getattr(query, sequence_type))
+                        assert(khorsi(*pair, freq_base, sequence_type) == score)
+            flat, offsets = c.frame.tier(sequence_type)
+            surprisals = c.segment_surprisals()
+            query_ids = c.segment_table.encode(getattr(c.words[0], sequence_type))
+            scores = batch_khorsi(query_ids, flat, offsets, surprisals)
+            pruned = batch_khorsi(query_ids, flat, offsets, surprisals, min_score = -10)
+            assert(((scores >= -10) == (pruned >= -10)).all())
+            assert((scores[scores >= -10] == pruned[pruned >= -10]).all())
+
+def test_khorsi_threshold():
+    # 'u' and 'uu' score exactly 0
+    corpus = Corpus('threshold')
+    for transcription in ['t', 'u', 'ut', 'uu', 'ɑiɑ']:
+        corpus.add_word(Word(spelling=transcription, transcription=list(transcription), frequency=1.0))
+    with CanonicalVariantContext(corpus, 'transcription', 'type') as c:
+        query = corpus.find('u')
+        related = string_similarity(c, query, 'khorsi', min_rel = 0)
+        assert(corpus.find('uu') in [w2 for _, w2, _ in related])
+        _, neighbors = neighborhood_density(c, query, None, algorithm = 'khorsi', max_distance = 0)
+        assert(corpus.find('uu') in neighbors)
+        # Pairs scored exactly at the threshold are kept
+        for w1 in c:
+            for _, w2, score in string_similarity(c, w1, 'khorsi'):
+                assert(w2 in [w for _, w, _ in string_similarity(c, w1, 'khorsi', min_rel = score)])
+                assert(w2 in [w for _, w, _ in most_similar_words(c, w1, 'khorsi', 5, min_rel = score)])
+
+def test_top_k(unspecified_test_corpus):
+    with CanonicalVariantContext(unspecified_test_corpus, 'transcription', 'token') as c:
+        for query in c:
+            scores = {id(w2): score for _, w2, score in string_similarity(c, query, 'khorsi')}
+            for top_k in [1, 4]:
+                calced = most_similar_words(c, query, 'khorsi', top_k)
+                assert(len(calced) == top_k)
+                for _, w2, score in calced:
+                    assert(abs(scores[id(w2)] - score) < 1e-9)
+                worst = min(score for _, _, score in calced)
+                assert(sum(1 for s in scores.values() if s > worst + 1e-9) < top_k)
+
 def test_mass_relate_spelling_type(unspecified_test_corpus):
     expected = [(unspecified_test_corpus.find('atema'),unspecified_test_corpus.find('atema'),11.0766887),
                 (unspecified_test_corpus.find('atema'),unspecified_test_corpus.find('enuta'),-14.09489383),
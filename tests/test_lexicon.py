@@ -2,12 +2,14 @@
 import unittest
 import os
 import sys
+import pickle
 
 import pdb
 
 from corpustools.corpus.classes import (Word, Corpus, FeatureMatrix, Segment,
                                         Environment, EnvironmentFilter, Transcription,
-                                        WordToken, Discourse)
+                                        WordToken, Discourse, SegmentTable,
+                                        FrozenTranscription)
 
 
 class CorpusTest(unittest.TestCase):
@@ -50,6 +52,32 @@ class CorpusTest(unittest.TestCase):
         #Error, should find return an iterable of homographs?
         self.assertEqual([x.spelling for x in corpus.find('a')],['a','a'])
 
+    def test_homograph_index(self):
+        corpus = Corpus('test')
+        for w in self.homograph_info:
+            corpus.add_word(Word(**w), allow_duplicates=True)
+        self.assertEqual(sorted(corpus.wordlist.keys()), ['a', 'a (1)', 'c', 'd'])
+        self.assertEqual([str(x.transcription) for x in corpus.find_all('a')], ['a.b', 'a.c'])
+        self.assertEqual(corpus.key(corpus['a (1)']), 'a (1)')
+
+        corpus.remove_word('a')
+        self.assertEqual(corpus.find('a'), corpus['a (1)'])
+        corpus.add_word(Word(**self.homograph_info[0]), allow_duplicates=True)
+        self.assertEqual(len(corpus.find_all('a')), 2)
+        self.assertEqual(corpus.key(Word(**self.homograph_info[0])), 'a (2)')
+
+        corpus['a (1)'] = Word(**self.basic_info[1])
+        self.assertEqual(len(corpus.find_all('a')), 1)
+        self.assertEqual(len(corpus.find_all('b')), 1)
+
+        restored = pickle.loads(pickle.dumps(corpus))
+        self.assertEqual(len(restored.find_all('a')), 1)
+        self.assertEqual(restored.find('b'), corpus['a (1)'])
+
+        corpus.add_word(Word(**self.homograph_info[1]))
+        self.assertEqual(len(corpus.find_all('a')), 1)
+        self.assertEqual(corpus.find('a').frequency, 64.0)
+
 
 
 class WordTest(unittest.TestCase):
@@ -162,6 +190,37 @@ class WordTest(unittest.TestCase):
 
         self.assertRaises(AttributeError,getattr,t,'tier1')
 
+    def test_compact_representation(self):
+        t = Word(**self.basic)
+        t2 = Word(**self.basic)
+        self.assertIs(t.wordtokens, t2.wordtokens)
+        self.assertIs(t.descriptors, t2.descriptors)
+        self.assertNotIn('_transcription', vars(t))
+
+        t.add_wordtoken('token')
+        self.assertEqual(list(t.wordtokens), ['token'])
+        self.assertEqual(len(t2.wordtokens), 0)
+
+        t.tier1 = Transcription(['a'])
+        restored = pickle.loads(pickle.dumps(t))
+        self.assertEqual(restored, t)
+        self.assertEqual(restored.frequency, t.frequency)
+        self.assertEqual(restored.tier1, t.tier1)
+        self.assertEqual(list(restored.wordtokens), ['token'])
+
+    def test_old_state(self):
+        state = {'_transcription': Transcription(['a','b']), '_spelling': 'ab',
+                 '_transcription_name': 'Transcription', '_spelling_name': 'Spelling',
+                 '_freq_name': 'Frequency', 'Transcription': Transcription(['a','b']),
+                 'Spelling': 'ab', 'Frequency': 2.0, 'wordtokens': [],
+                 'descriptors': ['Spelling', 'Transcription', 'Frequency']}
+        t = Word.__new__(Word)
+        t.__setstate__(state)
+        self.assertEqual(t.spelling, 'ab')
+        self.assertEqual(str(t.transcription), 'a.b')
+        self.assertEqual(t.frequency, 2.0)
+        self.assertEqual(len(t.wordtokens), 0)
+
 class FeatureMatrixTest(unittest.TestCase):
     def setUp(self):
         self.basic_info = [{'symbol':'a','feature1':'+','feature2':'+'},
@@ -349,6 +408,79 @@ class TranscriptionTest(unittest.TestCase):
         self.assertEqual('c', cab[0])
         self.assertRaises(IndexError,cab.__getitem__,4)
 
+    def test_encode(self):
+        table = SegmentTable()
+        cab = Transcription(self.cab)
+        ids = cab.encode(table)
+        self.assertEqual(list(ids), [1, 2, 3])
+        self.assertEqual(table.decode(ids), self.cab)
+        self.assertFalse(cab.is_compact)
+
+        cab.encode(table, compact=True)
+        self.assertTrue(cab.is_compact)
+        self.assertEqual(cab, Transcription(self.cab))
+        self.assertEqual(str(cab), 'c.a.b')
+        self.assertEqual(len(cab), 3)
+        self.assertEqual(cab[1], 'a')
+        self.assertTrue('b' in cab)
+        self.assertFalse('d' in cab)
+
+        cab._list = ['a', 'd']
+        self.assertTrue(cab.is_compact)
+        self.assertEqual(list(cab.ids), [2, 4])
+        self.assertEqual(list(cab), ['a', 'd'])
+
+    def test_cache(self):
+        cab = Transcription(self.cab)
+        self.assertEqual(str(cab), 'c.a.b')
+        self.assertEqual(cab.padded, ('#', 'c', 'a', 'b', '#'))
+        self.assertEqual(cab.with_word_boundaries(), ['#', 'c', 'a', 'b', '#'])
+        cab._list = self.ab
+        self.assertEqual(str(cab), 'a.b')
+        self.assertEqual(hash(cab), hash(Transcription(self.ab)))
+        self.assertEqual(cab.padded, ('#', 'a', 'b', '#'))
+
+        restored = pickle.loads(pickle.dumps(cab))
+        self.assertNotIn('_hash', restored.__getstate__())
+        self.assertEqual(restored, cab)
+
+    def test_frozen(self):
+        cab = Transcription(self.cab)
+        frozen = cab.frozen()
+        self.assertIsInstance(frozen, FrozenTranscription)
+        self.assertEqual(frozen, cab)
+        self.assertEqual(hash(frozen), hash(cab))
+        self.assertRaises(TypeError, setattr, frozen, '_list', self.ab)
+        self.assertRaises(TypeError, setattr, frozen, 'stress_pattern', {})
+
+        cab._list = self.ab
+        self.assertEqual(str(frozen), 'c.a.b')
+        thawed = frozen.thawed()
+        self.assertNotIsInstance(thawed, FrozenTranscription)
+        thawed._list = self.ad
+        self.assertEqual(str(thawed), 'a.d')
+        self.assertEqual(str(frozen), 'c.a.b')
+
+class SegmentTableTest(unittest.TestCase):
+    def test_intern(self):
+        table = SegmentTable()
+        self.assertEqual(table['#'], 0)
+        self.assertEqual(table.intern('a'), 1)
+        self.assertEqual(table.intern(Segment('b')), 2)
+        self.assertEqual(table.intern('a'), 1)
+        self.assertEqual(len(table), 3)
+        self.assertEqual(table.symbol(2), 'b')
+
+    def test_corpus_encoding(self):
+        corpus = Corpus('test')
+        corpus.add_word(Word(spelling='a', transcription=['a','b'], frequency=32.0))
+        corpus.encode_transcriptions()
+        corpus.add_word(Word(spelling='b', transcription=['c','a'], frequency=32.0))
+        for w in corpus:
+            self.assertTrue(w.transcription.is_compact)
+        self.assertEqual(corpus.segment_table.symbols, ['#','a','b','c'])
+        self.assertEqual(list(corpus.find('b').transcription.ids), [3, 1])
+
 
 class EnvironmentTest(unittest.TestCase):
     def setUp(self):
@@ -481,3 +613,14 @@ def test_redundant_features(specified_test_corpus):
 
     assert('round' in r)
 
+
+def test_freeze_transcriptions(unspecified_test_corpus):
+    corpus = unspecified_test_corpus
+    before = {w.spelling: str(w.transcription) for w in corpus}
+    corpus.freeze_transcriptions()
+    for w in corpus:
+        assert isinstance(w.transcription, FrozenTranscription)
+        assert str(w.transcription) == before[w.spelling]
+    corpus.freeze_transcriptions(False)
+    for w in corpus:
+        assert not isinstance(w.transcription, FrozenTranscription)
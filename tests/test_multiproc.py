@@ -0,0 +1,67 @@
+import pytest
+
+from corpustools.multiproc import score_mp, filter_mp, get_pool, get_backend, SerialBackend
+
+
+def square_unless_multiple_of_three(x):
+    if x % 3 == 0:
+        return None
+    return x * x
+
+
+def is_even(x):
+    return x % 2 == 0
+
+
+def test_score_mp():
+    scores = score_mp(((i,) for i in range(10)), square_unless_multiple_of_three, 2, None, None, chunk_size = 3)
+    assert sorted(scores) == [(1, 1), (2, 4), (4, 16), (5, 25), (7, 49), (8, 64)]
+
+
+def test_filter_mp():
+    kept = filter_mp(((i,) for i in range(10)), is_even, 2, None, None)
+    assert sorted(kept) == [(0,), (2,), (4,), (6,), (8,)]
+
+
+def test_pool_is_reused():
+    pool = get_pool(2)
+    progress = []
+    scores = score_mp(((i,) for i in range(6)), square_unless_multiple_of_three, 2, progress.append, None, chunk_size = 1)
+    assert get_pool(2) is pool
+    assert len(scores) == 4
+    assert progress[-1] == 6
+
+
+def test_stop_check():
+    progress = []
+    scores = score_mp(((i,) for i in range(1000)), square_unless_multiple_of_three, 2,
+                      progress.append, lambda: len(progress) >= 3, chunk_size = 1)
+    assert len(scores) < 1000
+
+
+@pytest.mark.parametrize('kind', ['serial', 'thread', 'process', 'shared_memory'])
+def test_backend_map(kind):
+    backend = get_backend(2, kind)
+    progress = []
+    results = backend.map(square_unless_multiple_of_three, ((i,) for i in range(10)),
+                          chunk_size = 3, call_back = progress.append)
+    assert results == [None, 1, 4, None, 16, 25, None, 49, 64, None]
+    assert progress[-1] == 10
+
+
+@pytest.mark.parametrize('kind', ['serial', 'thread', 'process', 'shared_memory'])
+def test_backend_stop_check(kind):
+    backend = get_backend(2, kind)
+    progress = []
+    results = backend.map(square_unless_multiple_of_three, ((i,) for i in range(1000)),
+                          call_back = progress.append, stop_check = lambda: len(progress) >= 3)
+    assert results is None
+    assert progress[-1] < 1000
+
+
+def test_serial_backend():
+    assert isinstance(get_backend(-1), SerialBackend)
+    assert isinstance(get_backend(1, 'process'), SerialBackend)
+    assert not get_backend(8, 'serial').parallel
+    with pytest.raises(ValueError):
+        get_backend(2, 'cluster')
@@ -5,7 +5,13 @@ import os
 from corpustools.corpus.classes import Word
 
 from corpustools.neighdens.neighborhood_density import (neighborhood_density,
-                                                        find_mutation_minpairs)
+                                                        find_mutation_minpairs,
+                                                        _is_edit_distance_neighbor,
+                                                        _is_phono_edit_distance_neighbor)
+from corpustools.symbolsim.deletion_index import DeletionIndex
+from corpustools.symbolsim.substitution_index import SubstitutionIndex
+from corpustools.symbolsim.metric_index import MetricIndex
+from corpustools.symbolsim.edit_distance import edit_distance
 
 from corpustools.contextmanagers import (CanonicalVariantContext,
                                         MostFrequentVariantContext,
@@ -25,6 +31,55 @@ def test_basic_corpus_nd(specified_test_corpus):
             assert(abs(result[0]-v) < 0.0001)
 
 
+def test_deletion_index():
+    index = DeletionIndex([(1, 2, 3), (1, 2), (1, 2, 3), (4, 5, 6), (1, 3, 4)], max_distance=2)
+    assert index.neighbors((1, 2, 3), 1) == [(0, 0), (1, 1), (2, 0)]
+    assert index.neighbors((1, 2, 3)) == [(0, 0), (1, 1), (2, 0), (4, 2)]
+    assert index.neighbors((7, 8, 9, 7)) == []
+
+
+def test_substitution_index():
+    index = SubstitutionIndex([(1, 2, 3), (1, 2), (1, 4, 3), (1, 2, 3), (5, 2, 3), (1, 4, 4)])
+    assert index.neighbors((1, 2, 3)) == [2, 4]
+    assert index.neighbors((1, 2, 5)) == [0, 3]
+    assert index.neighbors((7, 8, 9, 7)) == []
+
+
+def test_edit_distance_nd(unspecified_test_corpus):
+    # The deletion index and the batched distances give the same neighbors
+    # as comparing every word
+    with CanonicalVariantContext(unspecified_test_corpus, 'transcription', 'type') as c:
+        for max_distance in [1, 2, 3, 4, 2.5]:
+            for query in c:
+                expected = [w for w in c if _is_edit_distance_neighbor(w, query, 'transcription', max_distance)]
+                result = neighborhood_density(c, query, None, max_distance = max_distance)
+                assert(result == (len(expected), expected))
+
+
+def test_metric_index():
+    words = ['mata', 'nata', 'sata', 'masa', 'mat', 'atema', 'enuta', 'sasi', 'mata', 'ʃi',
+             'ʃuma', 'mi', 'tatu', 'nauti', 'ʃoma', 'sama', 'ta', 'mamati', 'emo', 'sasu']
+    distance = lambda x, y: edit_distance(x, y, None)
+    for metric in [True, False]:
+        index = MetricIndex([list(w) for w in words], distance, min_indel_cost=1, metric=metric)
+        for query in words:
+            for max_distance in [0, 1, 2.5]:
+                expected = [(i, distance(query, w)) for i, w in enumerate(words)
+                            if distance(query, w) <= max_distance]
+                assert(index.neighbors(list(query), max_distance) == expected)
+
+
+def test_phono_edit_distance_nd(specified_test_corpus):
+    with CanonicalVariantContext(specified_test_corpus, 'transcription', 'type') as c:
+        for max_distance in [1, 3, 6.5]:
+            for query in c:
+                expected = [w for w in c if _is_phono_edit_distance_neighbor(w, query, 'transcription',
+                                                                             c.specifier, max_distance)]
+                result = neighborhood_density(c, query, None, algorithm = 'phono_edit_distance',
+                                              max_distance = max_distance)
+                assert(result == (len(expected), expected))
+
+
 def test_basic_corpus_mutation_minpairs(specified_test_corpus):
     calls = [({'query':Word(**{'transcription': ['s', 'ɑ', 't', 'ɑ']}),
                     },2)]
@@ -1 +1,64 @@
 
+
+from copy import deepcopy
+
+from corpustools.symbolsim.phono_align import Aligner, get_aligner
+
+
+def test_cost_matrix(spe_specifier):
+    symbols = sorted(spe_specifier.matrix.keys()) + ['empty']
+    for underspec_cost in [0.25, 0.1]:
+        al = Aligner(features=spe_specifier, underspec_cost=underspec_cost, ins_penalty=2)
+        for s1 in symbols:
+            for s2 in symbols:
+                if s1 == s2 == 'empty':
+                    continue
+                expected = al.compare_segments(s1, s2, underspec_cost)
+                assert(al.cost_matrix[al.segment_id(s1), al.segment_id(s2)] == expected)
+
+
+def test_segment_cost_types(spe_specifier):
+    symbols = sorted(spe_specifier.matrix.keys())
+    for kwargs in [{}, {'underspec_cost': 1}, {'sub_penalty': 0.5}]:
+        al = Aligner(features=spe_specifier, **kwargs)
+        deletions, insertions, substitutions = al.segment_costs(symbols, symbols)
+        for i, s1 in enumerate(symbols):
+            expected = al.compare_segments(s1, 'empty', al.underspec_cost)
+            assert(type(deletions[i]) is type(expected))
+            for j, s2 in enumerate(symbols):
+                expected = al.compare_segments(s1, s2, al.underspec_cost)
+                assert(type(substitutions[i][j]) is type(expected))
+    al = Aligner(features=spe_specifier)
+    assert(type(al.distance(['t', 'ɑ'], ['s', 'ɑ'])) is int)
+
+
+def test_get_aligner(spe_specifier):
+    al = get_aligner(spe_specifier)
+    assert(get_aligner(spe_specifier) is al)
+    assert(get_aligner(spe_specifier, underspec_cost=0.5) is not al)
+    assert(al.features is spe_specifier)
+
+
+def test_get_aligner_after_feature_changes(spe_specifier):
+    features = deepcopy(spe_specifier)
+    al = get_aligner(features)
+    assert(al.distance(['t'], ['s']) > 0)
+    features['t'] = dict(features.matrix['s'])
+    assert(get_aligner(features).distance(['t'], ['s']) == 0)
+    features['t'] = dict(spe_specifier.matrix['t'])
+    assert(get_aligner(features).distance(['t'], ['s']) == Aligner(features=spe_specifier).distance(['t'], ['s']))
+
+
+def test_distance_and_traceback(spe_specifier):
+    al = Aligner(features=spe_specifier)
+    pairs = [(['t', 'ɑ', 's'], ['m', 'ɑ', 's', 'i']),
+             (['s', 'i'], ['s', 'i']),
+             ([], ['ɑ', 'm']),
+             (['u', 'm', 'i'], [])]
+    for seq1, seq2 in pairs:
+        m = al.make_similarity_matrix(seq1, seq2)
+        distance, directions = al.traceback_matrix(seq1, seq2)
+        assert(al.distance(seq1, seq2) == m[-1][-1]['f'])
+        assert(distance == m[-1][-1]['f'])
+        assert(al.generate_alignment(seq1, seq2, directions) ==
+               al.generate_alignment(seq1, seq2, m))